@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+# Benchmarks of the client's hot paths against the stand-in Fedora server
+# (fcrepo4stub.py), which is run in a separate process so that it doesn't
+# count towards the memory figures.
+#
+# For each benchmark this reports throughput, latency percentiles and the
+# peak memory allocated by one call (measured with tracemalloc, in a run
+# separate from the timed ones), and can write them as JSON to compare
+# with another run:
+#
+# python benchmarks/bench_client.py -o before.json
+# python benchmarks/bench_client.py -o after.json -c before.json
+
+import os.path, sys, argparse, subprocess, json, time, platform, tracemalloc, io
+from importlib.metadata import version
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+import fcrepo4, fcrepo4stub
+from rdflib import Literal, URIRef
+from rdflib.namespace import DC
+
+MDATA = {
+    'title': 'Benchmark container',
+    'description': 'A container created by bench_client.py',
+    'creator': 'bench_client.py'
+    }
+
+PERCENTILES = [ 50, 90, 99 ]
+
+SMALL_BINARY = 4 * 1024
+LARGE_BINARY = 16 * 1024 * 1024
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list"""
+    k = max(int(round(p / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(k, len(values) - 1)]
+
+
+def measure(op, iterations, memory=True):
+    """Runs op(i) iterations times and returns a dict of stats"""
+    times = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        op(i)
+        times.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    times.sort()
+    stats = {
+        'iterations': iterations,
+        'seconds': total,
+        'ops_per_second': iterations / total if total else None,
+        'latency_ms': {
+            'min': times[0] * 1000,
+            'mean': sum(times) / len(times) * 1000,
+            'max': times[-1] * 1000
+            }
+        }
+    for p in PERCENTILES:
+        stats['latency_ms']['p{}'.format(p)] = percentile(times, p) * 1000
+    if memory:
+        tracemalloc.start()
+        op(iterations)
+        stats['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    return stats
+
+
+# Each benchmark does its setup and returns a list of ( name, op, iterations )
+
+def bench_get(repo, base, args):
+    c = base.add_container(repo.dc_rdf(MDATA))
+    b = base.add_binary(io.BytesIO(os.urandom(SMALL_BINARY)), mime='application/octet-stream')
+    return [
+        ( 'get_rdf', lambda i: repo.get(c.uri).dc(), args.iterations ),
+        ( 'get_binary', lambda i: repo.get(b.uri).data(), args.iterations )
+        ]
+
+
+def bench_add_container(repo, base, args):
+    md = repo.dc_rdf(MDATA)
+    return [ ( 'add_container', lambda i: base.add_container(md), args.iterations ) ]
+
+
+def bench_add_binary(repo, base, args):
+    small = os.urandom(SMALL_BINARY)
+    large = os.urandom(args.large)
+    add = lambda data: base.add_binary(io.BytesIO(data), mime='application/octet-stream')
+    return [
+        ( 'add_binary_small', lambda i: add(small), args.iterations ),
+        ( 'add_binary_large', lambda i: add(large), max(args.iterations // 20, 3) )
+        ]
+
+
+def bench_rdf_write(repo, base, args):
+    benches = []
+    for n in args.triples:
+        g = repo.dc_rdf(MDATA)
+        for i in range(n):
+            g.add(( URIRef(''), DC['relation'], URIRef('http://example.org/things/{}'.format(i)) ))
+        c = base.add_container(g)
+        resource = repo.get(c.uri)
+
+        def write(i, resource=resource):
+            resource.rdf_replace(DC['title'], Literal('Title {}'.format(i)))
+            resource.rdf_write()
+
+        iterations = args.iterations if n <= 1000 else max(args.iterations // ( n // 1000 ), 3)
+        benches.append(( 'rdf_write_{}'.format(n), write, iterations ))
+    return benches
+
+
+def bench_acl_grant(repo, base, args):
+    c = base.add_container(repo.dc_rdf(MDATA))
+    acl = repo.add_acl(c.uri)
+    r = c.add_container(repo.dc_rdf(MDATA))
+    return [ ( 'acl_grant', lambda i: acl.grant('user{}'.format(i), fcrepo4.READ, r.uri), args.iterations ) ]
+
+
+def bench_acls(repo, base, args):
+    c = base.add_container(repo.dc_rdf(MDATA))
+    acl = repo.add_acl(c.uri)
+    r = c.add_container(repo.dc_rdf(MDATA))
+    for i in range(args.auths):
+        acl.grant('user{}'.format(i), fcrepo4.READ, r.uri)
+    return [ ( 'acls_{}'.format(args.auths), lambda i: repo.get(acl.uri).acls(), args.iterations ) ]
+
+
+def bench_dc_rdf(repo, base, args):
+    return [ ( 'dc_rdf', lambda i: repo._serialize_rdf(repo.dc_rdf(MDATA)), args.iterations * 10 ) ]
+
+
+BENCHMARKS = [
+    bench_get,
+    bench_add_container,
+    bench_add_binary,
+    bench_rdf_write,
+    bench_acl_grant,
+    bench_acls,
+    bench_dc_rdf
+    ]
+
+
+def start_standin(args):
+    """Runs the stand-in server in a subprocess and returns it and its uri"""
+    command = [ sys.executable, os.path.join(HERE, '..', 'fcrepo4stub.py'), '--port', '0', '--latency', str(args.latency) ]
+    if args.sqlite:
+        command += [ '--sqlite', args.sqlite ]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    line = server.stdout.readline()
+    return server, line.strip().split(' ')[-1]
+
+
+def run(args):
+    server = None
+    uri = args.uri
+    if not uri:
+        server, rest = start_standin(args)
+        uri = rest[:-len('rest/')]
+    config = {
+        'uri': uri,
+        'users': { u: { 'user': u, 'password': p } for u, p in fcrepo4stub.DEFAULT_USERS.items() },
+        'rdf_format': args.format,
+        'rdf_store': args.store
+        }
+    results = {}
+    try:
+        with fcrepo4.Repository(config=config) as repo:
+            repo.set_user('fedoraAdmin')
+            root = repo.get(repo.path2uri('/'))
+            base = root.add_container(repo.dc_rdf(MDATA), path='bench_client', force=True)
+            try:
+                for bench in BENCHMARKS:
+                    for name, op, iterations in bench(repo, base, args):
+                        if args.only and not any(o in name for o in args.only):
+                            continue
+                        results[name] = measure(op, iterations, not args.no_memory)
+                        report(name, results[name])
+            finally:
+                repo.purge(base.uri)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rdflib': version('rdflib'),
+            'requests': version('requests'),
+            'args': { k: v for k, v in vars(args).items() if k not in [ 'out', 'compare' ] }
+            },
+        'results': results
+        }
+
+
+def report(name, stats):
+    l = stats['latency_ms']
+    print("{:<22} {:>6} {:>10.1f}/s  p50 {:>8.2f}ms  p90 {:>8.2f}ms  p99 {:>8.2f}ms  peak {:>10}".format(
+        name, stats['iterations'], stats['ops_per_second'], l['p50'], l['p90'], l['p99'],
+        '{:.0f}KiB'.format(stats['peak_kib']) if 'peak_kib' in stats else '-'))
+
+
+def compare(results, baseline):
+    """Prints the change in throughput and median latency from a baseline"""
+    print("\nCompared with {}".format(baseline['meta']['time']))
+    for name, stats in results['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        rate = ( stats['ops_per_second'] / old['ops_per_second'] - 1 ) * 100
+        p50 = ( stats['latency_ms']['p50'] / old['latency_ms']['p50'] - 1 ) * 100
+        print("{:<22} throughput {:>+7.1f}%  p50 {:>+7.1f}%".format(name, rate, p50))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--iterations', type=int, default=200, help="Iterations of each benchmark")
+    parser.add_argument('-t', '--triples', type=int, nargs='+', default=[ 10, 1000, 10000, 100000 ], help="Graph sizes for rdf_write")
+    parser.add_argument('-a', '--auths', type=int, default=100, help="Authorizations in the ACL for acls")
+    parser.add_argument('--large', type=int, default=LARGE_BINARY, help="Size of the large binary in bytes")
+    parser.add_argument('-f', '--format', default='turtle', choices=sorted(fcrepo4.RDF_FORMATS), help="rdf_format")
+    parser.add_argument('-s', '--store', default='graph', choices=[ 'graph', 'compact' ], help="rdf_store")
+    parser.add_argument('-l', '--latency', type=float, default=0.0, help="Stand-in latency in seconds")
+    parser.add_argument('--sqlite', type=str, help="Keep the stand-in's resources in this sqlite file")
+    parser.add_argument('-u', '--uri', type=str, help="Use the Fedora (or stand-in) at this uri rather than starting one")
+    parser.add_argument('--only', nargs='+', help="Only run benchmarks whose names contain these")
+    parser.add_argument('--no-memory', action='store_true', help="Don't measure peak memory")
+    parser.add_argument('-o', '--out', type=str, help="Write the results to this JSON file")
+    parser.add_argument('-c', '--compare', type=str, help="Compare with the results in this JSON file")
+    args = parser.parse_args()
+    results = run(args)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            json.dump(results, fh, indent=2)
+        print("Results written to {}".format(args.out))
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(results, json.load(fh))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# Benchmark of the parse and serialize cost of each of the RDF formats a
+# Repository can use (config value rdf_format), on graphs shaped like the
+# responses Fedora sends for a container: server-managed triples, some DC
+# metadata and an ldp:contains triple for each child.
+#
+# python benchmarks/bench_rdf_formats.py -n 1000 10000 -r 5
+
+import os.path, sys, argparse, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import fcrepo4
+from rdflib import Graph, Literal, URIRef, RDF, XSD
+from rdflib.namespace import DC
+
+BASE = 'http://localhost:8080/fcrepo/rest/collection'
+
+
+def fedora_container(children):
+    """Builds a graph like Fedora's representation of a container"""
+    g = Graph()
+    s = URIRef(BASE)
+    fc4 = fcrepo4.FC4_NS
+    ldp = fcrepo4.LDP_NS
+    for t in [ fc4['Container'], fc4['Resource'], ldp['RDFSource'], ldp['Container'], ldp['BasicContainer'] ]:
+        g.add(( s, RDF.type, t ))
+    g.add(( s, fc4['created'], Literal('2017-03-01T04:23:36.164Z', datatype=XSD.dateTime) ))
+    g.add(( s, fc4['lastModified'], Literal('2017-03-02T01:13:06.001Z', datatype=XSD.dateTime) ))
+    g.add(( s, fc4['createdBy'], Literal('bypassAdmin') ))
+    g.add(( s, fc4['lastModifiedBy'], Literal('bypassAdmin') ))
+    g.add(( s, fc4['hasParent'], URIRef(BASE.rsplit('/', 1)[0]) ))
+    g.add(( s, fc4['writable'], Literal(True) ))
+    g.add(( s, DC['title'], Literal('A collection with "quotes" and\na newline') ))
+    g.add(( s, DC['description'], Literal('Benchmark container', lang='en') ))
+    g.add(( s, DC['creator'], Literal('bench_rdf_formats.py') ))
+    for i in range(children):
+        g.add(( s, ldp['contains'], URIRef('{}/{:08x}'.format(BASE, i)) ))
+    return g
+
+
+def bench(fn, repeat):
+    """Best time of repeat runs of fn, in milliseconds"""
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def run(children, repeat):
+    g = fedora_container(children)
+    print("\n{} triples ({} children)".format(len(g), children))
+    print("{:<22} {:>10} {:>12} {:>12}".format('format', 'bytes', 'parse ms', 'serialize ms'))
+    for name, ( mime, parser ) in sorted(fcrepo4.RDF_FORMATS.items()):
+        text = g.serialize(format=parser)
+        p = bench(lambda: Graph().parse(data=text, format=parser), repeat)
+        s = bench(lambda: g.serialize(format=parser), repeat)
+        print("{:<22} {:>10} {:>12.1f} {:>12.1f}".format(name + ' (rdflib)', len(text), p, s))
+    text = fcrepo4.serialize_ntriples(g)
+    p = bench(lambda: fcrepo4.parse_ntriples(text), repeat)
+    s = bench(lambda: fcrepo4.serialize_ntriples(g), repeat)
+    print("{:<22} {:>10} {:>12.1f} {:>12.1f}".format('ntriples (fcrepo4)', len(text), p, s))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--children', type=int, nargs='+', default=[ 10, 1000, 10000 ], help="Numbers of children")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Runs of each (the best is reported)")
+    args = parser.parse_args()
+    for n in args.children:
+        run(n, args.repeat)
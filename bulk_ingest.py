@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Bulk-load containers into Fedora from a CSV, TSV or .xlsx spreadsheet.
+# Each row becomes a container with DC metadata taken from the columns
+# whose names are DC fields (title, creator, description and so on).
+
+import fcrepo4, argparse, csv, sys, os.path
+
+
+def read_rows(filename):
+    """Yields the rows of a spreadsheet as dicts, skipping empty cells"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.xlsx':
+        rows = read_xlsx(filename)
+    else:
+        delimiter = '\t' if ext == '.tsv' else ','
+        rows = read_csv(filename, delimiter)
+    for row in rows:
+        yield { k: v for k, v in row.items() if k and v not in [ None, '' ] }
+
+
+def read_csv(filename, delimiter):
+    with open(filename, newline='') as fh:
+        for row in csv.DictReader(fh, delimiter=delimiter):
+            yield row
+
+
+def read_xlsx(filename):
+    try:
+        import openpyxl
+    except ImportError:
+        sys.exit("Reading .xlsx files needs openpyxl: pip install openpyxl")
+    wb = openpyxl.load_workbook(filename, read_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    header = [ str(h) if h is not None else None for h in next(rows) ]
+    for row in rows:
+        yield { h: str(v) for h, v in zip(header, row) if v is not None }
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('uri', type=str, help="URI of the container to add to")
+    parser.add_argument('file', type=str, help="CSV, TSV or .xlsx file")
+    parser.add_argument('-c', '--config', default="config.yml", type=str, help="Config file")
+    parser.add_argument('-u', '--user', default="fedoraAdmin", type=str, help="User from config file")
+    parser.add_argument('-w', '--workers', default=fcrepo4.DEFAULT_WORKERS, type=int, help="Concurrent requests")
+    parser.add_argument('-s', '--slug', type=str, help="Column to use as the slug")
+    parser.add_argument('-p', '--path', type=str, help="Column to use as the path")
+    parser.add_argument('-f', '--force', action='store_true', help="Overwrite existing paths")
+    parser.add_argument('-e', '--errors', type=str, help="Write failed row numbers and errors to this CSV file")
+    parser.add_argument('-n', '--every', default=100, type=int, help="Report progress every n rows")
+    args = parser.parse_args()
+
+    repo = fcrepo4.Repository(config=args.config)
+    repo.set_user(args.user)
+
+    def progress(n, result):
+        if n % args.every == 0:
+            print("{} rows done".format(n))
+
+    results = repo.bulk_add_containers(
+        args.uri, read_rows(args.file), workers=args.workers,
+        slug=args.slug, path=args.path, force=args.force, progress=progress
+        )
+    errors = [ r for r in results if r.error ]
+    print("{} containers added, {} errors".format(len(results) - len(errors), len(errors)))
+    if errors and args.errors:
+        with open(args.errors, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow([ 'row', 'error' ])
+            for r in errors:
+                writer.writerow([ r.index + 1, getattr(r.error, 'message', r.error) ])
+        print("Errors written to {}".format(args.errors))
+    repo.close()
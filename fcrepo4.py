@@ -19,24 +19,37 @@ for c in r.children:
 
 import requests, os.path, mimetypes, json, yaml, logging, re
 from urllib.parse import urlparse
-from rdflib import Graph, Literal, URIRef, Namespace, RDF
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from rdflib import Graph, Literal, URIRef, BNode, Namespace, RDF
 from rdflib.namespace import DC
-import types
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import types, threading, time, queue, io, hashlib, bisect, functools, inspect, contextvars
+import itertools, contextlib, cProfile, sqlite3, datetime, tempfile
+from email.utils import parsedate_to_datetime
 
 
 logging.basicConfig(format="[%(name)s] %(levelname)s: %(message)s")
 
-METHODS = {
-    'GET': requests.get,
-    'PUT': requests.put,
-    'POST': requests.post,
-    'PATCH': requests.patch,
-    'DELETE': requests.delete,
-    'HEAD': requests.head,
-    'OPTIONS': requests.options,
-#    'MOVE': requests.move,
-#    'COPY': requests.copy
-}
+METHODS = [
+    'GET',
+    'PUT',
+    'POST',
+    'PATCH',
+    'DELETE',
+    'HEAD',
+    'OPTIONS',
+#    'MOVE',
+#    'COPY'
+]
+
+# defaults for the HTTP connection pool which each Repository keeps: these
+# can be overridden with the config values pool_connections, pool_maxsize,
+# pool_block and keepalive
+
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
 
 # the following are what the code uses as a serialisation format for
 # RDF between the repository and the Resource objects: the first is
@@ -45,14 +58,66 @@ METHODS = {
 RDF_MIME = 'text/turtle'
 RDF_PARSE = 'turtle'    
 
+# The RDF formats which a Repository can be configured to use with the
+# config value rdf_format: the mime type and the rdflib parser for each.
+# N-Triples is read and written by parse_ntriples and serialize_ntriples,
+# which are much faster than rdflib's Turtle parser.
+
+NTRIPLES_MIME = 'application/n-triples'
+JSONLD_MIME = 'application/ld+json'
+
+RDF_FORMATS = {
+    'turtle': ( RDF_MIME, RDF_PARSE ),
+    'ntriples': ( NTRIPLES_MIME, 'nt' ),
+    'json-ld': ( JSONLD_MIME, 'json-ld' )
+}
+
+RDF_MIMES = { mime: parser for mime, parser in RDF_FORMATS.values() }
+
 DEFAULT_MIME_TYPE = 'application/octet-stream'
 
+SPARQL_UPDATE_MIME = 'application/sparql-update'
+
+# statuses which mean that the server won't take a SPARQL Update PATCH, in
+# which case rdf_write falls back to PUT
+
+PATCH_UNSUPPORTED = [ 405, 415, 501 ]
+
+# statuses which mean the server is overloaded or rate limiting: purge,
+# fixity and the version requests back off and retry requests which get
+# them, up to RETRY_RETRIES times, waiting for the Retry-After header or
+# RETRY_BACKOFF seconds (doubling on each retry) but never more than
+# RETRY_BACKOFF_MAX
+
+RETRY_STATUSES = [ 429, 503 ]
+
+RETRY_RETRIES = 5
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 30.0
+
 FC4_URL = 'http://fedora.info/definitions/v4/repository#'
 
 FC4_NS = Namespace(FC4_URL)
 FC4_LAST_MODIFIED = FC4_NS['lastModified']
+FC4_EMBED_RESOURCES = FC4_NS['EmbedResources']
+FC4_SERVER_MANAGED = FC4_NS['ServerManaged']
+FC4_INBOUND_REFERENCES = FC4_NS['InboundReferences']
+
+LDP_URL = 'http://www.w3.org/ns/ldp#'
+
+LDP_NS = Namespace(LDP_URL)
+LDP_CONTAINS = LDP_NS['contains']
+
+# Prefer header projections which can be passed to get and rdf_read as
+# include or omit, as well as FC4_EMBED_RESOURCES, FC4_SERVER_MANAGED and
+# FC4_INBOUND_REFERENCES. Omitting LDP_PREFER_CONTAINMENT is how to read the
+# metadata of a container with a very large number of children.
 
-LDP_CONTAINS = URIRef('http://www.w3.org/ns/ldp#contains')
+LDP_PREFER_CONTAINMENT = LDP_NS['PreferContainment']
+LDP_PREFER_MEMBERSHIP = LDP_NS['PreferMembership']
+LDP_PREFER_MINIMAL_CONTAINER = LDP_NS['PreferMinimalContainer']
+
+PREMIS_NS = Namespace('http://www.loc.gov/premis/rdf/v1#')
 
 WEBAC_URL = 'http://www.w3.org/ns/auth/acl#'
 
@@ -79,6 +144,8 @@ DC_FIELDS = [
     'type'
     ]
 
+DC_PREDICATES = { DC[field]: field for field in DC_FIELDS }
+
 LOGLEVELS = {
     'debug': logging.DEBUG,
     'info': logging.INFO,
@@ -87,7 +154,22 @@ LOGLEVELS = {
     'critical': logging.CRITICAL
     }
 
-URL_CHUNK = 512
+# chunk sizes for uploads: if the upload_chunk config value is 'auto' (the
+# default) the chunk size is 1/64th of the source's size, between the
+# minimum and maximum, or UPLOAD_CHUNK if the size isn't known
+
+UPLOAD_CHUNK = 1024 * 1024
+UPLOAD_CHUNK_MIN = 64 * 1024
+UPLOAD_CHUNK_MAX = 8 * 1024 * 1024
+
+# number of chunks which an upload reads ahead of the request in a separate
+# thread (config value upload_readahead): 0 reads them in the request
+
+UPLOAD_READAHEAD = 4
+
+# chunk size for streaming binaries from Fedora
+
+DOWNLOAD_CHUNK = 1024 * 1024
 
 RDF_ADD = 0
 RDF_REPLACE = 1
@@ -95,6 +177,199 @@ RDF_REMOVE = 2
 
 FCR_ACCESS = 'fcr:accessroles'
 
+# seconds between refreshes of an open transaction (Fedora expires them
+# after three minutes by default)
+
+TX_KEEPALIVE = 60
+
+# default number of threads for the bulk and concurrent methods: for these
+# to be effective, the config value pool_maxsize should be at least as big
+
+DEFAULT_WORKERS = 8
+
+# number of uris which walk, purge and changed_since keep in memory in
+# their queues of resources to fetch: the rest wait in a temporary file
+
+FRONTIER_SIZE = 10000
+
+# upper bounds in seconds of the buckets of the latency histograms kept by
+# Metrics (the same as the Prometheus client libraries' defaults)
+
+LATENCY_BUCKETS = [ 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0 ]
+
+BulkResult = namedtuple('BulkResult', [ 'index', 'resource', 'error' ])
+BulkResult.__doc__ = """The outcome of one record in a bulk operation: resource
+is the new Resource, or None if the request failed with error"""
+
+ExportReport = namedtuple('ExportReport', [ 'resources', 'triples', 'binaries', 'errors', 'seconds' ])
+ExportReport.__doc__ = """The outcome of Repository.export: the numbers of resources
+and triples written and of binaries skipped, and a list of ( uri,
+exception ) for resources which couldn't be read"""
+
+ImportReport = namedtuple('ImportReport', [ 'created', 'errors', 'seconds' ])
+ImportReport.__doc__ = """The outcome of Repository.import_: the number of resources
+created and a list of ( path, exception ) for the ones which weren't"""
+
+NEW = 'new'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+Change = namedtuple('Change', [ 'kind', 'uri', 'resource', 'last_modified' ])
+Change.__doc__ = """A resource yielded by Repository.changed_since: kind is NEW,
+MODIFIED or DELETED, resource is the Resource (None if it was deleted) and
+last_modified is a timezone-aware datetime, or None if it's not known"""
+
+FIXITY_SUCCESS = 'SUCCESS'
+
+FixityResult = namedtuple('FixityResult', [ 'uri', 'ok', 'outcome', 'digests', 'size', 'seconds', 'retries', 'error' ])
+FixityResult.__doc__ = """The outcome of a fixity check of a binary: ok is True if
+Fedora's outcome was SUCCESS, digests are the checksums Fedora computed
+by algorithm, size is in bytes, seconds is how long the check took and
+retries is how many times the request was retried because the server was
+rate limiting. If the check couldn't be done, outcome is 'ERROR' and
+error is the message."""
+
+PurgeReport = namedtuple('PurgeReport', [ 'deleted', 'obliterated', 'missing', 'retries', 'errors', 'seconds' ])
+PurgeReport.__doc__ = """The outcome of Repository.purge: the numbers of resources
+deleted, tombstones obliterated, resources which were already gone and
+requests retried after rate limiting, and a list of ( uri, exception )
+for everything which failed"""
+
+Version = namedtuple('Version', [ 'label', 'uri', 'created' ])
+Version.__doc__ = """A version of a resource in its fcr:versions: uri is where the
+version can be fetched and created is a timezone-aware datetime, or None
+if it's not known"""
+
+SnapshotReport = namedtuple('SnapshotReport', [ 'label', 'versioned', 'errors', 'seconds' ])
+SnapshotReport.__doc__ = """The outcome of Repository.snapshot: the label of the
+versions, the number of resources versioned and a list of ( uri,
+exception ) for the ones which weren't"""
+
+
+def _concurrently(fn, items, workers=DEFAULT_WORKERS, window=None):
+    """Calls fn on each of items using a pool of worker threads, and
+    yields ( item, result, exception ) tuples in the order in which they
+    finish. No more than window items (default twice the number of workers)
+    are in flight at once, so items can be a generator of any length.
+    Each call runs in a copy of the caller's context, so that its requests
+    are counted under the caller's operation and tracing span.
+
+    If items is a deque, it's consumed from the left and the caller can
+    append more items to it between yields: the iteration ends when it is
+    empty and nothing is in flight. This is how walk queues the children
+    of each resource it fetches, in a _Frontier.
+    """
+    if not window:
+        window = workers * 2
+    if isinstance(items, deque):
+        take = lambda: items.popleft() if items else _END
+    else:
+        iterator = iter(items)
+        take = lambda: next(iterator, _END)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                while len(pending) < window:
+                    item = take()
+                    if item is _END:
+                        break
+                    pending[executor.submit(contextvars.copy_context().run, fn, item)] = item
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    e = future.exception()
+                    if e:
+                        yield item, None, e
+                    else:
+                        yield item, future.result(), None
+        finally:
+            for future in pending:
+                future.cancel()
+
+_END = object()
+
+
+class _Frontier(deque):
+    """A first-in, first-out queue for _concurrently which keeps no more
+    than size items in memory. Once it's full, items are appended to a
+    temporary file as JSON, and read back a batch at a time as the ones in
+    memory are taken, so the order is kept. Items are strings, numbers,
+    None or tuples of them.
+
+    len() is the total number of items, including the ones in the file.
+    """
+
+    def __init__(self, items=(), size=None):
+        super(_Frontier, self).__init__()
+        self.size = size or FRONTIER_SIZE
+        self.spill = None
+        self.spilled = 0
+        self.position = 0
+        self.extend(items)
+
+    def append(self, item):
+        if not self.spilled and deque.__len__(self) < self.size:
+            super(_Frontier, self).append(item)
+            return
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.spill.seek(0, io.SEEK_END)
+        self.spill.write(json.dumps(item) + '\n')
+        self.spilled += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def popleft(self):
+        if not deque.__len__(self) and self.spilled:
+            self._refill()
+        return super(_Frontier, self).popleft()
+
+    def close(self):
+        """Removes the temporary file"""
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+            self.spilled = 0
+
+    def _refill(self):
+        self.spill.seek(self.position)
+        for _ in range(min(self.size, self.spilled)):
+            item = json.loads(self.spill.readline())
+            super(_Frontier, self).append(tuple(item) if isinstance(item, list) else item)
+            self.spilled -= 1
+        self.position = self.spill.tell()
+        if not self.spilled:
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.position = 0
+
+    def __len__(self):
+        return deque.__len__(self) + self.spilled
+
+
+class _Throttle(object):
+    """Spaces out calls to wait() from any number of threads so that
+    there are no more than rate per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next, now)
+            self.next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class Error(Exception):
     """Base class for exceptions.
 
@@ -117,6 +392,25 @@ class ConflictError(Error):
     """Error for conflicts: like trying to create a path which exists"""
     pass
 
+class FixityError(Error):
+    """Error for a binary whose checksum doesn't match the one which
+    Fedora has recorded.
+
+    Attributes:
+        uri (str) -- the uri of the binary
+        algorithm (str) -- the checksum algorithm, like 'sha1'
+        expected (str) -- the checksum of the data which was sent
+        actual (str) -- the checksum which Fedora has
+        message (str) -- an error message
+    """
+
+    def __init__(self, uri, algorithm, expected, actual, message):
+        self.uri = uri
+        self.algorithm = algorithm
+        self.expected = expected
+        self.actual = actual
+        self.message = message
+
 class ResourceError(Error):
     """Base class for API/Resource errors.
 
@@ -146,11 +440,1199 @@ class ResourceError(Error):
 
 
 
-class Repository(object):
-    """Object representing a FC4 repository and associated config values
-       like usernames and passwords.
+CacheEntry = namedtuple('CacheEntry', [ 'response', 'rdf', 'etag', 'last_modified', 'stored' ])
+
+
+class ResourceCache(object):
+    """An LRU cache of parsed RDF for Repository.get.
+
+    Entries are keyed by ( uri, user, variant ), where the uri is outside
+    any transaction and has no trailing slash, and the variant is any
+    request headers which change the representation. An entry older than
+    ttl seconds is dropped; younger entries are revalidated with
+    If-None-Match / If-Modified-Since, and a 304 response reuses the
+    entry's parsed Graph.
+
+    The cached Graph is never handed out: each Resource which gets it
+    from the cache has a copy of its own, which is still much cheaper
+    than parsing the RDF again, so callers can change it freely.
+
+    Attributes:
+        size (int) -- the maximum number of entries
+        ttl (float) -- maximum age of an entry in seconds (None for no limit)
+        hits (int) -- lookups which found an entry
+        misses (int) -- lookups which didn't
     """
-    
+
+    def __init__(self, size=1000, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.uris = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """Returns the CacheEntry for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self.ttl is not None and time.time() - entry.stored > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def store(self, key, response, rdf):
+        """Stores a response and its parsed RDF if the response has an ETag
+        or Last-Modified header to revalidate it with. Returns True if it
+        was stored, in which case the cache owns the RDF: callers must use
+        a copy of it."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not ( etag or last_modified ):
+            return False
+        with self.lock:
+            self.entries[key] = CacheEntry(response, rdf, etag, last_modified, time.time())
+            self.entries.move_to_end(key)
+            self.uris.setdefault(key[0], set()).add(key)
+            while len(self.entries) > self.size:
+                self._remove(next(iter(self.entries)))
+        return True
+
+    def invalidate(self, uri):
+        """Removes every entry for uri"""
+        with self.lock:
+            for key in list(self.uris.get(uri, [])):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.uris.clear()
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        keys = self.uris.get(key[0])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.uris[key[0]]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _Series(object):
+    """Count, sum, histogram and byte counts for one set of metric labels"""
+
+    __slots__ = [ 'count', 'seconds', 'buckets', 'sent', 'received' ]
+
+    def __init__(self, n):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [ 0 ] * ( n + 1 )
+        self.sent = 0
+        self.received = 0
+
+
+class Metrics(object):
+    """Request metrics for a Repository: counts, bytes sent and received
+    and latency histograms for every HTTP request, labelled with the
+    method, the status class (2xx, 4xx and so on, or 'error' if there was
+    no response) and the logical operation which made the request (like
+    get or grant, or '' for a request made outside one). There's also a
+    count and latency histogram for each call of an operation, labelled
+    with whether it returned or raised an exception.
+
+    A Repository only has a Metrics if the config value metrics is true,
+    or if one is assigned to its metrics attribute:
+
+    repo.metrics = fcrepo4.Metrics()
+    ...
+    print(repo.metrics.prometheus())
+
+    The latency of a streamed request is the time to the response headers.
+
+    Attributes:
+        buckets (list of float) -- histogram bucket upper bounds in seconds
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)
+        self.requests = {}
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def record_request(self, method, status, seconds, sent=0, received=0):
+        """Records one HTTP request. status is None if it raised an
+        exception"""
+        if status is None:
+            status = 'error'
+        else:
+            status = '{}xx'.format(status // 100)
+        key = ( _operation.get() or '', method, status )
+        with self.lock:
+            series = self._observe(self.requests, key, seconds)
+            series.sent += sent
+            series.received += received
+
+    def record_operation(self, name, seconds, ok=True):
+        """Records one call of a logical operation"""
+        with self.lock:
+            self._observe(self.operations, ( name, 'ok' if ok else 'error' ), seconds)
+
+    def _observe(self, table, key, seconds):
+        series = table.get(key)
+        if series is None:
+            series = table[key] = _Series(len(self.buckets))
+        series.count += 1
+        series.seconds += seconds
+        series.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+        return series
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.operations.clear()
+
+    def snapshot(self):
+        """Returns the metrics as a dict with two lists of dicts, requests
+        and operations. Each has its labels, count, seconds (the total
+        latency) and buckets, a dict of the cumulative count for each
+        bucket's upper bound (as a string, like '0.1' or '+Inf'); requests
+        also have bytes_sent and bytes_received."""
+        with self.lock:
+            requests = [ ( key, self._values(s) ) for key, s in self.requests.items() ]
+            operations = [ ( key, self._values(s) ) for key, s in self.operations.items() ]
+        snapshot = { 'requests': [], 'operations': [] }
+        for ( operation, method, status ), values in sorted(requests):
+            values.update(operation=operation, method=method, status=status)
+            snapshot['requests'].append(values)
+        for ( operation, outcome ), values in sorted(operations):
+            values.update(operation=operation, outcome=outcome)
+            del values['bytes_sent'], values['bytes_received']
+            snapshot['operations'].append(values)
+        return snapshot
+
+    def _values(self, series):
+        buckets = OrderedDict()
+        total = 0
+        for bound, n in zip(self.buckets + [ '+Inf' ], series.buckets):
+            total += n
+            buckets[str(bound)] = total
+        return {
+            'count': series.count,
+            'seconds': series.seconds,
+            'buckets': buckets,
+            'bytes_sent': series.sent,
+            'bytes_received': series.received
+            }
+
+    def prometheus(self, prefix='fcrepo4'):
+        """Returns the metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        histograms = [
+            ( 'request_duration_seconds', 'Latency of HTTP requests to Fedora', snapshot['requests'], [ 'operation', 'method', 'status' ] ),
+            ( 'operation_duration_seconds', 'Latency of fcrepo4 operations', snapshot['operations'], [ 'operation', 'outcome' ] )
+            ]
+        for name, help, series, labels in histograms:
+            name = '{}_{}'.format(prefix, name)
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} histogram'.format(name))
+            for values in series:
+                l = _prometheus_labels(values, labels)
+                for bound, n in values['buckets'].items():
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, l, bound, n))
+                lines.append('{}_sum{{{}}} {!r}'.format(name, l, values['seconds']))
+                lines.append('{}_count{{{}}} {}'.format(name, l, values['count']))
+        for field, help in [ ( 'bytes_sent', 'Bytes sent to Fedora' ), ( 'bytes_received', 'Bytes received from Fedora' ) ]:
+            name = '{}_request_{}_total'.format(prefix, field)
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} counter'.format(name))
+            for values in snapshot['requests']:
+                l = _prometheus_labels(values, [ 'operation', 'method', 'status' ])
+                lines.append('{}{{{}}} {}'.format(name, l, values[field]))
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(values, labels):
+    return ','.join('{}="{}"'.format(l, values[l].replace('\\', '\\\\').replace('"', '\\"')) for l in labels)
+
+
+class Span(object):
+    """A timed call of a Repository, Resource or Acl method, or a request
+    made by one: see Tracer.
+
+    The sizes and request counts of a span include those of all of the
+    spans nested inside it.
+
+    Attributes:
+        name (str) -- like 'Acl.grant' for a method, or 'GET' for a request
+        span_id (int) -- unique within the Tracer
+        parent (Span) -- the span this one is nested in, or None
+        trace_id (int) -- the span_id of the outermost span
+        attributes (dict) -- like uri, and status for a request
+        start (float) -- the start time (seconds since the epoch)
+        seconds (float) -- the duration
+        requests (int) -- the number of HTTP requests
+        bytes_sent (int) -- bytes in the bodies of the requests
+        bytes_received (int) -- bytes in the bodies of the responses
+        error (str) -- the exception raised, if there was one
+        children (list of Span) -- the spans nested in this one
+        profile (cProfile.Profile) -- if the span was profiled
+    """
+
+    __slots__ = [ 'name', 'span_id', 'parent', 'trace_id', 'attributes', 'start', 'seconds',
+                  'requests', 'bytes_sent', 'bytes_received', 'error', 'children', 'profile',
+                  '_started', '_token' ]
+
+    def __init__(self, name, span_id, parent, attributes):
+        self.name = name
+        self.span_id = span_id
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else span_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.seconds = None
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.error = None
+        self.children = []
+        self.profile = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def walk(self, depth=0):
+        """Yields ( depth, span ) for this span and all of its descendants"""
+        yield depth, self
+        for child in self.children:
+            for d in child.walk(depth + 1):
+                yield d
+
+    def as_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start': self.start,
+            'seconds': self.seconds,
+            'requests': self.requests,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'error': self.error,
+            'attributes': self.attributes
+            }
+
+    def __repr__(self):
+        return "<Span {} {} {:.1f}ms>".format(self.span_id, self.name, ( self.seconds or 0 ) * 1000)
+
+
+class MemoryCollector(object):
+    """Keeps the spans finished by a Tracer in a list.
+
+    Attributes:
+        spans (list of Span) -- every finished span, in the order in which
+                                they finished
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def collect(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def traces(self):
+        """Returns the outermost spans, with the others nested inside them"""
+        with self.lock:
+            return [ s for s in self.spans if s.parent is None ]
+
+    def clear(self):
+        with self.lock:
+            del self.spans[:]
+
+    def close(self):
+        pass
+
+
+class JsonlCollector(object):
+    """Writes the spans finished by a Tracer to a file, one JSON object
+    (see Span.as_dict) per line. Nesting is given by parent_id.
+
+    Parameters:
+    out (str or file) -- a filename (which is appended to) or an open
+                         text file
+    """
+
+    def __init__(self, out):
+        if isinstance(out, str):
+            self.fh = open(out, 'a')
+            self.own = True
+        else:
+            self.fh = out
+            self.own = False
+        self.lock = threading.Lock()
+
+    def collect(self, span):
+        line = json.dumps(span.as_dict(), default=str)
+        with self.lock:
+            self.fh.write(line + '\n')
+            self.fh.flush()
+
+    def close(self):
+        if self.own:
+            self.fh.close()
+
+
+class Tracer(object):
+    """Times the methods of a Repository and its Resources, and the HTTP
+    requests they make, as a tree of Spans. Each call of a public method
+    which talks to Fedora gets a span, and the requests and calls made
+    inside it are nested inside it: for example, an Acl.grant span has
+    the spans of the Repository.get, Resource.rdf_write and Auth.put it
+    calls, and they have the spans of their requests.
+
+    repo.tracer = fcrepo4.Tracer(fcrepo4.MemoryCollector())
+    acl.grant('alice', fcrepo4.READ, uri)
+    for trace in repo.tracer.collector.traces():
+        for depth, span in trace.walk():
+            print('  ' * depth, span)
+
+    The config value trace starts a Tracer which writes the spans to that
+    file with a JsonlCollector.
+
+    If profile is set to the name of a span, like 'Acl.grant', each span
+    with that name is run under cProfile (unless there's already a profile
+    running), and the cProfile.Profile is kept in the span's profile
+    attribute and in profiles. Only the thread which started the span is
+    profiled. If profile_dir is set, the stats are also dumped to a file
+    named after the span.
+
+    Attributes:
+        collector -- a MemoryCollector, JsonlCollector or any object with
+                     collect(span) and close() methods
+        profiles (list of Span) -- the spans which have been profiled
+    """
+
+    def __init__(self, collector=None, profile=None, profile_dir=None):
+        self.collector = collector if collector is not None else MemoryCollector()
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.profiles = []
+        self.profiling = False
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self, name, **attributes):
+        """Starts a span nested in the current one and makes it current"""
+        span = Span(name, next(self.ids), _span.get(), attributes)
+        span._token = _span.set(span)
+        if name == self.profile and not self.profiling:
+            self._start_profile(span)
+        return span
+
+    def finish(self, span, error=None):
+        """Ends a span started with start, and makes its parent current"""
+        span.seconds = time.perf_counter() - span._started
+        if error is not None:
+            span.error = '{}: {}'.format(type(error).__name__, getattr(error, 'message', error))
+        if span.profile is not None:
+            self._stop_profile(span)
+        try:
+            _span.reset(span._token)
+        except ValueError:
+            # finished in a different context from the one it started in
+            _span.set(span.parent)
+        span._token = None
+        parent = span.parent
+        if parent is not None:
+            with self.lock:
+                parent.children.append(span)
+                parent.requests += span.requests
+                parent.bytes_sent += span.bytes_sent
+                parent.bytes_received += span.bytes_received
+        self.collector.collect(span)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """A context manager for a span of the caller's own, to group the
+        spans of several calls:
+
+        with repo.tracer.span('ingest', batch=3):
+            ...
+        """
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        self.finish(span)
+
+    def request(self, span, status, sent, received):
+        """Records the result of an HTTP request in its span"""
+        span.attributes['status'] = status
+        span.requests = 1
+        span.bytes_sent = sent
+        span.bytes_received = received
+
+    def close(self):
+        self.collector.close()
+
+    def _start_profile(self, span):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is already active
+            return
+        self.profiling = True
+        span.profile = profile
+
+    def _stop_profile(self, span):
+        span.profile.disable()
+        self.profiling = False
+        self.profiles.append(span)
+        if self.profile_dir:
+            filename = '{}-{}.prof'.format(span.name, span.span_id)
+            span.profile.dump_stats(os.path.join(self.profile_dir, filename))
+
+
+# the logical operation (see instrument) and the tracing span in progress
+# in this thread or task
+
+_operation = contextvars.ContextVar('fcrepo4_operation', default=None)
+
+_span = contextvars.ContextVar('fcrepo4_span', default=None)
+
+
+class _Operation(object):
+    """Context manager which records a call of an instrumented method in
+    the repository's Metrics and Tracer"""
+
+    __slots__ = [ 'metrics', 'tracer', 'name', 'span_name', 'uri', 'token', 'started', 'span' ]
+
+    def __init__(self, metrics, tracer, name, span_name, uri):
+        self.metrics = metrics
+        self.tracer = tracer
+        self.name = name
+        self.span_name = span_name
+        self.uri = uri
+        self.token = None
+        self.span = None
+
+    def __enter__(self):
+        if self.metrics is not None and _operation.get() is None:
+            self.token = _operation.set(self.name)
+            self.started = time.perf_counter()
+        if self.tracer is not None:
+            self.span = self.tracer.start(self.span_name, uri=self.uri)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.span is not None:
+            self.tracer.finish(self.span, exc_value)
+        if self.token is not None:
+            _operation.reset(self.token)
+            self.metrics.record_operation(self.name, time.perf_counter() - self.started, exc_type is None)
+
+
+def _operation_uri(obj, args):
+    """The uri of a Resource, or the uri argument of a Repository method"""
+    if hasattr(obj, 'repo'):
+        return getattr(obj, 'uri', None)
+    if args and isinstance(args[0], str):
+        return args[0]
+    return None
+
+
+def instrument(name):
+    """Decorator for the public methods of Repository, Resource and Acl
+    which talk to Fedora. If the repository has Metrics, each call is
+    recorded as the logical operation name, and the HTTP requests made
+    during it are labelled with name: operations called by another
+    operation (like the get which grant does) are counted as part of the
+    outer one. If it has a Tracer, each call gets a span. Works on
+    coroutines and generators as well as ordinary methods: a generator's
+    operation starts at the first next() and ends when it's exhausted or
+    closed.
+
+    When metrics and tracing are disabled, the only cost is a check of
+    repo.metrics and repo.tracer.
+    """
+    def decorator(fn):
+        span_name = fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(self, *args, **kwargs):
+                repo = getattr(self, 'repo', self)
+                if repo.metrics is None and repo.tracer is None:
+                    return await fn(self, *args, **kwargs)
+                with _Operation(repo.metrics, repo.tracer, name, span_name, _operation_uri(self, args)):
+                    return await fn(self, *args, **kwargs)
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                repo = getattr(self, 'repo', self)
+                if repo.metrics is None and repo.tracer is None:
+                    yield from fn(self, *args, **kwargs)
+                    return
+                # each step runs in a context of the generator's own, so that
+                # the operation and span don't leak into the caller's code
+                # between yields
+                context = contextvars.copy_context()
+                operation = _Operation(repo.metrics, repo.tracer, name, span_name, _operation_uri(self, args))
+                context.run(operation.__enter__)
+                generator = fn(self, *args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        try:
+                            item = context.run(next, generator)
+                        except StopIteration:
+                            return
+                        yield item
+                except GeneratorExit:
+                    raise
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    try:
+                        context.run(generator.close)
+                    finally:
+                        context.run(operation.__exit__, type(error) if error else None, error, None)
+        else:
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                repo = getattr(self, 'repo', self)
+                if repo.metrics is None and repo.tracer is None:
+                    return fn(self, *args, **kwargs)
+                with _Operation(repo.metrics, repo.tracer, name, span_name, _operation_uri(self, args)):
+                    return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _request_size(response, data):
+    """The number of bytes in a request body"""
+    length = response.request.headers.get('Content-Length')
+    if length:
+        return int(length)
+    if isinstance(data, UploadStream):
+        return data.bytes
+    return 0
+
+
+def _response_size(response, stream):
+    """The number of bytes in a response body, or in its Content-Length
+    header if it's streamed and hasn't been read"""
+    if not stream:
+        return len(response.content)
+    return int(response.headers.get('Content-Length') or 0)
+
+
+UploadStats = namedtuple('UploadStats', [ 'bytes', 'seconds', 'rate', 'chunk_size' ])
+UploadStats.__doc__ = """Throughput of an upload: rate is in bytes per second"""
+
+
+class UploadStream(object):
+    """The body of a binary upload: an iterable of chunks of bytes read
+    from a file-like object or an iterator.
+
+    If readahead is more than zero, the source is read by a separate
+    thread, which keeps up to readahead chunks in a queue, so that reading
+    the source (for example, downloading it from a URL) overlaps sending
+    it. If the length is known, it's available to requests (as self.len)
+    so that the upload has a Content-Length. Checksums for each of the
+    hashlib algorithms are computed as the chunks are read.
+
+    Attributes:
+        bytes (int) -- the number of bytes sent so far
+        chunk_size (int) -- the size of chunk read from a file-like source
+    """
+
+    def __init__(self, source, chunk_size=UPLOAD_CHUNK, length=None, readahead=UPLOAD_READAHEAD, algorithms=None):
+        self.source = source
+        self.hashes = { a: hashlib.new(a) for a in ( algorithms or [] ) }
+        self.chunk_size = chunk_size
+        self.readahead = readahead
+        if length:
+            self.len = length
+        self.bytes = 0
+        self.start = None
+        self.end = None
+
+    def __iter__(self):
+        self.start = time.time()
+        chunks = self._read_ahead() if self.readahead > 0 else self._chunks()
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+        self.end = time.time()
+
+    def stats(self):
+        """Returns an UploadStats for the bytes sent so far"""
+        if self.start is None:
+            return UploadStats(0, 0.0, 0.0, self.chunk_size)
+        seconds = ( self.end or time.time() ) - self.start
+        rate = self.bytes / seconds if seconds > 0 else 0.0
+        return UploadStats(self.bytes, seconds, rate, self.chunk_size)
+
+    def checksums(self):
+        """Returns the hex checksums of the bytes read, by algorithm"""
+        return { a: h.hexdigest() for a, h in self.hashes.items() }
+
+    def _chunks(self):
+        for chunk in self._read():
+            for h in self.hashes.values():
+                h.update(chunk)
+            yield chunk
+
+    def _read(self):
+        if hasattr(self.source, 'read'):
+            while True:
+                chunk = self.source.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            for chunk in self.source:
+                if chunk:
+                    yield chunk
+
+    def _read_ahead(self):
+        chunks = queue.Queue(self.readahead)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read():
+            try:
+                for chunk in self._chunks():
+                    if not put(chunk):
+                        return
+                put(_END)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=read, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+
+def _remaining(source):
+    """Returns the number of bytes left to read in a file-like object, or
+    None if it can't be worked out"""
+    try:
+        return os.fstat(source.fileno()).st_size - source.tell()
+    except Exception:
+        pass
+    try:
+        return len(source.getbuffer()) - source.tell()
+    except Exception:
+        return None
+
+
+_NT_TERM = r'(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:@[A-Za-z0-9-]+|\^\^<[^>]*>)?)'
+
+_NT_LINE = re.compile(r'^\s*{0}\s*{0}\s*{0}\s*\.\s*$'.format(_NT_TERM))
+
+_NQ_LINE = re.compile(r'^\s*{0}\s*{0}\s*{0}\s*(?:(<[^>]*>)\s*)?\.\s*$'.format(_NT_TERM))
+
+_NT_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+_NT_UNESCAPE = { 't': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f' }
+
+_NT_QUOTE = str.maketrans({ '\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r' })
+
+
+def _nt_unescape(m):
+    if m.group(3) is not None:
+        return _NT_UNESCAPE.get(m.group(3), m.group(3))
+    return chr(int(m.group(1) or m.group(2), 16))
+
+
+def parse_ntriples(text, graph=None):
+    """Parses N-Triples into an rdflib Graph (a new one unless graph is
+    given) a line at a time, which is much faster than rdflib's parsers.
+    If any line isn't simple N-Triples, the whole text is handed over to
+    rdflib instead."""
+    if graph is None:
+        graph = Graph()
+    triples = []
+    uris = {}
+    bnodes = {}
+
+    def term(t):
+        c = t[0]
+        if c == '<':
+            u = uris.get(t)
+            if u is None:
+                u = uris[t] = URIRef(t[1:-1])
+            return u
+        if c == '_':
+            b = bnodes.get(t)
+            if b is None:
+                b = bnodes[t] = BNode()
+            return b
+        end = t.rindex('"')
+        value = t[1:end]
+        if '\\' in value:
+            value = _NT_ESCAPE.sub(_nt_unescape, value)
+        rest = t[end + 1:]
+        if rest[:1] == '@':
+            return Literal(value, lang=rest[1:])
+        if rest[:2] == '^^':
+            return Literal(value, datatype=URIRef(rest[3:-1]))
+        return Literal(value)
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] == '#':
+            continue
+        m = _NT_LINE.match(line)
+        if not m:
+            graph.parse(data=text, format='nt')
+            return graph
+        triples.append(( term(m.group(1)), term(m.group(2)), term(m.group(3)) ))
+    graph.addN([ t + ( graph, ) for t in triples ])
+    return graph
+
+
+def _nt_term(term):
+    """Serialises an rdflib term as N-Triples"""
+    if isinstance(term, Literal):
+        value = '"' + str(term).translate(_NT_QUOTE) + '"'
+        if term.language:
+            return value + '@' + term.language
+        if term.datatype:
+            return value + '^^<' + str(term.datatype) + '>'
+        return value
+    if isinstance(term, BNode):
+        return '_:' + str(term)
+    return '<' + str(term) + '>'
+
+
+def serialize_ntriples(graph):
+    """Serialises an rdflib Graph (or any iterable of triples) as
+    N-Triples"""
+    return ''.join([ '{} {} {} .\n'.format(_nt_term(s), _nt_term(p), _nt_term(o)) for s, p, o in graph ])
+
+
+def parse_rdf(text, mime=RDF_MIME):
+    """Parses serialised RDF of one of the RDF_FORMATS into a Graph"""
+    if mime == NTRIPLES_MIME:
+        return parse_ntriples(text)
+    g = Graph()
+    g.parse(data=text, format=RDF_MIMES.get(mime, RDF_PARSE))
+    return g
+
+
+def _has_relative_uris(rdf):
+    """Returns True if a graph has URIs like the URIRef("") which dc_rdf
+    uses for a new container, which can't be written as N-Triples"""
+    for s, p, o in rdf:
+        for t in ( s, o ):
+            if isinstance(t, URIRef) and ':' not in t:
+                return True
+    return False
+
+
+def _server_managed(p, o):
+    """Returns True if a triple with predicate p and object o is one of
+    the ones which Fedora manages itself, and won't accept in a PUT"""
+    if p.startswith(FC4_URL) or p.startswith(LDP_URL):
+        return True
+    if p == RDF.type and isinstance(o, URIRef):
+        return o.startswith(FC4_URL) or o.startswith(LDP_URL)
+    return False
+
+
+def _utc(timestamp):
+    """Converts a datetime, an ISO 8601 string or a POSIX timestamp to a
+    timezone-aware datetime: naive ones are taken to be in UTC"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, ( int, float )):
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+
+def _media_type(response):
+    """Returns the MIME type of a response without any parameters"""
+    return response.headers.get('Content-type', '').split(';')[0].strip().lower()
+
+
+def _copy_graph(rdf):
+    """Returns a copy of an rdflib Graph with the same namespace bindings,
+    so that cached graphs aren't changed by callers"""
+    if isinstance(rdf, TripleStore):
+        return rdf.copy()
+    g = Graph()
+    for prefix, namespace in rdf.namespaces():
+        g.bind(prefix, namespace)
+    g += rdf
+    return g
+
+
+
+# predicates are shared between all of the TripleStores, as the same few
+# are used by every resource. Only the first _PREDICATES_MAX are kept, so
+# that a long-running process which sees lots of different predicates
+# doesn't grow the table forever.
+
+_PREDICATES = {}
+_PREDICATES_MAX = 4096
+
+
+def _predicate(p):
+    """Returns the shared copy of a predicate"""
+    shared = _PREDICATES.get(p)
+    if shared is not None:
+        return shared
+    if len(_PREDICATES) < _PREDICATES_MAX:
+        _PREDICATES[p] = p
+    return p
+
+
+# a TripleStore keeps the objects of a predicate in a list until there are
+# more than this many, and then in a dict, so that checking for duplicates
+# doesn't get slow for predicates like ldp:contains
+
+_SHORT_OBJECTS = 8
+
+
+class TripleStore(object):
+    """A compact store for the triples of a resource, indexed by subject
+    and then predicate, which can be used in place of an rdflib Graph.
+
+    It has the parts of Graph's API which Resource uses - add, remove,
+    triples, objects, predicate_objects, bind, serialize and so on - and
+    graph() converts it to a real Graph when one is needed. Repositories
+    use it for the RDF they fetch if the config value rdf_store is
+    'compact'. It uses much less memory than a Graph, which matters when
+    a lot of resources are kept at once.
+    """
+
+    __slots__ = [ 'index', 'bindings' ]
+
+    def __init__(self, triples=None):
+        self.index = {}
+        self.bindings = None
+        if triples is not None:
+            if isinstance(triples, Graph):
+                self.addN([ t + ( None, ) for t in triples ])
+            else:
+                for t in triples:
+                    self.add(t)
+
+    def add(self, triple):
+        s, p, o = triple
+        preds = self.index.get(s)
+        if preds is None:
+            preds = self.index[s] = {}
+        p = _predicate(p)
+        objs = preds.get(p)
+        if objs is None:
+            preds[p] = [ o ]
+        elif type(objs) is list and len(objs) < _SHORT_OBJECTS:
+            if o not in objs:
+                objs.append(o)
+        else:
+            if type(objs) is list:
+                objs = preds[p] = dict.fromkeys(objs)
+            objs[o] = None
+
+    def addN(self, quads):
+        """Adds ( s, p, o, context ) quads, ignoring the context, like
+        Graph.addN"""
+        if self.index:
+            for s, p, o, c in quads:
+                self.add(( s, p, o ))
+            return
+        for t in dict.fromkeys([ q[:3] for q in quads ]):
+            s, p, o = t
+            preds = self.index.get(s)
+            if preds is None:
+                preds = self.index[s] = {}
+            objs = preds.get(p)
+            if objs is None:
+                preds[_predicate(p)] = [ o ]
+            else:
+                objs.append(o)
+        for preds in self.index.values():
+            for p, objs in preds.items():
+                if len(objs) > _SHORT_OBJECTS:
+                    preds[p] = dict.fromkeys(objs)
+
+    def remove(self, triple):
+        """Removes triples: any of s, p and o can be None"""
+        s, p, o = triple
+        subjects = list(self.index) if s is None else [ s ]
+        for s1 in subjects:
+            preds = self.index.get(s1)
+            if preds is None:
+                continue
+            for p1 in ( list(preds) if p is None else [ p ] ):
+                objs = preds.get(p1)
+                if objs is None:
+                    continue
+                if o is None:
+                    del preds[p1]
+                elif o in objs:
+                    if type(objs) is list:
+                        objs.remove(o)
+                    else:
+                        del objs[o]
+                    if not objs:
+                        del preds[p1]
+            if not preds:
+                del self.index[s1]
+
+    def triples(self, triple):
+        s, p, o = triple
+        if s is None:
+            subjects = self.index.items()
+        elif s in self.index:
+            subjects = [ ( s, self.index[s] ) ]
+        else:
+            return
+        for s1, preds in subjects:
+            if p is None:
+                pos = preds.items()
+            elif p in preds:
+                pos = [ ( p, preds[p] ) ]
+            else:
+                continue
+            for p1, objs in pos:
+                if o is None:
+                    for o1 in objs:
+                        yield ( s1, p1, o1 )
+                elif o in objs:
+                    yield ( s1, p1, o )
+
+    def objects(self, subject=None, predicate=None):
+        if subject is not None and predicate is not None:
+            return iter(self.index.get(subject, {}).get(predicate, ()))
+        return ( o for s, p, o in self.triples(( subject, predicate, None )) )
+
+    def predicate_objects(self, subject=None):
+        return ( ( p, o ) for s, p, o in self.triples(( subject, None, None )) )
+
+    def __iter__(self):
+        return self.triples(( None, None, None ))
+
+    def __len__(self):
+        return sum([ len(objs) for preds in self.index.values() for objs in preds.values() ])
+
+    def __contains__(self, triple):
+        return any(True for t in self.triples(triple))
+
+    def bind(self, prefix, namespace, override=True):
+        if self.bindings is None:
+            self.bindings = {}
+        self.bindings[prefix] = URIRef(namespace)
+
+    def namespaces(self):
+        return iter(( self.bindings or {} ).items())
+
+    def parse(self, data, format=RDF_PARSE):
+        """Parses serialised RDF with rdflib and adds its triples"""
+        self.addN([ t + ( None, ) for t in Graph().parse(data=data, format=format) ])
+        return self
+
+    def copy(self):
+        store = TripleStore()
+        store.index = { s: { p: objs.copy() for p, objs in preds.items() } for s, preds in self.index.items() }
+        if self.bindings:
+            store.bindings = dict(self.bindings)
+        return store
+
+    def graph(self):
+        """Returns the triples as an rdflib Graph"""
+        g = Graph()
+        for prefix, namespace in self.namespaces():
+            g.bind(prefix, namespace)
+        g.addN([ t + ( g, ) for t in self ])
+        return g
+
+    def serialize(self, *args, **kwargs):
+        return self.graph().serialize(*args, **kwargs)
+
+
+
+class Index(object):
+    """A local sqlite index of the metadata of a repository's containers,
+    which Repository keeps up to date as containers are added, written
+    and deleted through it, so that they can be looked up straight away
+    rather than waiting for Fedora's indexing (like Solr) to catch up.
+
+    The DC fields (DC_FIELDS) are columns of the resources table, and
+    every triple whose subject is the resource is in the triples table,
+    indexed by predicate and object. Containment triples are left out.
+    Values are compared as strings.
+
+    Changes made in a transaction are applied to the index when it's
+    committed, and dropped if it's rolled back. Changes made by other
+    clients aren't seen: use Repository.reindex to rebuild the index for
+    a subtree.
+
+    repo.index = fcrepo4.Index('index.db')
+    uris = repo.index.find(creator='Alice', type='Text')
+
+    Parameters:
+    path (str) -- the sqlite database: by default it's in memory
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        columns = ', '.join([ '"{}" TEXT'.format(f) for f in DC_FIELDS ])
+        with self.lock:
+            if path != ':memory:':
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS resources ( uri TEXT PRIMARY KEY, indexed REAL, {} )".format(columns))
+            self.db.execute("CREATE TABLE IF NOT EXISTS triples ( uri TEXT, predicate TEXT, object TEXT )")
+            self.db.execute("CREATE INDEX IF NOT EXISTS triples_uri ON triples ( uri )")
+            self.db.execute("CREATE INDEX IF NOT EXISTS triples_predicate_object ON triples ( predicate, object )")
+            self.db.execute("CREATE INDEX IF NOT EXISTS triples_object ON triples ( object )")
+            for f in DC_FIELDS:
+                self.db.execute('CREATE INDEX IF NOT EXISTS resources_{0} ON resources ( "{0}" )'.format(f))
+
+    def update(self, uri, pairs):
+        """Replaces the entry for uri with a list of ( predicate, object )
+        pairs"""
+        fields = {}
+        rows = []
+        for p, o in pairs:
+            if p == LDP_CONTAINS:
+                continue
+            rows.append(( uri, str(p), str(o) ))
+            field = DC_PREDICATES.get(p)
+            if field and field not in fields:
+                fields[field] = str(o)
+        values = [ uri, time.time() ] + [ fields.get(f) for f in DC_FIELDS ]
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute("DELETE FROM triples WHERE uri = ?", ( uri, ))
+                self.db.execute("INSERT OR REPLACE INTO resources VALUES ( {} )".format(', '.join('?' * len(values))), values)
+                self.db.executemany("INSERT INTO triples VALUES ( ?, ?, ? )", rows)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def remove(self, uri):
+        """Removes the entries for uri and everything below it"""
+        uri = uri.rstrip('/')
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                # an exact prefix match: LIKE would treat _ and % in uris as wildcards
+                for table in [ 'resources', 'triples' ]:
+                    self.db.execute("DELETE FROM {} WHERE uri = ? OR substr(uri, 1, ?) = ?".format(table), ( uri, len(uri) + 1, uri + '/' ))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def find(self, **fields):
+        """Returns a sorted list of the uris of the resources whose DC
+        fields have all of the given values, like
+
+        find(title='Bird', creator='Alice')
+        """
+        unknown = [ f for f in fields if f not in DC_FIELDS ]
+        if unknown:
+            raise Error("Not DC fields: {}".format(', '.join(unknown)))
+        where = []
+        args = []
+        for field, value in sorted(fields.items()):
+            # the column has the first value: the others are in triples
+            where.append('( "{}" = ? OR uri IN ( SELECT uri FROM triples WHERE predicate = ? AND object = ? ) )'.format(field))
+            args += [ str(value), str(DC[field]), str(value) ]
+        sql = "SELECT uri FROM resources"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.lock:
+            return sorted([ row[0] for row in self.db.execute(sql, args) ])
+
+    def search(self, predicate, object=None):
+        """Returns a sorted list of the uris of the resources with a triple
+        with predicate (and object, if it's given)"""
+        with self.lock:
+            if object is None:
+                rows = self.db.execute("SELECT DISTINCT uri FROM triples WHERE predicate = ?", ( str(predicate), ))
+            else:
+                rows = self.db.execute("SELECT DISTINCT uri FROM triples WHERE predicate = ? AND object = ?", ( str(predicate), str(object) ))
+            return sorted([ row[0] for row in rows ])
+
+    def dc(self, uri):
+        """Returns the DC columns for uri as a dict, or None if it's not in
+        the index"""
+        with self.lock:
+            row = self.db.execute("SELECT {} FROM resources WHERE uri = ?".format(', '.join('"{}"'.format(f) for f in DC_FIELDS)), ( uri, )).fetchone()
+        if row is None:
+            return None
+        return { f: v for f, v in zip(DC_FIELDS, row) if v is not None }
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM resources")
+            self.db.execute("DELETE FROM triples")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+
+class BaseRepository(object):
+    """The parts of a connection to a Fedora repository which don't make
+    requests: the config values and users, uri and path conversions,
+    building and serialising RDF, and the bookkeeping for the cache and
+    the index. Repository adds the methods which talk to Fedora, and
+    fcrepo4async.AsyncRepository adds coroutine versions of some of them.
+
+    Subclasses provide _make_session, which __init__ calls to set up the
+    HTTP session.
+    """
+
     def __init__(self, config='config.yml', user='user', loglevel=logging.WARNING):
         """"""
         self.logger = logging.getLogger(__name__)
@@ -181,6 +1663,25 @@ class Repository(object):
             self.logger.debug("Dumping rdf to {}".format(self.rdfdump))
         else:
             self.rdfdump = None
+        self.upload_chunk = configd.get('upload_chunk', 'auto')
+        self.checksums = configd.get('checksums') or []
+        self.upload_readahead = int(configd.get('upload_readahead', UPLOAD_READAHEAD))
+        self.rdf_format = configd.get('rdf_format', 'turtle')
+        if self.rdf_format not in RDF_FORMATS:
+            message = "Config value rdf_format must be one of {}".format(', '.join(sorted(RDF_FORMATS)))
+            self.logger.critical(message)
+            raise Error(message)
+        self.rdf_mime = RDF_FORMATS[self.rdf_format][0]
+        self.rdf_store = configd.get('rdf_store', 'graph')
+        if self.rdf_store not in [ 'graph', 'compact' ]:
+            message = "Config value rdf_store must be graph or compact"
+            self.logger.critical(message)
+            raise Error(message)
+        self.rdf_write_method = str(configd.get('rdf_write', 'PUT')).upper()
+        if self.rdf_write_method not in [ 'PUT', 'PATCH' ]:
+            message = "Config value rdf_write must be PUT or PATCH"
+            self.logger.critical(message)
+            raise Error(message)
         if 'delegated' in configd:
             self.delegated = bool(configd['delegated'])
         else:
@@ -188,10 +1689,29 @@ class Repository(object):
         self.set_user(user)
         if self.uri[-1:] != '/':
             self.uri += '/'
-        self.pathre = re.compile("^{}rest/(.*)$".format(self.uri))
+        self.pathre = re.compile("^{}rest/(?:tx:[^/]+/?)?(.*)$".format(self.uri))
         self.cf = configd
+        self.tx = None
+        self.tx_keepalive = float(configd.get('tx_keepalive', TX_KEEPALIVE))
+        self.session = self._make_session(configd)
+        if configd.get('cache_size'):
+            self.cache = ResourceCache(int(configd['cache_size']), configd.get('cache_ttl'))
+        else:
+            self.cache = None
+        if configd.get('metrics'):
+            self.metrics = Metrics()
+        else:
+            self.metrics = None
+        if configd.get('index'):
+            self.index = Index(configd['index'])
+        else:
+            self.index = None
+        if configd.get('trace'):
+            self.tracer = Tracer(JsonlCollector(configd['trace']), configd.get('trace_profile'))
+        else:
+            self.tracer = None
+
 
-        
     def set_user(self, user):
         """Sets the current user.
 
@@ -207,6 +1727,11 @@ class Repository(object):
             message = "Couldn't find user '{}' in config".format(user)
             self.logger.error(message)
             raise Error(message)
+        if self.delegated and self.user != 'fedoraAdmin':
+            admin = self.users['fedoraAdmin']
+            self.auth = HTTPBasicAuth(admin['user'], admin['password'])
+        else:
+            self.auth = HTTPBasicAuth(self.user, self.password)
 
         
     def load_config(self, conffile):
@@ -226,8 +1751,12 @@ class Repository(object):
         return cf
 
     def path2uri(self, path):
-        """Converts a REST API path to an absolute url"""
-        uri = self.uri + 'rest'
+        """Converts a REST API path to an absolute url. Inside a
+        transaction, the url is in the transaction."""
+        if self.tx:
+            uri = self.tx.uri
+        else:
+            uri = self.uri + 'rest'
         if not path:
             return uri
         if path[0] != '/':
@@ -245,7 +1774,8 @@ class Repository(object):
 
     
     def uri2path(self, uri):
-        """Converts a full uri to a REST path.
+        """Converts a full uri to a REST path. If the uri is in a
+transaction, the path is the resource's path outside the transaction.
 
 Throws an exception if the uri doesn't match this repository
 """
@@ -254,34 +1784,12 @@ Throws an exception if the uri doesn't match this repository
             return m.group(1)
         else:
             raise URIError("Path mismatch - couldn't parse {} to a path in {}".format(uri, self.uri))
-        
-        
-    def api(self, uri, method='GET', headers=None, data=None, auth=None):
-        """
-Generic api call with an HTTP method, target URL and headers, data (for
-plain POST) or files (for file uploads)
 
-Default method is GET.
-"""
-        self.uri2path(uri)  # safety check: will throw an URI error if it's bad
-        if method in METHODS:
-            m = METHODS[method]
-            self.logger.debug("API {} {}".format(method, uri))
-            self.logger.debug("Authentication: {} {}".format(self.user, self.password))
-            if self.delegated and self.user != 'fedoraAdmin':
-                auth = ( self.users['fedoraAdmin']['user'], self.users['fedoraAdmin']['password'] )
-                if not headers:
-                    headers = {}
-                headers['On-Behalf-Of'] = self.user
-                self.logger.debug("Delegated authentication as {}".format(self.user))
-            else:
-                auth = (self.user, self.password)
-            if headers:
-                self.logger.debug("headers={}".format(headers))
-            r = m(uri, auth=auth, headers=headers, data=data)
-            return r
-        else:
-            return None
+    def canonical_uri(self, uri):
+        """Converts a uri which may be in a transaction to the uri of the
+        resource outside any transaction, which is the one to use once the
+        transaction has been committed."""
+        return self.uri + 'rest/' + self.uri2path(uri)
 
     def pathconcat(self, path, s):
         """Appends a suffix like fc:tombstone to a path"""
@@ -314,7 +1822,372 @@ Default method is GET.
                 g.bind(abbrev, namespace)
         return g
         
-    def get(self, uri, headers=None):
+    def record_rdf(self, record):
+        """Builds an RDF Graph from a record which is either a dict of DC
+        fields (see dc_rdf) or a list of ( predicate, object ) tuples (see
+        build_rdf). Graphs are passed through unchanged."""
+        if isinstance(record, Graph):
+            return record
+        if isinstance(record, dict):
+            return self.dc_rdf(record)
+        return self.build_rdf(record)
+
+    def _path_state(self, uri, response):
+        """What a HEAD response says is at uri: 'resource', 'tombstone'
+        or None. Throws a ResourceError for any other error status."""
+        if response.status_code == requests.codes.not_found:
+            return None
+        if response.status_code == requests.codes.gone:
+            return 'tombstone'
+        if response.ok:
+            return 'resource'
+        message = "head {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+        raise ResourceError(uri, self.user, response, message)
+
+    def _index_update(self, uri, rdf):
+        """Updates the index entry for uri with the triples in rdf whose
+        subject is the resource (by its uri or as the relative uri '')"""
+        if self.index is None:
+            return
+        canonical = self.canonical_uri(uri)
+        subjects = set([ URIRef(''), URIRef(uri), URIRef(canonical), URIRef(uri.rstrip('/')) ])
+        self._index_change(self.index.update, canonical.rstrip('/'), [ ( p, o ) for s, p, o in rdf if s in subjects ])
+
+    def _index_remove(self, uri):
+        """Removes the index entries for uri and everything below it"""
+        if self.index is None:
+            return
+        self._index_change(self.index.remove, self.canonical_uri(uri))
+
+    def _index_change(self, method, *args):
+        """Makes a change to the index now or, in a transaction, when the
+        transaction is committed"""
+        if self.tx is not None:
+            self.tx.index_changes.append(( method, args ))
+        else:
+            method(*args)
+
+    def _prefer(self, include=None, omit=None):
+        """Builds the value of a Prefer header from lists of LDP or Fedora
+        projections to include and omit"""
+        prefer = 'return=representation'
+        for param, values in [ ( 'include', include ), ( 'omit', omit ) ]:
+            if values:
+                if isinstance(values, str):
+                    values = [ values ]
+                prefer += '; {}="{}"'.format(param, ' '.join([ str(v) for v in values ]))
+        return prefer
+
+    def _cache_key(self, uri, headers):
+        """Returns the cache key for a get, or None if there's no cache or
+        the request can't be cached (because it's already conditional, or
+        in a transaction)"""
+        if self.cache is None or self.tx:
+            return None
+        variant = []
+        if headers:
+            for h, v in sorted(headers.items()):
+                if h.lower().startswith('if-'):
+                    return None
+                if not ( h.lower() == 'accept' and v == self.rdf_mime ):
+                    variant.append(( h, v ))
+        return ( self._cache_uri(uri), self.user, tuple(variant) )
+
+    def _cache_uri(self, uri):
+        """The uri under which a resource is cached and invalidated: the
+        one outside any transaction, without a trailing slash"""
+        return self.canonical_uri(uri).rstrip('/')
+
+    def _serialize_rdf(self, rdf):
+        """Serialises a Graph in the repository's RDF format, and returns
+        the text and its mime type. Graphs with relative URIs, like the ones
+        from dc_rdf, are written as Turtle, because N-Triples can't
+        express them."""
+        if self.rdf_format == 'ntriples':
+            if not _has_relative_uris(rdf):
+                return serialize_ntriples(rdf), NTRIPLES_MIME
+            return rdf.serialize(format=RDF_PARSE), RDF_MIME
+        mime, parser = RDF_FORMATS[self.rdf_format]
+        return rdf.serialize(format=parser), mime
+
+    def _invalidate(self, uri):
+        """Drops a resource and its parent container from the cache after
+        a request which has changed them"""
+        if self.cache is not None:
+            uri = self._cache_uri(uri)
+            self.cache.invalidate(uri)
+            self.cache.invalidate(uri.rsplit('/', 1)[0])
+
+
+    def _acl_rdf(self):
+        """Builds the RDF which sets a new container's type to Acl"""
+        rdf = Graph()
+        this = URIRef('')
+        rdf.add( ( this, RDF.type, WEBAC_NS['Acl']) )
+        return rdf
+    
+    def _is_url(self, source):
+        """Tries to parse a data source string as a URL. If the result is
+        a http or https URL, returns True.
+        """
+        p = urlparse(source)
+        return p.scheme == 'http' or p.scheme == 'https'
+
+        
+    def _rdf_dump(self, data, uri):
+        if self.rdfdump:
+            try:
+                uri_path = uri.replace('/', '_')
+                dumpf = os.path.join(self.rdfdump, uri_path) + '.ttl'
+                with open(dumpf, 'wb') as df:
+                    self.logger.debug("Dumping RDF to {}".format(dumpf))
+                    df.write(data)
+            except TypeError as te:
+                pass   # this catches errors when data is not a bytes-like
+
+
+class Repository(BaseRepository):
+    """Object representing a FC4 repository and associated config values
+       like usernames and passwords.
+    """
+    
+    def _make_session(self, configd):
+        """Builds the requests.Session through which all of this
+        repository's HTTP requests are made, so that connections to
+        Fedora are pooled and kept alive rather than being opened for
+        every request.
+
+        Config values:
+        pool_connections (int) -- number of per-host pools to cache
+        pool_maxsize (int) -- maximum connections kept open per host
+        pool_block (boolean) -- whether to wait for a free connection
+                                rather than open a new one when the pool
+                                is exhausted
+        keepalive (boolean) -- set to False to close connections after
+                               each request
+        """
+        connections = int(configd.get('pool_connections', POOL_CONNECTIONS))
+        maxsize = int(configd.get('pool_maxsize', POOL_MAXSIZE))
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=connections,
+            pool_maxsize=maxsize,
+            pool_block=bool(configd.get('pool_block', False))
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not configd.get('keepalive', True):
+            session.headers['Connection'] = 'close'
+        self.logger.debug("HTTP pool: {} hosts, {} connections per host".format(connections, maxsize))
+        return session
+
+    def close(self):
+        """Closes the connections in this repository's HTTP pool, and its
+        tracer and index if it has them"""
+        self.session.close()
+        if self.tracer is not None:
+            self.tracer.close()
+        if self.index is not None:
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+        
+    @instrument('transaction')
+    def transaction(self):
+        """Starts a Fedora transaction.
+
+        Until the transaction is committed or rolled back, every request
+        this repository makes is routed through the transaction, and
+        path2uri returns uris inside it. Use it as a context manager to
+        commit at the end of the block, or roll back if there's an
+        exception:
+
+        with repo.transaction():
+            acl.grant('alice', READ, uri)
+            acl.grant('bob', WRITE, uri)
+
+        Resources created or fetched inside the transaction have uris in
+        it: canonical_uri converts them to the permanent uris.
+
+        The transaction belongs to the repository, not to the thread which
+        started it, so requests made by any thread while it's open are
+        made in it. This includes the worker threads of walk,
+        bulk_add_containers, purge, export, import_ and the other
+        concurrent methods, whether they were started inside the with
+        block or not: don't share a Repository between a transaction and
+        work which shouldn't be part of it.
+        """
+        if self.tx:
+            raise Error("Already in transaction {}".format(self.tx.uri))
+        uri = self.uri + 'rest/fcr:tx'
+        response = self.api(uri, method='POST')
+        if response.status_code != requests.codes.created:
+            message = "POST {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+        self.tx = Transaction(self, response.headers['Location'], self.tx_keepalive)
+        self.logger.debug("Started transaction {}".format(self.tx.uri))
+        return self.tx
+        
+        
+    def api(self, uri, method='GET', headers=None, data=None, auth=None, stream=False):
+        """
+Generic api call with an HTTP method, target URL and headers, data (for
+plain POST) or files (for file uploads)
+
+Default method is GET. If stream is True, the body of the response isn't
+read until it's used.
+"""
+        self.uri2path(uri)  # safety check: will throw an URI error if it's bad
+        if self.tx:
+            uri = self.tx.wrap(uri)
+        if method in METHODS:
+            self.logger.debug("API %s %s", method, uri)
+            auth = self.auth
+            if self.delegated and self.user != 'fedoraAdmin':
+                if not headers:
+                    headers = {}
+                headers['On-Behalf-Of'] = self.user
+                self.logger.debug("Delegated authentication as %s", self.user)
+            if headers:
+                self.logger.debug("headers=%s", headers)
+            metrics = self.metrics
+            tracer = self.tracer
+            if metrics is None and tracer is None:
+                return self.session.request(method, uri, auth=auth, headers=headers, data=data, stream=stream)
+            span = tracer.start(method, uri=uri) if tracer is not None else None
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, uri, auth=auth, headers=headers, data=data, stream=stream)
+            except Exception as e:
+                if metrics is not None:
+                    metrics.record_request(method, None, time.perf_counter() - start)
+                if span is not None:
+                    tracer.finish(span, e)
+                raise
+            seconds = time.perf_counter() - start
+            sent = _request_size(r, data)
+            received = _response_size(r, stream)
+            if metrics is not None:
+                metrics.record_request(method, r.status_code, seconds, sent, received)
+            if span is not None:
+                tracer.request(span, r.status_code, sent, received)
+                tracer.finish(span)
+            return r
+        else:
+            return None
+
+    @instrument('bulk_add_containers')
+    def bulk_add_containers(self, uri, records, workers=DEFAULT_WORKERS, slug=None, path=None, force=False, progress=None):
+        """Add a new container inside an existing one for every record in
+        an iterable, using a pool of worker threads.
+
+        Parameters:
+        uri (str) -- the path of the container to add to
+        records (iterable) -- dicts of DC fields, lists of ( p, o ) tuples
+                              or Graphs: see record_rdf
+        workers (int) -- number of requests to have in flight at once
+        slug (str) -- if records are dicts, the field to use as the slug
+        path (str) -- if records are dicts, the field to use as the path
+        force (boolean) -- where path is used, whether to force an overwrite
+        progress (function) -- called as progress(n, result) after each
+                               record is finished
+
+        Errors don't stop the ingest: the returned list has a BulkResult for
+        every record, in the order of the records, with either the new
+        Resource or the exception which was raised for it.
+        """
+        def add(item):
+            i, record = item
+            kwargs = {}
+            if isinstance(record, dict):
+                if slug and record.get(slug):
+                    kwargs['slug'] = record[slug]
+                if path and record.get(path):
+                    kwargs['path'] = record[path]
+                    kwargs['force'] = force
+            return self.add_container(uri, self.record_rdf(record), **kwargs)
+
+        results = []
+        n = 0
+        for ( i, _ ), resource, e in _concurrently(add, enumerate(records), workers):
+            n += 1
+            if e:
+                self.logger.warning("Record {} failed: {}".format(i, getattr(e, 'message', e)))
+            result = BulkResult(i, resource, e)
+            results.append(result)
+            if progress:
+                progress(n, result)
+        results.sort(key=lambda r: r.index)
+        return results
+
+    def walk(self, uri, max_depth=None, workers=DEFAULT_WORKERS, filter=None, on_error=None, omit=None):
+        """A generator which yields the resource at uri and all of its
+        descendants, breadth-first, fetching them concurrently. Requests
+        are made in breadth-first order, and resources are yielded as their
+        requests finish, so a resource is always yielded before any of its
+        children.
+
+        Parameters:
+        uri (str) -- the resource to start at
+        max_depth (int) -- how many levels of children to descend: None
+                           means the whole tree, 0 just the resource at uri
+        workers (int) -- number of requests to have in flight at once
+        filter (function) -- if filter(resource) is False, the resource is
+                             skipped: it isn't yielded and its children
+                             aren't fetched
+        on_error (function) -- if set, errors are passed to
+                               on_error(uri, exception) and the walk carries
+                               on: otherwise the first error is raised
+        omit (list) -- projections to leave out of each resource's RDF
+                       (see get): the containment triples are needed
+
+        Binaries are yielded without their content, which is fetched if it's
+        read with data, iter_bytes or download_to.
+
+        The children of each resource are its LDP_CONTAINS objects. Only a
+        bounded number of fetched resources are held at once, and the uris
+        waiting to be fetched are kept in a _Frontier, which holds up to
+        FRONTIER_SIZE of them in memory and the rest in a temporary file,
+        so the memory used doesn't grow with the size or width of the tree.
+        For example, to skip ACLs:
+
+        for r in repo.walk(uri, filter=lambda r: not isinstance(r, Acl)):
+            ...
+        """
+        pending = _Frontier([ ( uri, 0 ) ])
+
+        def fetch(item):
+            # binaries aren't downloaded unless their content is read
+            resource = self.get(item[0], stream=True, omit=omit)
+            if resource is not None:
+                resource.close()
+            return resource
+
+        try:
+            for ( ruri, depth ), resource, e in _concurrently(fetch, pending, workers):
+                if e:
+                    if not on_error:
+                        raise e
+                    on_error(ruri, e)
+                    continue
+                if not resource:
+                    continue
+                if filter and not filter(resource):
+                    continue
+                if max_depth is None or depth < max_depth:
+                    if resource.rdf is not None:
+                        pending.extend(( str(c), depth + 1 ) for c in resource.children())
+                yield resource
+        finally:
+            pending.close()
+
+    @instrument('get')
+    def get(self, uri, headers=None, stream=False, include=None, omit=None):
         """The basic method for retrieving a resource.
 
         Looks up the resource at uri. If the request is a success, creates
@@ -324,26 +2197,766 @@ Default method is GET.
 
         If the request returned any other kind of non-OK status, throws
         a ResourceError with the status code and reason.
+
+        If stream is True, the content of a binary isn't downloaded until
+        it's read with data, iter_bytes or download_to: close the Resource
+        to give its connection back to the pool without reading it.
+
+        The RDF isn't parsed until the resource's rdf attribute is first
+        used, so callers which only want the status or headers don't pay
+        for it (but see head, which doesn't fetch the body at all).
+
+        If the repository has a cache, RDF resources are revalidated with
+        a conditional request, and if they haven't changed the cached RDF
+        is used rather than parsing it again (see ResourceCache).
+
+        include and omit are lists (or single values) of Prefer header
+        projections like LDP_PREFER_CONTAINMENT or FC4_SERVER_MANAGED, which
+        ask Fedora to leave triples out of the RDF or add extra ones. A
+        resource fetched with a projection only has part of its RDF: in
+        particular, children() is empty if containment was omitted.
         """
 
+        if self.tx:
+            uri = self.tx.wrap(uri)
+        if include or omit:
+            headers = dict(headers or {})
+            headers['Prefer'] = self._prefer(include, omit)
+        key = self._cache_key(uri, headers)
+        entry = None
+        if key:
+            entry = self.cache.lookup(key)
+            if entry:
+                headers = dict(headers or {})
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+        if self.rdf_mime != RDF_MIME and not ( headers and 'Accept' in headers ):
+            headers = dict(headers or {})
+            headers['Accept'] = '{}, */*;q=0.5'.format(self.rdf_mime)
         if headers:
-            response = self.api(uri, headers=headers)
+            response = self.api(uri, headers=headers, stream=stream)
         else:
-            response = self.api(uri)
+            response = self.api(uri, stream=stream)
+        if entry and response.status_code == requests.codes.not_modified:
+            self.logger.debug("{} not modified: using cached RDF".format(uri))
+            resource = Resource(self, uri, response=entry.response)
+            resource.rdf = _copy_graph(entry.rdf)
+            return resource.check_type()
         if response.status_code == requests.codes.ok:
             resource = Resource(self, uri, response=response)
-            if response.headers['Content-type'] == 'text/turtle':
-                resource._parse_rdf(response.text)
+            mime = _media_type(response)
+            if mime in RDF_MIMES:
+                if key:
+                    resource._parse_rdf(response.text, mime)
+                    if self.cache.store(key, response, resource.rdf):
+                        resource.rdf = _copy_graph(resource.rdf)
+                else:
+                    resource._defer_rdf(response.text, mime)
+            else:
+                resource.streamed = stream
+                if key:
+                    self.cache.invalidate(key[0])
             resource = resource.check_type()
             return resource
-        elif response.status_code == requests.codes.not_found:
+        response.close()
+        if key:
+            self.cache.invalidate(key[0])
+        if response.status_code == requests.codes.not_found:
             return None
         else:
             message = "get {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
             raise ResourceError(uri, self.user, response, message)
 
+    @instrument('head')
+    def head(self, uri, headers=None):
+        """Looks up a resource's headers without fetching its content.
+
+        Returns a Resource with the response but no RDF, None if the
+        resource wasn't found, or throws a ResourceError for any other
+        non-OK status.
+        """
+        response = self.api(uri, method='HEAD', headers=headers)
+        if response.status_code == requests.codes.ok:
+            return Resource(self, uri, response=response)
+        if response.status_code == requests.codes.not_found:
+            return None
+        message = "head {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+        raise ResourceError(uri, self.user, response, message)
+
+    @instrument('exists')
+    def exists(self, uri):
+        """Returns True if there's a resource at uri, using HEAD. A
+        deleted resource's tombstone doesn't count."""
+        return self._path_state(uri, self.api(uri, method='HEAD')) == 'resource'
+
+    @instrument('purge')
+    def purge(self, uri, workers=DEFAULT_WORKERS, obliterate=True):
+        """Removes the resource at uri and everything below it, and (if
+        obliterate is True) their tombstones, so that the paths can be
+        used again.
+
+        The subtree is enumerated like walk, and then each level of it is
+        deleted concurrently, starting with the deepest, so that every
+        DELETE is for a resource with no children left and Fedora never
+        has to do a big recursive delete in one request. Each resource's
+        tombstone is obliterated as soon as it's deleted. Tombstones found
+        in the subtree (for example, left by an interrupted purge) are
+        obliterated.
+
+        Requests which get a 429 or 503 response are retried after a
+        backoff (see RETRY_STATUSES). Errors don't stop the purge: they're
+        returned in the PurgeReport.
+
+        Parameters:
+        uri (str) -- the top of the subtree
+        workers (int) -- number of requests to have in flight at once
+        obliterate (boolean) -- whether to remove the tombstones
+
+        Returns a PurgeReport.
+        """
+        start = time.time()
+        counts = { 'deleted': 0, 'obliterated': 0, 'missing': 0, 'retries': 0 }
+        lock = threading.Lock()
+        errors = []
+        levels = {}
+
+        def depth(ruri):
+            return len(self.uri2path(ruri).strip('/').split('/'))
+
+        def count(name, n=1):
+            with lock:
+                counts[name] += n
+
+        def fetch(ruri):
+            backoff = RETRY_BACKOFF
+            for attempt in range(RETRY_RETRIES + 1):
+                try:
+                    resource = self.get(ruri, stream=True)
+                except ResourceError as e:
+                    if e.status_code not in RETRY_STATUSES or attempt == RETRY_RETRIES:
+                        raise
+                    self._retry_wait(ruri, e.response, backoff)
+                    backoff *= 2
+                    count('retries')
+                    continue
+                if resource is not None:
+                    resource.close()
+                return resource
+
+        pending = _Frontier([ uri ])
+        try:
+            for ruri, resource, e in _concurrently(fetch, pending, workers):
+                if e:
+                    if getattr(e, 'status_code', None) == requests.codes.gone:
+                        levels.setdefault(depth(ruri), []).append(( ruri, True ))
+                    else:
+                        errors.append(( ruri, e ))
+                    continue
+                if resource is None:
+                    continue
+                levels.setdefault(depth(ruri), []).append(( ruri, False ))
+                if resource.rdf is not None:
+                    pending.extend(str(c) for c in resource.children())
+        finally:
+            pending.close()
+
+        def remove(item):
+            ruri, tombstone = item
+            if not tombstone:
+                response = self._purge_delete(ruri, count)
+                if response.status_code in [ requests.codes.not_found, requests.codes.gone ]:
+                    count('missing')
+                else:
+                    count('deleted')
+            if obliterate:
+                tombstone_uri = self.pathconcat(ruri, 'fcr:tombstone')
+                response = self._purge_delete(tombstone_uri, count)
+                if response.status_code != requests.codes.not_found:
+                    count('obliterated')
+
+        for level in sorted(levels, reverse=True):
+            self.logger.info("Purging %d resources at depth %d", len(levels[level]), level)
+            for ( ruri, _ ), _, e in _concurrently(remove, levels[level], workers):
+                if e:
+                    self.logger.warning("Purge of %s failed: %s", ruri, getattr(e, 'message', e))
+                    errors.append(( ruri, e ))
+        self._index_remove(uri)
+        return PurgeReport(errors=errors, seconds=time.time() - start, **counts)
+
+    def _purge_delete(self, uri, count):
+        """Sends a DELETE for purge, retrying it with a backoff if the
+        server is rate limiting. Returns the response if it succeeded or
+        the resource wasn't found, and throws a ResourceError otherwise."""
+        response, retries = self._api_retrying(uri, method='DELETE')
+        count('retries', retries)
+        self._invalidate(uri)
+        if response.status_code in [ requests.codes.no_content, requests.codes.ok, requests.codes.not_found, requests.codes.gone ]:
+            return response
+        message = "delete {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+        raise ResourceError(uri, self.user, response, message)
+
+    @instrument('export')
+    def export(self, uri, out, format='nquads', workers=DEFAULT_WORKERS):
+        """Writes the RDF of the resource at uri and all of its descendant
+        containers to a text stream, for import_.
+
+        The resources are fetched concurrently with walk, and each one is
+        written as soon as it arrives, so only a bounded number are held
+        in memory at once. Parents are always written before their
+        children. Server-managed triples (and the containment triples,
+        since import_ rebuilds the tree from the paths) are left out.
+        Binaries are skipped.
+
+        Parameters:
+        uri (str) -- the top of the subtree
+        out (file) -- a text stream to write to
+        format (str) -- 'nquads', with the triples of each resource in a
+                        named graph which is the resource's uri, or
+                        'ndjson', with a JSON object for each resource
+                        with its uri, its path relative to uri and its
+                        triples as lists of three N-Triples terms
+        workers (int) -- number of requests to have in flight at once
+
+        Returns an ExportReport.
+        """
+        if format not in [ 'nquads', 'ndjson' ]:
+            raise Error("Export format must be nquads or ndjson")
+        start = time.time()
+        counts = { 'resources': 0, 'triples': 0, 'binaries': 0 }
+        errors = []
+        root = uri.rstrip('/')
+        if format == 'nquads':
+            out.write('# fcrepo4 export of <{}>\n'.format(root))
+        walk = self.walk(uri, workers=workers, on_error=lambda u, e: errors.append(( u, e )), omit=[ FC4_SERVER_MANAGED ])
+        for resource in walk:
+            if resource.rdf is None:
+                counts['binaries'] += 1
+                continue
+            triples = [ ( _nt_term(s), _nt_term(p), _nt_term(o) ) for s, p, o in resource.rdf if p != LDP_CONTAINS and not _server_managed(p, o) ]
+            ruri = resource.uri.rstrip('/')
+            if format == 'nquads':
+                g = _nt_term(URIRef(ruri))
+                out.write(''.join([ '{} {} {} {} .\n'.format(s, p, o, g) for s, p, o in triples ]))
+            else:
+                record = { 'uri': ruri, 'path': ruri[len(root) + 1:], 'triples': triples }
+                out.write(json.dumps(record) + '\n')
+            counts['resources'] += 1
+            counts['triples'] += len(triples)
+        return ExportReport(errors=errors, seconds=time.time() - start, **counts)
+
+    @instrument('import')
+    def import_(self, stream, target_uri, workers=DEFAULT_WORKERS, force=False):
+        """Recreates a tree of resources written by export under a new uri.
+
+        The exported resource at the top becomes target_uri, and the
+        others get the same paths relative to it, so importing the same
+        export twice (with force) gives the same uris. Subjects and
+        objects which are uris in the exported tree are rewritten to the
+        new ones, and server-managed triples are dropped.
+
+        Resources are created concurrently with add_container, but each
+        one waits until its parent has been created. The stream is read
+        as the resources are created, and no more than twice workers
+        records are held at once (waiting for their parents or being
+        created), however wide the tree, as long as parents come before
+        their children, which export guarantees. If target_uri already
+        exists and force is False, the top resource is reported as an
+        error, but the others are still created inside it.
+
+        Parameters:
+        stream (file) -- a text stream in either of export's formats
+        target_uri (str) -- the uri for the top resource
+        workers (int) -- number of requests to have in flight at once
+        force (boolean) -- whether to replace resources which exist
+
+        Returns an ImportReport. Resources whose parent wasn't created are
+        reported as errors.
+        """
+        start = time.time()
+        target = target_uri.rstrip('/')
+        parent_uri, name = target.rsplit('/', 1)
+        errors = []
+        created = set([ None ])
+        failed = set()
+        waiting = {}
+        ready = deque()
+        window = workers * 2
+        counts = { 'waiting': 0, 'queued': 0, 'finished': 0 }
+        records = self._import_records(stream)
+
+        def parent(path):
+            if not path:
+                return None
+            return path.rsplit('/', 1)[0] if '/' in path else ''
+
+        def add(record):
+            path, source, text = record
+            rdf = self._import_rdf(text, path, source, target)
+            if path:
+                return self.add_container(target, rdf, path=path, force=force)
+            return self.add_container(parent_uri, rdf, path=name, force=force)
+
+        def release(record):
+            ready.append(record)
+            counts['queued'] += 1
+
+        def read():
+            # read records until the ones ready, in flight and waiting for
+            # their parents fill the window, and more are released as parents
+            # are created. If nothing is ready or in flight, the stream has
+            # children before their parents and the only way on is to keep
+            # reading
+            for record in records:
+                p = parent(record[0])
+                if p in created:
+                    release(record)
+                elif p in failed:
+                    errors.append(( record[0], Error("Parent {} wasn't imported".format(p)) ))
+                    failed.add(record[0])
+                else:
+                    waiting.setdefault(p, []).append(record)
+                    counts['waiting'] += 1
+                unfinished = counts['queued'] - counts['finished']
+                if unfinished + counts['waiting'] >= window and unfinished:
+                    return
+
+        read()
+        n = 0
+        for ( path, _, _ ), resource, e in _concurrently(add, ready, workers):
+            counts['finished'] += 1
+            if e:
+                self.logger.warning("Import of %s failed: %s", path or target, getattr(e, 'message', e))
+                errors.append(( path, e ))
+                if not path and isinstance(e, ConflictError):
+                    # the top already exists: import the rest into it
+                    created.add(path)
+                else:
+                    failed.add(path)
+            else:
+                n += 1
+                created.add(path)
+            for record in waiting.pop(path, []):
+                counts['waiting'] -= 1
+                if path in failed:
+                    errors.append(( record[0], Error("Parent {} wasn't imported".format(path)) ))
+                    failed.add(record[0])
+                else:
+                    release(record)
+            read()
+        for p, orphans in waiting.items():
+            for record in orphans:
+                errors.append(( record[0], Error("Parent {} wasn't imported".format(p)) ))
+        return ImportReport(n, errors, time.time() - start)
+
+    def _import_records(self, stream):
+        """Yields ( path, source uri, N-Triples text ) for each resource
+        in an export"""
+        first = stream.readline()
+        if first.lstrip().startswith('{'):
+            yield from self._import_ndjson(first, stream)
+        else:
+            yield from self._import_nquads(first, stream)
+
+    def _import_ndjson(self, first, stream):
+        for line in itertools.chain([ first ], stream):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = ''.join([ '{} {} {} .\n'.format(*t) for t in record['triples'] ])
+            yield record['path'], record['uri'], text
+
+    def _import_nquads(self, first, stream):
+        root = None
+        m = re.match(r'^# fcrepo4 export of <([^>]*)>', first)
+        if m:
+            root = m.group(1)
+            lines = stream
+        else:
+            lines = itertools.chain([ first ], stream)
+        graph = None
+        triples = []
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            m = _NQ_LINE.match(line)
+            if not m:
+                raise Error("Can't parse N-Quads line: {}".format(line))
+            g = m.group(4)[1:-1] if m.group(4) else ''
+            if g != graph:
+                if triples:
+                    yield self._import_path(graph, root), graph, ''.join(triples)
+                if root is None:
+                    root = g
+                graph = g
+                triples = []
+            triples.append('{} {} {} .\n'.format(m.group(1), m.group(2), m.group(3)))
+        if triples:
+            yield self._import_path(graph, root), graph, ''.join(triples)
+
+    def _import_path(self, uri, root):
+        if uri == root:
+            return ''
+        if not uri.startswith(root + '/'):
+            raise Error("{} isn't inside the exported tree {}".format(uri, root))
+        return uri[len(root) + 1:]
+
+    def _import_rdf(self, text, path, source, target):
+        """Parses a resource's triples, rewriting its uri to the relative
+        one which add_container expects and other uris in the exported
+        tree to the ones in the new tree, and dropping server-managed
+        triples"""
+        root = source[:len(source) - len(path)].rstrip('/') if path else source
+
+        def term(t):
+            if not isinstance(t, URIRef):
+                return t
+            u = str(t)
+            if u == source or u.startswith(source + '#'):
+                return URIRef(u[len(source):])
+            if u == root or u.startswith(root + '/') or u.startswith(root + '#'):
+                return URIRef(target + u[len(root):])
+            return t
+
+        g = Graph()
+        for s, p, o in parse_ntriples(text):
+            if not _server_managed(p, o):
+                g.add(( term(s), p, term(o) ))
+        return g
+
+    @instrument('changed_since')
+    def changed_since(self, uri, timestamp=None, state_file=None, workers=DEFAULT_WORKERS, prune=False, on_error=None):
+        """A generator which crawls the resource at uri and its descendants
+        and yields a Change for each one which is new, modified or deleted.
+
+        What counts as a change depends on the state kept in the sqlite
+        database state_file, which records the uri, parent, ETag and
+        last-modified time of every resource seen by the previous crawl.
+        Each resource's ETag is sent in an If-None-Match header, so that
+        unchanged resources get an empty 304 response and aren't parsed,
+        and the children of an unchanged container are taken from the
+        state. Resources in the state which weren't found are yielded as
+        DELETED at the end of the crawl, and removed from it.
+
+        Resources which aren't in the state (on the first crawl, or with
+        no state_file) are NEW, unless timestamp is given: then only the
+        ones last modified after it are yielded, as NEW if they were also
+        created after it and MODIFIED if not. timestamp is a datetime (UTC
+        if naive), an ISO 8601 string or a POSIX timestamp.
+
+        If prune is True, the subtree under a container which hasn't
+        changed isn't crawled at all. This is much faster, but Fedora only
+        updates a container when its children are added or removed, not
+        when they are modified, so changes further down are missed. Prune
+        is for feeds which only care about resources being added and
+        removed.
+
+        The state is updated as each change is yielded, and committed
+        when the crawl finishes (or the generator is closed). One state
+        file can be used for several subtrees.
+
+        Parameters:
+        uri (str) -- the top of the subtree
+        timestamp -- only report resources modified after this
+        state_file (str) -- path of the sqlite state database
+        workers (int) -- number of requests to have in flight at once
+        prune (boolean) -- skip the subtrees of unchanged containers
+        on_error (function) -- if set, errors are passed to
+                               on_error(uri, exception) and the crawl
+                               carries on, treating the resource and what
+                               the state has below it as unchanged:
+                               otherwise the first error is raised
+        """
+        since = _utc(timestamp)
+        db = sqlite3.connect(state_file or ':memory:')
+        # the resources to fetch: see walk
+        pending = _Frontier()
+        try:
+            db.execute("""CREATE TABLE IF NOT EXISTS resources (
+                uri TEXT PRIMARY KEY, parent TEXT, etag TEXT, last_modified TEXT, seen INTEGER)""")
+            db.execute("CREATE INDEX IF NOT EXISTS resources_parent ON resources (parent)")
+            top = uri.rstrip('/')
+            # an exact prefix match: LIKE would treat _ and % in uris as wildcards
+            below = "substr(uri, 1, ?) = ?"
+            subtree = "( uri = ? OR {} )".format(below)
+            subtree_args = ( top, len(top) + 1, top + '/' )
+            db.execute("UPDATE resources SET seen = 0 WHERE " + subtree, subtree_args)
+
+            def state(ruri):
+                row = db.execute("SELECT etag FROM resources WHERE uri = ?", ( ruri, )).fetchone()
+                return row[0] if row else None
+
+            def fetch(item):
+                ruri, parent, etag = item
+                headers = { 'If-None-Match': etag } if etag else None
+                return self._crawl_fetch(ruri, headers)
+
+            def unchanged(ruri):
+                db.execute("UPDATE resources SET seen = 1 WHERE uri = ?", ( ruri, ))
+                if prune:
+                    db.execute("UPDATE resources SET seen = 1 WHERE " + below, ( len(ruri) + 1, ruri + '/' ))
+                else:
+                    children = db.execute("SELECT uri, etag FROM resources WHERE parent = ?", ( ruri, ))
+                    pending.extend(( c, ruri, cetag ) for c, cetag in children)
+
+            pending.append(( top, None, state(top) ))
+            for ( ruri, parent, etag ), result, e in _concurrently(fetch, pending, workers):
+                if e:
+                    if not on_error:
+                        raise e
+                    on_error(ruri, e)
+                    unchanged(ruri)
+                    continue
+                status, resource = result
+                if status == requests.codes.not_found:
+                    continue
+                if status == requests.codes.not_modified:
+                    unchanged(ruri)
+                    continue
+                modified = self._last_modified(resource)
+                db.execute("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, 1)",
+                           ( ruri, parent, resource.response.headers.get('ETag'), modified.isoformat() if modified else None ))
+                if resource.rdf is not None:
+                    pending.extend(( str(c), ruri, state(str(c)) ) for c in resource.children())
+                if etag:
+                    yield Change(MODIFIED, ruri, resource, modified)
+                elif since is None:
+                    yield Change(NEW, ruri, resource, modified)
+                elif modified is None or modified > since:
+                    created = resource.rdf_get(FC4_NS['created']) if resource.rdf is not None else None
+                    new = created is None or _utc(str(created)) > since
+                    yield Change(NEW if new else MODIFIED, ruri, resource, modified)
+            deleted = db.execute("SELECT uri, last_modified FROM resources WHERE seen = 0 AND " + subtree, subtree_args).fetchall()
+            for ruri, modified in deleted:
+                db.execute("DELETE FROM resources WHERE uri = ?", ( ruri, ))
+                yield Change(DELETED, ruri, None, _utc(modified))
+        finally:
+            pending.close()
+            db.commit()
+            db.close()
+
+    def _crawl_fetch(self, uri, headers=None):
+        """Fetches a resource for changed_since. Returns ( status,
+        Resource ), where the Resource is None unless the status is 200,
+        and 410 counts as 404."""
+        headers = dict(headers or {})
+        if self.rdf_mime != RDF_MIME:
+            headers['Accept'] = '{}, */*;q=0.5'.format(self.rdf_mime)
+        response = self.api(uri, headers=headers, stream=True)
+        if response.status_code == requests.codes.ok:
+            resource = Resource(self, uri, response=response)
+            mime = _media_type(response)
+            if mime in RDF_MIMES:
+                resource._defer_rdf(response.text, mime)
+            else:
+                resource.streamed = True
+                resource.close()
+            return response.status_code, resource.check_type()
+        response.close()
+        if response.status_code == requests.codes.not_modified:
+            return response.status_code, None
+        if response.status_code in [ requests.codes.not_found, requests.codes.gone ]:
+            return requests.codes.not_found, None
+        message = "get {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+        raise ResourceError(uri, self.user, response, message)
+
+    def _last_modified(self, resource):
+        """A resource's fedora:lastModified, or its Last-Modified header
+        if it's a binary, as a datetime"""
+        if resource.rdf is not None:
+            modified = resource.rdf_get(FC4_LAST_MODIFIED)
+            if modified is not None:
+                return _utc(str(modified))
+        header = resource.response.headers.get('Last-Modified')
+        return parsedate_to_datetime(header) if header else None
+
+    @instrument('fixity')
+    def fixity(self, uri):
+        """Asks Fedora to check the checksum of the binary at uri against
+        its content (GET fcr:fixity), and returns a FixityResult. Throws a
+        ResourceError if the request fails, after retrying it if the
+        server responds with one of the RETRY_STATUSES."""
+        start = time.perf_counter()
+        response, retries = self._api_retrying(self.pathconcat(uri, 'fcr:fixity'), headers={ 'Accept': self.rdf_mime })
+        if response.status_code != requests.codes.ok:
+            message = "fixity {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+        rdf = parse_rdf(response.text, _media_type(response))
+        outcomes = [ str(o) for o in rdf.objects(None, PREMIS_NS['hasEventOutcome']) ]
+        digests = {}
+        for d in rdf.objects(None, PREMIS_NS['hasMessageDigest']):
+            parts = str(d).split(':')
+            if len(parts) == 3 and parts[0] == 'urn':
+                digests[parts[1].lower().replace('-', '')] = parts[2].lower()
+        size = None
+        for o in rdf.objects(None, PREMIS_NS['hasSize']):
+            size = int(o)
+        ok = bool(outcomes) and all(o == FIXITY_SUCCESS for o in outcomes)
+        outcome = ', '.join(sorted(set(outcomes)))
+        return FixityResult(uri, ok, outcome, digests, size, time.perf_counter() - start, retries, None)
+
+    def verify_fixity(self, uris, workers=DEFAULT_WORKERS, rate=None, report=None, failures_only=False):
+        """A generator which checks the fixity of lots of binaries
+        concurrently, and yields a FixityResult for each as it finishes.
+
+        Parameters:
+        uris -- an iterable of the uris of binaries, or the uri of a
+                container, in which case every binary below it is checked
+        workers (int) -- number of checks to have in flight at once
+        rate (float) -- if set, the most checks to start per second, so
+                        that an audit doesn't saturate the server
+        report (file) -- if set, each result yielded is also written to
+                         this text stream as a line of JSON
+        failures_only (boolean) -- only yield results which aren't ok
+
+        The uris are read as they're needed and the results aren't kept,
+        so an audit of millions of binaries uses a bounded amount of
+        memory. A binary whose check couldn't be done has a result with
+        the outcome 'ERROR' rather than stopping the audit.
+        """
+        if isinstance(uris, str):
+            uris = ( r.uri for r in self.walk(uris, workers=workers) if r.rdf is None )
+        throttle = _Throttle(rate) if rate else None
+
+        def check(uri):
+            if throttle:
+                throttle.wait()
+            return self.fixity(uri)
+
+        for uri, result, e in _concurrently(check, uris, workers):
+            if e:
+                result = FixityResult(uri, False, 'ERROR', {}, None, None, None, str(getattr(e, 'message', e)))
+            if failures_only and result.ok:
+                continue
+            if report is not None:
+                report.write(json.dumps(result._asdict()) + '\n')
+            yield result
+
+    @instrument('versions')
+    def versions(self, uri):
+        """Returns the versions of the resource at uri, from its
+        fcr:versions, as a list of Version, oldest first. Throws a
+        ResourceError if the request fails."""
+        response, _ = self._api_retrying(self.pathconcat(uri, 'fcr:versions'), headers={ 'Accept': self.rdf_mime })
+        if response.status_code != requests.codes.ok:
+            message = "versions {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+        rdf = parse_rdf(response.text, _media_type(response))
+        versions = []
+        for v in rdf.objects(None, FC4_NS['hasVersion']):
+            label = next(rdf.objects(v, FC4_NS['hasVersionLabel']), None)
+            created = next(rdf.objects(v, FC4_NS['created']), None)
+            versions.append(Version(
+                str(label) if label is not None else str(v).rsplit('/', 1)[-1],
+                str(v),
+                _utc(str(created)) if created is not None else None
+                ))
+        versions.sort(key=lambda v: ( v.created.timestamp() if v.created else 0, v.label ))
+        return versions
+
+    @instrument('create_version')
+    def create_version(self, uri, label):
+        """Makes a version of the resource at uri as it is now, with a
+        label which has to be unique among its versions, and returns it as
+        a Version (whose created is None). Throws a ConflictError if the
+        label has already been used, or a ResourceError if the request
+        fails."""
+        response, _ = self._api_retrying(self.pathconcat(uri, 'fcr:versions'), method='POST', headers={ 'Slug': label })
+        if response.status_code == requests.codes.conflict:
+            raise ConflictError("Version {} of {} already exists".format(label, uri))
+        if response.status_code != requests.codes.created:
+            message = "create_version {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+        location = response.headers.get('Location') or self.pathconcat(uri, 'fcr:versions/' + label)
+        return Version(label, location, None)
+
+    @instrument('snapshot')
+    def snapshot(self, uri, label=None, workers=DEFAULT_WORKERS):
+        """Makes a version of the resource at uri and of everything below
+        it, all with the same label, so that a bulk change can be undone
+        or compared with what was there before.
 
+        The subtree is walked and the versions are made concurrently, as
+        the resources are found. Errors (including a label which a
+        resource already has) don't stop the snapshot: they're returned in
+        the SnapshotReport.
 
+        Parameters:
+        uri (str) -- the top of the subtree
+        label (str) -- the versions' label: by default, 'snapshot-' and
+                       the UTC time, like snapshot-20170301T042336Z
+        workers (int) -- number of requests to have in flight at once
+
+        Returns a SnapshotReport.
+        """
+        start = time.time()
+        if not label:
+            label = time.strftime('snapshot-%Y%m%dT%H%M%SZ', time.gmtime())
+        errors = []
+
+        def on_error(ruri, e):
+            errors.append(( ruri, e ))
+
+        uris = ( r.uri for r in self.walk(uri, workers=workers, on_error=on_error, omit=[ FC4_SERVER_MANAGED ]) )
+        n = 0
+        for ruri, _, e in _concurrently(lambda u: self.create_version(u, label), uris, workers):
+            if e:
+                self.logger.warning("Version %s of %s failed: %s", label, ruri, getattr(e, 'message', e))
+                errors.append(( ruri, e ))
+            else:
+                n += 1
+        return SnapshotReport(label, n, errors, time.time() - start)
+
+    def reindex(self, uri=None, workers=DEFAULT_WORKERS):
+        """Rebuilds the index for the resource at uri (by default, the
+        whole repository) and everything below it, fetching them
+        concurrently. Returns the number of resources indexed."""
+        if self.index is None:
+            raise Error("Repository has no index")
+        if uri is None:
+            uri = self.path2uri('/')
+        self._index_remove(uri)
+        n = 0
+        for resource in self.walk(uri, workers=workers, omit=[ FC4_SERVER_MANAGED ]):
+            if resource.rdf is not None:
+                self._index_update(resource.uri, resource.rdf)
+                n += 1
+        return n
+
+    def _index_fetch(self, uri):
+        """Updates the index entry for uri from the RDF which Fedora has
+        for it now, as reindex does, for writes which don't send the whole
+        graph"""
+        resource = self.get(uri, omit=[ FC4_SERVER_MANAGED ])
+        if resource is not None and resource.rdf is not None:
+            self._index_update(resource.uri, resource.rdf)
+
+    def _api_retrying(self, uri, **kwargs):
+        """Makes an api request, retrying it after a backoff if the
+        server responds with one of the RETRY_STATUSES. Returns ( the
+        response, the number of retries )."""
+        backoff = RETRY_BACKOFF
+        for attempt in range(RETRY_RETRIES + 1):
+            response = self.api(uri, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == RETRY_RETRIES:
+                return response, attempt
+            self._retry_wait(uri, response, backoff)
+            backoff *= 2
+
+    def _retry_wait(self, uri, response, backoff):
+        """Sleeps for a response's Retry-After, or backoff seconds, before
+        retrying a request which got one of the RETRY_STATUSES"""
+        wait = backoff
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            wait = float(retry_after)
+        wait = min(wait, RETRY_BACKOFF_MAX)
+        self.logger.info("%s returned %d: retrying in %.1fs", uri, response.status_code, wait)
+        time.sleep(wait)
+
+    @instrument('add_container')
     def add_container(self, uri, metadata, slug=None, path=None, force=False):
         """Add a new container inside an existing one.
 
@@ -361,8 +2974,8 @@ Default method is GET.
         created.
 
         """
-        rdf = metadata.serialize(format=RDF_MIME)
-        headers = { 'Content-Type': RDF_MIME }
+        rdf, mime = self._serialize_rdf(metadata)
+        headers = { 'Content-Type': mime }
         if path:
             method = 'PUT'
             uri = self.pathconcat(uri, path)
@@ -373,9 +2986,11 @@ Default method is GET.
                 headers['Slug'] = slug
         resource = self._add_resource(uri, method, headers, rdf)
         resource.rdf = metadata
+        self._index_update(resource.uri, metadata)
         return resource
 
 
+    @instrument('add_acl')
     def add_acl(self, uri, path="acl", force=False):
         """Add a new container and make it an ACL
 
@@ -387,11 +3002,9 @@ Default method is GET.
         The acl will be created with a preset path, and RDF setting the ACL's
         type.
         """
-        rdf = Graph()
-        this = URIRef('')
-        rdf.add( ( this, RDF.type, WEBAC_NS['Acl']) )
-        rdf_text = rdf.serialize(format=RDF_MIME)
-        headers = { 'Content-Type': RDF_MIME }
+        rdf = self._acl_rdf()
+        rdf_text, mime = self._serialize_rdf(rdf)
+        headers = { 'Content-Type': mime }
         method = 'PUT'
         uri = self.pathconcat(uri, path)
         self._ensure_path(uri, force)
@@ -401,8 +3014,8 @@ Default method is GET.
             return acl
         return None
 
-    
-    def add_binary(self, uri, source, slug=None, path=None, force=None, mime=DEFAULT_MIME_TYPE):
+    @instrument('add_binary')
+    def add_binary(self, uri, source, slug=None, path=None, force=None, mime=DEFAULT_MIME_TYPE, checksums=None, digest=None, verify=False):
         """Upload binary data to a container.
 
         Parameters
@@ -414,6 +3027,19 @@ Default method is GET.
         slug (str) -- preferred id
         path (str) -- relative path from uri
         force (boolean) -- whether to overwrite path if it exists
+        checksums ([str]) -- hashlib algorithms ('sha1', 'sha256', 'md5')
+                             to compute while uploading: defaults to the
+                             checksums config value
+        digest (dict) -- checksums of the source which are already known,
+                         by algorithm, to send as a Digest header so that
+                         Fedora rejects the upload if they don't match
+        verify (boolean) -- whether to check the checksums against the
+                            message digest which Fedora records
+
+        The checksums are computed from the data as it's sent, so the source
+        is only read once, and are returned as the Resource's checksums
+        attribute. If verify is True, a FixityError is raised if they don't
+        match Fedora's premis:hasMessageDigest (the binary isn't deleted).
 
         If no value is provided for path or slug, this method will try to
         use one from the filename or URI if possible: if not, it will let
@@ -435,52 +3061,92 @@ Default method is GET.
             if slug:
                 headers['Slug'] = slug
             self.logger.debug("POSTing binary to {} {}".format(uri, slug))
+        if digest:
+            headers['Digest'] = ', '.join([ '{}={}'.format(a, v) for a, v in sorted(digest.items()) ])
+        algorithms = set(checksums if checksums is not None else self.checksums)
+        if verify:
+            algorithms.add('sha1')
+        upload = lambda source, chunk_size, length: self._upload(uri, method, headers, source, chunk_size, length, algorithms, verify)
 
-            
         if type(source) == str:
             if self._is_url(source):
-                # open the source URL as a stream, then use the requests method
-                # iter_content to get a generator which we pass to _add_resource
-                # see http://docs.python-requests.org/en/master/user/advanced/
-                source_r = requests.get(source, stream=True)
+                # open the source URL as a stream, and upload its content
+                # as it arrives
+                source_r = self.session.get(source, stream=True)
+                if source_r.status_code != requests.codes.ok:
+                    source_r.close()
+                    raise Error("Couldn't fetch {}: {} {}".format(source, source_r.status_code, source_r.reason))
                 headers['Content-type'] = source_r.headers['Content-type']
                 basename = source.split('/')[-1]
                 if method == 'POST' and slug:
                     basename = slug
                 headers['Content-Disposition'] = 'attachment; filename="{}"'.format(basename)
-                return self._add_resource(uri, method, headers, source_r.iter_content(URL_CHUNK))
+                length = None
+                if 'Content-Length' in source_r.headers and 'Content-Encoding' not in source_r.headers:
+                    length = int(source_r.headers['Content-Length'])
+                chunk_size = self._upload_chunk(length)
+                try:
+                    return upload(source_r.iter_content(chunk_size), chunk_size, length)
+                finally:
+                    source_r.close()
                 
             else:
                 basename = os.path.basename(source)
                 headers['Content-type'], _ = mimetypes.guess_type(source)
                 headers['Content-Disposition'] = 'attachment; filename="{}"'.format(basename)
                 with open(source, 'rb') as fh:
-                    resource = self._add_resource(uri, method, headers, fh)
+                    length = os.fstat(fh.fileno()).st_size
+                    resource = upload(fh, self._upload_chunk(length), length)
                 return resource
         else: # let's assume it's a file-like thing
             self.logger.info("Got a file-like thing")
+            if isinstance(source, ( bytes, bytearray )):
+                source = io.BytesIO(source)
             headers['Content-type'] = mime
             if slug:
                 headers['Content-Disposition'] = 'attachment; filename="{}"'.format(slug)
-            resource = self._add_resource(uri, method, headers, source)
+            length = _remaining(source)
+            resource = upload(source, self._upload_chunk(length), length)
             return resource
 
-    def _is_url(self, source):
-        """Tries to parse a data source string as a URL. If the result is
-        a http or https URL, returns True.
-        """
-        p = urlparse(source)
-        return p.scheme == 'http' or p.scheme == 'https'
+    def _upload_chunk(self, length):
+        """Returns the chunk size for uploading length bytes"""
+        if self.upload_chunk != 'auto':
+            return int(self.upload_chunk)
+        if not length:
+            return UPLOAD_CHUNK
+        return min(max(length // 64, UPLOAD_CHUNK_MIN), UPLOAD_CHUNK_MAX)
+
+    def _upload(self, uri, method, headers, source, chunk_size, length, algorithms=None, verify=False):
+        """Uploads the bytes from a file-like object or iterator through
+        an UploadStream, and adds its stats and checksums to the returned
+        Resource"""
+        body = UploadStream(source, chunk_size, length, self.upload_readahead, algorithms)
+        resource = self._add_resource(uri, method, headers, body)
+        resource.upload_stats = body.stats()
+        resource.checksums = body.checksums()
+        self.logger.debug("Uploaded {}: {}".format(resource.uri, resource.upload_stats))
+        if verify:
+            recorded = resource.message_digests()
+            for algorithm, value in recorded.items():
+                if algorithm in resource.checksums and resource.checksums[algorithm] != value:
+                    message = "{} checksum of {} is {}: Fedora has {}".format(algorithm, resource.uri, resource.checksums[algorithm], value)
+                    self.logger.error(message)
+                    raise FixityError(resource.uri, algorithm, resource.checksums[algorithm], value, message)
+            if not set(recorded) & set(resource.checksums):
+                raise FixityError(resource.uri, None, None, None, "No message digest recorded for {}".format(resource.uri))
+        return resource
 
-        
     def _add_resource(self, uri, method, headers, data):
         """Internal method for PUT/POST: this does the error handling and
         builds the returned Resource object
         """
         self._rdf_dump(data, uri)
         response = self.api(uri, method=method, headers=headers, data=data)
+        self._invalidate(uri)
         if response.status_code == requests.codes.created:
             uri = response.text
+            self._invalidate(uri)
             return Resource(self, uri)
         else:
             message = "{} {} failed: {} {}".format(method, uri, response.status_code, response.reason)
@@ -488,50 +3154,42 @@ Default method is GET.
             raise ResourceError(uri, self.user, response, message) 
 
 
-    def _rdf_dump(self, data, uri):
-        if self.rdfdump:
-            try:
-                uri_path = uri.replace('/', '_')
-                dumpf = os.path.join(self.rdfdump, uri_path) + '.ttl'
-                with open(dumpf, 'wb') as df:
-                    self.logger.debug("Dumping RDF to {}".format(dumpf))
-                    df.write(data)
-            except TypeError as te:
-                pass   # this catches errors when data is not a bytes-like
-
-
-        
     def _ensure_path(self, path, force):
         """Internal method to check if a path is free (and make sure it is
-        if force is True. - this currently breaks if it's applied to a
-        non-RDF path
+        if force is True). Uses HEAD, so it works for binaries as well as
+        RDF, and a path with a tombstone left by a deleted resource counts
+        as taken unless force is True.
         """
-        response = None
-        try:
-            response = self.api(path)
-        except ResourceError as re:
-            if re.status_code == requests.codes.not_found:
-                # not found is good
-                self.logger.debug("Checked for {} - not found".format(path))
-                pass
-            else:
-                raise re
-        if response:
+        state = self._path_state(path, self.api(path, method='HEAD'))
+        if state is None:
+            self.logger.debug("Checked for %s - not found", path)
+            return
+        if state == 'tombstone':
+            if force:
+                self.logger.debug("Force: obliterating tombstone at %s", path)
+                self.obliterate(path)
+                return
+            message = "Path {} has a tombstone: can't re-create without force".format(path)
+        else:
             if force:
-                self.logger.debug("Force: obliterating {}".format(path))
+                self.logger.debug("Force: obliterating %s", path)
                 self.delete(path)
                 self.obliterate(path)
-            else:
-                message = "Path {} already exists: can't re-create without force".format(path)
-                self.logger.error(message)
-                raise ConflictError(message)
+                return
+            message = "Path {} already exists: can't re-create without force".format(path)
+        self.logger.error(message)
+        raise ConflictError(message)
     
 
 
+    @instrument('delete')
     def delete(self, uri):
         """Deletes a resource"""
-        return self._delete_uri(uri)
+        deleted = self._delete_uri(uri)
+        self._index_remove(uri)
+        return deleted
 
+    @instrument('obliterate')
     def obliterate(self, uri):
         """Removes the tombstone record left by a resource"""
         tombstone = self.pathconcat(uri, 'fcr:tombstone')
@@ -539,6 +3197,7 @@ Default method is GET.
 
     def _delete_uri(self, uri):
         response = self.api(uri, method="DELETE")
+        self._invalidate(uri)
         if response.status_code == requests.codes.no_content:
             return True
         else:
@@ -547,17 +3206,118 @@ Default method is GET.
 
 
 
-class Resource(object):
-    """Object representing a resource.
+class Transaction(object):
+    """A Fedora transaction: see Repository.transaction.
 
-Attributes
-    repo (Repository): the repository
-    uri (str): its URI
-    rdf (Graph): its RDF graph
-    response (Response): the requests.Response object, if available
+    While the transaction is open, a background thread keeps it alive by
+    refreshing it every keepalive seconds. If a commit or rollback fails,
+    the transaction stays open and attached to the repository, so that it
+    can be tried again, except at the end of a with block: there a failed
+    rollback is logged and the transaction is detached, as Fedora will
+    expire it.
 
-The methods on Resource objects mostly pass through to the corresponding
-methods on its Repository object.
+    Attributes:
+        repo (Repository) -- the repository
+        uri (str) -- the transaction's uri, like http://.../rest/tx:abcd
+        index_changes (list) -- changes to the repository's index which
+                                are made when the transaction is committed
+    """
+
+    def __init__(self, repo, uri, keepalive=TX_KEEPALIVE):
+        self.repo = repo
+        self.uri = uri.rstrip('/')
+        self.keepalive = keepalive
+        self.index_changes = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._keep_alive_loop, daemon=True)
+        self.thread.start()
+
+    def wrap(self, uri):
+        """Converts a repository uri to the same uri in this transaction"""
+        if uri == self.uri or uri.startswith(self.uri + '/'):
+            return uri
+        return self.uri + '/' + self.repo.uri2path(uri)
+
+    def keep_alive(self):
+        """Refreshes the transaction so that Fedora doesn't expire it"""
+        self._post('fcr:tx')
+
+    @instrument('commit')
+    def commit(self):
+        """Commits the transaction's changes"""
+        self._end('fcr:tx/fcr:commit')
+        if self.repo.cache is not None:
+            self.repo.cache.clear()
+        changes, self.index_changes = self.index_changes, []
+        for method, args in changes:
+            method(*args)
+
+    @instrument('rollback')
+    def rollback(self):
+        """Discards the transaction's changes"""
+        self._end('fcr:tx/fcr:rollback')
+        self.index_changes = []
+
+    def _end(self, action):
+        self._post(action)
+        self._detach()
+
+    def _detach(self):
+        """Stops the keepalive thread and takes the transaction off the
+        repository, so that its requests are made outside it again"""
+        self.stopped.set()
+        if self.repo.tx is self:
+            self.repo.tx = None
+
+    def _post(self, action):
+        uri = self.uri + '/' + action
+        response = self.repo.api(uri, method='POST')
+        if response.status_code not in [ requests.codes.no_content, requests.codes.ok ]:
+            message = "POST {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.repo.user, response, message)
+
+    def _keep_alive_loop(self):
+        while not self.stopped.wait(self.keepalive):
+            try:
+                self.keep_alive()
+            except Exception as e:
+                self.repo.logger.warning("Couldn't refresh transaction {}: {}".format(self.uri, e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # once the with block has ended there's nothing for the caller to
+        # retry, so the transaction is detached even if the rollback fails
+        if exc_type:
+            self.repo.logger.warning("Rolling back transaction %s", self.uri)
+            try:
+                self.rollback()
+            except Exception as e:
+                # don't hide the exception which caused the rollback
+                self.repo.logger.warning("Couldn't roll back transaction %s: %s", self.uri, e)
+            finally:
+                self._detach()
+            return
+        try:
+            self.commit()
+        except Exception:
+            self.repo.logger.warning("Commit of transaction %s failed: rolling back", self.uri)
+            try:
+                self.rollback()
+            except Exception as e:
+                self.repo.logger.warning("Couldn't roll back transaction %s: %s", self.uri, e)
+            finally:
+                self._detach()
+            raise
+
+
+
+class BaseResource(object):
+    """The parts of a resource which don't make requests: its RDF and the
+    accessors and list of changes for it. Resource adds the methods which
+    talk to Fedora, and fcrepo4async.AsyncResource adds coroutine
+    versions of some of them.
     """
 
     def __init__(self, repo, uri, metadata=None, response=None):
@@ -570,9 +3330,12 @@ is stored (as 'response')
 """
         self.repo = repo
         self.uri = uri
-        self.rdf = None
+        self._rdf = None
+        self._rdf_text = None
+        self._rdf_mime = RDF_MIME
+        self._subject = None
         if metadata:
-            if type(metadata) == Graph:
+            if isinstance(metadata, ( Graph, TripleStore )):
                 self.rdf = metadata
             else:
                 self.repo.logger.warning("Passed raw metadata to Resource")
@@ -582,74 +3345,98 @@ is stored (as 'response')
         else:
             self.response = None
         self.changes = []
+        self.streamed = False
+        self.stream_used = False
+        self._versions = None
+
+    @property
+    def subject(self):
+        """The resource's URI as a URIRef, for looking it up in its RDF"""
+        if self._subject is None or self._subject != self.uri:
+            self._subject = URIRef(self.uri)
+        return self._subject
+
+    @property
+    def rdf(self):
+        """The resource's metadata as an rdflib Graph (or a TripleStore, if
+        the repository is configured to use them), or None. RDF fetched
+        from Fedora is parsed the first time this is used."""
+        if self._rdf is None and self._rdf_text is not None:
+            self._parse_rdf(self._rdf_text, self._rdf_mime)
+        return self._rdf
+
+    @rdf.setter
+    def rdf(self, rdf):
+        self._rdf = rdf
+        self._rdf_text = None
 
     def check_type(self):
         """See if this resource's RDF indicates that it should be one of the
-        specialised subclasses like Acl"""
+        specialised subclasses like Acl. If the RDF hasn't been parsed yet,
+        it's only parsed if it mentions the WebAC namespace."""
 
+        if self._rdf is None and ( self._rdf_text is None or WEBAC_URL not in self._rdf_text ):
+            return self
         if not self.rdf:
             return self
         ts = self.rdf_get_all(RDF.type)
+        acl_class, auth_class = self._type_classes()
         newclass = None
         if WEBAC_NS['Acl'] in ts:
-            newclass = Acl
+            newclass = acl_class
         elif WEBAC_NS['Authorization'] in ts:
-            newclass = Auth
+            newclass = auth_class
         if newclass:
             return newclass(self.repo, self.uri, metadata=self.rdf, response=self.response)
         return self
 
-        
-    def data(self):
-        """Returns the data in the resource as a single lump"""
-        if self.response:
-            return self.response.text
-        else:
-            return None
-
-    def stream(self):
-        """Returns an object from which the data in the resource can be
-        streamed"""
-        if self.response:
-            return self.response.raw
-        else:
-            return None
-        
-    def _parse_rdf(self, rdf):
-        """Parse the serialised RDF content from FC as an rdflib Graph"""
-        self.rdf = Graph()
-        self.rdf.parse(data=rdf, format=RDF_PARSE)
+    def _type_classes(self):
+        """The classes check_type uses for ACLs and authorizations"""
+        return ( Acl, Auth )
 
-    def put(self):
-        """Put the Resource to the repository, using force. Used when
-        writing Auths and other specialised resources."""
+    def is_binary(self):
+        """Returns True if this resource was fetched and isn't RDF"""
+        return self.response is not None and _media_type(self.response) not in RDF_MIMES
 
-        self.repo._ensure_path(self.uri, True)
-        rdf_text = self.rdf.serialize(format=RDF_MIME)
-        headers = { 'Content-Type': RDF_MIME }
-        response = self.repo.api(self.uri, method='PUT', headers=headers, data=rdf_text)
-        if response.status_code == requests.codes.no_content:
-            return self
-        elif response.status_code == requests.codes.created:
-            return self
+    def data(self):
+        """Returns the data in the resource as a single lump: bytes for
+        a binary, or text for RDF"""
+        if self.response is None:
+            return None
+        if not self.is_binary():
+            return self.response.text
+        return self.response.content
+
+    def _parse_rdf(self, rdf, mime=RDF_MIME):
+        """Parse the serialised RDF content from FC as an rdflib Graph, or
+        a TripleStore if the repository's rdf_store is 'compact'"""
+        if self.repo.rdf_store == 'compact':
+            if mime == NTRIPLES_MIME:
+                self.rdf = parse_ntriples(rdf, TripleStore())
+            else:
+                self.rdf = TripleStore(parse_rdf(rdf, mime))
         else:
-            message = "put RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
-            raise ResourceError(self.uri, self.repo.user, response, message)
-
+            self.rdf = parse_rdf(rdf, mime)
 
+    def _defer_rdf(self, rdf, mime=RDF_MIME):
+        """Keep the serialised RDF content from FC to be parsed when the
+        rdf attribute is first used"""
+        self._rdf = None
+        self._rdf_text = rdf
+        self._rdf_mime = mime
 
     def children(self):
         """Returns a list of paths of this resource's FEDORA children"""
-        return self.rdf.objects(subject=URIRef(self.uri), predicate=LDP_CONTAINS)
+        return self.rdf.objects(subject=self.subject, predicate=LDP_CONTAINS)
 
     def rdf_search(self, predfilter):
         """Returns a list of all the objects where predfilter(p) is true"""
-        pos = self.rdf.predicates_objects(subject=URIRef(self.uri))
+        pos = self.rdf.predicate_objects(subject=self.subject)
         return [ o for (p, o) in pos if predfilter(p) ]
 
     def rdf_get_all(self, predicate):
         """Returns a list of all the objects with a predicate """
-        return list(self.rdf.objects(subject=URIRef(self.uri), predicate=predicate))
+        return list(self.rdf.objects(subject=self.subject, predicate=predicate))
 
     def rdf_get(self, predicate):
         """Gets only one of the objects from rdf_get_all"""
@@ -708,13 +3495,224 @@ is stored (as 'response')
     def dc(self):
         """Extracts all DC values and returns a dict"""
         dc = {}
-        for field in DC_FIELDS:
-            value = self.rdf_get(DC[field])
-            if value:
-                dc[field] = str(value)
-        return dc
+        for p, o in self.rdf.predicate_objects(subject=self.subject):
+            field = DC_PREDICATES.get(p)
+            if field and field not in dc:
+                dc[field] = str(o)
+        return { field: value for field, value in dc.items() if value }
+
+        
+    def _apply_changes(self):
+        """Applies the list of changes from rdf_add, rdf_replace and
+        rdf_remove to this resource's local RDF graph"""
+        self.repo.logger.debug("Change list = {}".format(self.changes))
+        
+        for ( t, p, o ) in self.changes:
+            self.repo.logger.debug("Change: {} {} {}".format(t, p, o))
+            if t == RDF_REPLACE or t == RDF_REMOVE:
+                self.rdf.remove((self.subject, p, None))
+            if t == RDF_REPLACE or t == RDF_ADD:
+                self.rdf.add((self.subject, p, o))
+
+    def sparql_update(self):
+        """Returns the list of changes as a SPARQL Update. Consecutive adds
+        are collected into one INSERT DATA, and replaces and removes are
+        DELETE ... WHERE operations on the predicate, so the operations
+        have the same effect as applying the changes in order."""
+        s = URIRef(self.uri).n3()
+        ops = []
+        inserts = []
+        for ( t, p, o ) in self.changes:
+            if t == RDF_REPLACE or t == RDF_REMOVE:
+                if inserts:
+                    ops.append("INSERT DATA {{\n{}\n}}".format("\n".join(inserts)))
+                    inserts = []
+                ops.append("DELETE {{ {s} {p} ?o }} WHERE {{ {s} {p} ?o }}".format(s=s, p=p.n3()))
+            if t == RDF_REPLACE or t == RDF_ADD:
+                inserts.append("{} {} {} .".format(s, p.n3(), o.n3()))
+        if inserts:
+            ops.append("INSERT DATA {{\n{}\n}}".format("\n".join(inserts)))
+        return " ;\n".join(ops)
+
+
+
+class Resource(BaseResource):
+    """Object representing a resource.
+
+Attributes
+    repo (Repository): the repository
+    uri (str): its URI
+    rdf (Graph): its RDF graph
+    response (Response): the requests.Response object, if available
+
+The methods on Resource objects mostly pass through to the corresponding
+methods on its Repository object.
+    """
+
+    def data(self):
+        """Returns the data in the resource as a single lump: bytes for
+        a binary, or text for RDF. A streamed binary is read to the end."""
+        if self.response is not None and self.streamed and self.is_binary():
+            return b''.join(self.iter_bytes())
+        return super(Resource, self).data()
+
+    def iter_bytes(self, chunk_size=DOWNLOAD_CHUNK):
+        """A generator which yields the content of the resource in chunks
+        of up to chunk_size bytes, without holding all of it in memory.
+
+        If the resource was fetched with get(uri, stream=True), the first
+        call reads the response: otherwise, or if it has already been read,
+        the content is fetched again as a stream.
+        """
+        if self.streamed and not self.stream_used:
+            self.stream_used = True
+            try:
+                for chunk in self.response.iter_content(chunk_size):
+                    yield chunk
+            finally:
+                self.response.close()
+        elif self.response is not None and not self.streamed:
+            content = self.response.content
+            for i in range(0, len(content), chunk_size):
+                yield content[i:i + chunk_size]
+        else:
+            response = self._get_stream()
+            try:
+                for chunk in response.iter_content(chunk_size):
+                    yield chunk
+            finally:
+                response.close()
+
+    @instrument('download_to')
+    def download_to(self, path, chunk_size=DOWNLOAD_CHUNK):
+        """Writes the content of the resource to a file, streaming it in
+        chunks of chunk_size bytes. The data is written to path + '.part'
+        which is renamed to path when it's complete.
+
+        Returns the number of bytes written.
+        """
+        part = path + '.part'
+        n = 0
+        try:
+            with open(part, 'wb', buffering=chunk_size) as fh:
+                for chunk in self.iter_bytes(chunk_size):
+                    fh.write(chunk)
+                    n += len(chunk)
+        except Exception:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        os.replace(part, path)
+        return n
+
+    @instrument('read_range')
+    def read_range(self, start, end=None):
+        """Returns bytes start to end (inclusive, as in an HTTP Range) of
+        the resource's content, or from start to the end if end is None.
+        Only the range is downloaded if the server supports it."""
+        r = 'bytes={}-{}'.format(start, '' if end is None else end)
+        response = self._get_stream(headers={ 'Range': r })
+        try:
+            if response.status_code == requests.codes.partial_content:
+                return response.content
+            # the server ignored the Range: skip to it in the stream
+            wanted = None if end is None else end + 1 - start
+            data = bytearray()
+            offset = 0
+            for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                if offset + len(chunk) > start:
+                    data += chunk[max(start - offset, 0):]
+                offset += len(chunk)
+                if wanted is not None and len(data) >= wanted:
+                    break
+            return bytes(data if wanted is None else data[:wanted])
+        finally:
+            response.close()
+
+    def fixity(self):
+        """Asks Fedora to check this binary's checksum: see
+        Repository.fixity"""
+        return self.repo.fixity(self.uri)
+
+    def versions(self, refresh=False):
+        """Returns this resource's versions as a list of Version, oldest
+        first. They're fetched the first time this is called and kept:
+        refresh=True fetches them again."""
+        if self._versions is None or refresh:
+            self._versions = self.repo.versions(self.uri)
+        return list(self._versions)
+
+    def create_version(self, label):
+        """Makes a version of this resource as it is in Fedora now (so
+        write any changes first) and returns it as a Version"""
+        version = self.repo.create_version(self.uri, label)
+        self._versions = None
+        return version
+
+    def at_version(self, label):
+        """Returns the version of this resource with the given label as a
+        Resource, or None if there isn't one. Its uri is the version's, so
+        its RDF can be read with the usual methods, but it can't be
+        changed."""
+        return self.repo.get(self.repo.pathconcat(self.uri, 'fcr:versions/' + label))
+
+    @instrument('message_digests')
+    def message_digests(self):
+        """Returns the checksums which Fedora has recorded for this binary
+        (its premis:hasMessageDigest values) as a dict by algorithm, from
+        its fcr:metadata description"""
+        description = self.repo.get(self.repo.pathconcat(self.uri, 'fcr:metadata'))
+        digests = {}
+        if description and description.rdf is not None:
+            for d in description.rdf.objects(predicate=PREMIS_NS['hasMessageDigest']):
+                parts = str(d).split(':')
+                if len(parts) == 3 and parts[0] == 'urn':
+                    digests[parts[1].lower().replace('-', '')] = parts[2].lower()
+        return digests
+
+    def close(self):
+        """Releases the connection held by a streamed response which hasn't
+        been read"""
+        if self.streamed and not self.stream_used:
+            self.stream_used = True
+            self.response.close()
+
+    def _get_stream(self, headers=None):
+        """Makes a streaming GET request for this resource's content"""
+        response = self.repo.api(self.uri, headers=headers, stream=True)
+        if response.status_code not in [ requests.codes.ok, requests.codes.partial_content ]:
+            response.close()
+            message = "get {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+        return response
 
+    def stream(self):
+        """Returns an object from which the data in the resource can be
+        streamed"""
+        if self.response:
+            return self.response.raw
+        else:
+            return None
         
+    @instrument('put')
+    def put(self):
+        """Put the Resource to the repository, using force. Used when
+        writing Auths and other specialised resources."""
+
+        self.repo._ensure_path(self.uri, True)
+        rdf_text, mime = self.repo._serialize_rdf(self.rdf)
+        headers = { 'Content-Type': mime }
+        response = self.repo.api(self.uri, method='PUT', headers=headers, data=rdf_text)
+        self.repo._invalidate(self.uri)
+        if response.status_code in [ requests.codes.no_content, requests.codes.created ]:
+            self.repo._index_update(self.uri, self.rdf)
+            return self
+        else:
+            message = "put RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+
+
+    @instrument('add_container')
     def add_container(self, metadata, slug=None, path=None, force=False):
         """Add a new container to this resource.
 
@@ -732,7 +3730,19 @@ is stored (as 'response')
         """
         return self.repo.add_container(self.uri, metadata, slug=slug, path=path, force=force)
         
-    def add_binary(self, source, slug=None, path=None, force=False, mime=DEFAULT_MIME_TYPE):
+    def walk(self, max_depth=None, workers=DEFAULT_WORKERS, filter=None, on_error=None, omit=None):
+        """Yields this resource and all of its descendants, breadth-first:
+        see Repository.walk"""
+        return self.repo.walk(self.uri, max_depth=max_depth, workers=workers, filter=filter, on_error=on_error, omit=omit)
+
+    @instrument('bulk_add_containers')
+    def bulk_add_containers(self, records, workers=DEFAULT_WORKERS, slug=None, path=None, force=False, progress=None):
+        """Add a new container to this resource for each of a list of
+        records, concurrently: see Repository.bulk_add_containers"""
+        return self.repo.bulk_add_containers(self.uri, records, workers=workers, slug=slug, path=path, force=force, progress=progress)
+
+    @instrument('add_binary')
+    def add_binary(self, source, slug=None, path=None, force=False, mime=DEFAULT_MIME_TYPE, checksums=None, digest=None, verify=False):
         """Add a new binary object to this resource.
 
         Parameters:
@@ -742,21 +3752,39 @@ is stored (as 'response')
         force (boolean) -- where path is used, whether to force an overwrite
 
         The path, slug and force parameters have the same meaning as for
-        add_container
+        add_container: checksums, digest and verify are as for
+        Repository.add_binary
         
         """
-        return self.repo.add_binary(self.uri, source, slug=slug, path=path, force=force, mime=mime)
+        return self.repo.add_binary(self.uri, source, slug=slug, path=path, force=force, mime=mime, checksums=checksums, digest=digest, verify=verify)
 
-    def rdf_read(self):
-        """Read the metadata from Fedora"""
+    @instrument('rdf_read')
+    def rdf_read(self, include=None, omit=None):
+        """Read the metadata from Fedora
+
+        include and omit are Prefer header projections, as for
+        Repository.get
+        """
     
-        most_recent = self.repo.get(self.uri, headers={ 'Accept': RDF_MIME })
+        most_recent = self.repo.get(self.uri, headers={ 'Accept': self.repo.rdf_mime }, include=include, omit=omit)
         self.rdf = most_recent.rdf
         return self.rdf
     
-    def rdf_write(self):
+    @instrument('rdf_write')
+    def rdf_write(self, method=None):
         """Updates a resource's metadata, based on the list of changes
         which has been build by calls to rdf_add, rdf_replace and rdf_remove.
+
+        Parameters:
+        method (str) -- 'PATCH' or 'PUT': defaults to the repository's
+                        rdf_write config value, or 'PUT' if that isn't set
+
+        With PUT, the current RDF is read from Fedora, the changes are
+        applied to it and the whole graph is written back. With PATCH,
+        only the changes are sent, as a SPARQL Update: if the server
+        doesn't accept the PATCH, the PUT method is used instead.
+
+        The list of changes is cleared once they have been written.
         """
         
         if not self.rdf:
@@ -765,48 +3793,103 @@ is stored (as 'response')
             self.repo.logger.error("Call to rdf_write before any changes specified")
             raise Error("No changes for rdf_write on {}".format(self.uri))
             return None
-        
+
+        if not method:
+            method = self.repo.rdf_write_method
+        if method == 'PATCH' and self._rdf_patch():
+            # the local RDF may be a projection or out of date
+            if self.repo.index is not None:
+                self.repo._index_fetch(self.uri)
+            return self
+
         # Make sure that the resource has a current set of RDF         
         
         self.rdf_read()
+        self._apply_changes()
 
-        with open('dump-before.turtle', 'wb') as tf:
-            tf.write(self.rdf.serialize(format=RDF_MIME))
-        self.repo.logger.debug("Change list = {}".format(self.changes))
-        
-        for ( t, p, o ) in self.changes:
-            self.repo.logger.debug("Change: {} {} {}".format(t, p, o))
-            if t == RDF_REPLACE or t == RDF_REMOVE:
-                self.rdf.remove((URIRef(self.uri), p, None))
-            if t == RDF_REPLACE or t == RDF_ADD:
-                self.rdf.add((URIRef(self.uri), p, o))
-
-        rdf = self.rdf.serialize(format=RDF_MIME)
-        with open('dump-after.turtle', 'wb') as tf:
-            tf.write(rdf)
-        headers = { 'Content-type': RDF_MIME }
+        rdf, mime = self.repo._serialize_rdf(self.rdf)
+        self.repo._rdf_dump(rdf, self.uri)
+        headers = { 'Content-type': mime }
         response = self.repo.api(self.uri, method='PUT', headers=headers, data=rdf)
+        self.repo._invalidate(self.uri)
         if response.status_code == requests.codes.no_content:
+            self.changes = []
+            self.repo._index_update(self.uri, self.rdf)
             return self
         else:
             message = "put RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
             raise ResourceError(self.uri, self.repo.user, response, message)
 
+    def _rdf_patch(self):
+        """Sends the list of changes as a SPARQL Update PATCH. Returns True
+        if it worked, or False if the server doesn't support PATCH."""
+        update = self.sparql_update()
+        self.repo.logger.debug("SPARQL update = {}".format(update))
+        headers = { 'Content-type': SPARQL_UPDATE_MIME }
+        response = self.repo.api(self.uri, method='PATCH', headers=headers, data=update.encode('utf-8'))
+        self.repo._invalidate(self.uri)
+        if response.status_code == requests.codes.no_content:
+            self._apply_changes()
+            self.changes = []
+            return True
+        elif response.status_code in PATCH_UNSUPPORTED:
+            self.repo.logger.warning("PATCH {} returned HTTP status {}: falling back to PUT".format(self.uri, response.status_code))
+            return False
+        else:
+            message = "patch RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+
 
 
-class Acl(Resource):
-    """Class representing a Web AC ACL"""
+class BaseAcl(BaseResource):
+    """The parts of a Web AC ACL which don't make requests"""
 
     def __init__(self, repo, uri, metadata=None, response=None):
         """Creator has to set the auths list"""
-        super(Acl, self).__init__(repo, uri, metadata=metadata, response=response)
+        super(BaseAcl, self).__init__(repo, uri, metadata=metadata, response=response)
         self.auths = []
-        
+
     def auth_path(self, user, access):
         """Standard path for an auth granting user access"""
         return self.repo.pathconcat(self.uri, user + '_' + access)
 
             
+    def _add_auth(self, acls, auth):
+        """Adds an Auth's permission to a dict-by-uri-then-user"""
+        agent, access, uri = auth.get()
+        if uri not in acls:
+            acls[uri] = {}
+        if agent not in acls[uri]:
+            acls[uri][agent] = []
+        acls[uri][agent].append(access)
+        
+    def permissions(self, uri):
+        """Returns the permissions on a uri as a dict-by-action:
+
+        {
+            'Read': [ u1, u2, u3 ],
+            'Write': [ u1, u2 ]
+        }
+        """
+        pass
+
+    def users(self, uri):
+        """Returns the permissions on a uri as a dict-by-user:
+
+        {
+            u1: [ 'Read', 'Write' ],
+            u2: [ 'Read', 'Write' ],
+            u3: [ 'Write'
+        }
+        """
+        pass
+
+
+
+class Acl(BaseAcl, Resource):
+    """Class representing a Web AC ACL"""
+
+    @instrument('grant')
     def grant(self, user, access, uri):
         """Grant a user an access level over a resource, specified by its
         URI. Also adds a triple to the resource at uri pointing to this ACL
@@ -830,6 +3913,7 @@ class Acl(Resource):
         self.auths.append(auth)
 
         
+    @instrument('revoke')
     def revoke(self, user, access, uri):
         """Revoke a user's access level to a resource, specified by its
         URI. Doesn't remove the triple pointing to this ACL from the URI because
@@ -838,7 +3922,7 @@ class Acl(Resource):
         resource = self.repo.get(uri) 
         auth_uri = self.auth_path(user, access)
 
-        if self.get(auth_uri):
+        if self.repo.get(auth_uri):
             self.repo.delete(auth_uri)
             self.repo.obliterate(auth_uri)
 
@@ -847,61 +3931,47 @@ class Acl(Resource):
 
 
                         
-    def acls(self):
+    @instrument('acls')
+    def acls(self, workers=DEFAULT_WORKERS):
         """Returns all of the ACLs permissions as a dict-by-uri-then-user
 
         {
             uri1: { u1: [ 'Read' ], u2: [ 'Read', 'Write' ] },
             uri2: { u1: ... }
         }
+
+        The ACL is fetched with its authorizations embedded, so this only
+        takes one request. If the server doesn't embed them, the ones which
+        are missing are fetched concurrently, by up to workers threads.
         """
         acls = {}
-        for uri in self.children():
-            auth = self.repo.get(uri)
-            if auth:
-                agent, access, uri = auth.get()
-                if uri not in acls:
-                    acls[uri] = {}
-                if agent not in acls[uri]:
-                    acls[uri][agent] = []
-                acls[uri][agent].append(access)
+        acl = self.repo.get(self.uri, include=FC4_EMBED_RESOURCES)
+        if not acl or acl.rdf is None:
+            return acls
+        missing = []
+        for uri in acl.children():
+            auth = Auth(self.repo, str(uri), metadata=acl.rdf)
+            if auth.rdf_get(WEBAC_NS['mode']) is not None:
+                self._add_auth(acls, auth)
+            else:
+                missing.append(str(uri))
+        if missing:
+            self.repo.logger.debug("{} authorizations not embedded in {}".format(len(missing), self.uri))
+            for uri, auth, e in _concurrently(self.repo.get, missing, workers):
+                if e:
+                    raise e
+                if auth:
+                    self._add_auth(acls, auth)
         return acls
-        
-    def permissions(self, uri):
-        """Returns the permissions on a uri as a dict-by-action:
-
-        {
-            'Read': [ u1, u2, u3 ],
-            'Write': [ u1, u2 ]
-        }
-        """
-        pass
-
-    def users(self, uri):
-        """Returns the permissions on a uri as a dict-by-user:
-
-        {
-            u1: [ 'Read', 'Write' ],
-            u2: [ 'Read', 'Write' ],
-            u3: [ 'Write'
-        }
-        """
-        pass
 
 
 
-class Auth(Resource):
-    """A Resource which represents an authentication in an ACL.
-
-    The Auth class encapsulates the logic for reading and writing the RDF
-    triples which WebAC stores.
-    """
-    
-    
-    def put(self, agent, access, uri):
-        """Generates the correct RDF for granting agent access to the
-        subject (URI) and PUTs it to the repository, using force"""
+class BaseAuth(BaseResource):
+    """The parts of an authorization in an ACL which don't make requests:
+    reading and writing the WebAC RDF"""
 
+    def _build_rdf(self, agent, access, uri):
+        """Builds the WebAC RDF for granting agent access to uri"""
         self.agent = agent
         self.access = access
         self.accessto = uri
@@ -912,7 +3982,6 @@ class Auth(Resource):
         self.rdf.add( ( this, WEBAC_NS['accessTo'], URIRef(uri) ) )
         self.rdf.add( ( this, WEBAC_NS['mode'],     WEBAC_NS[access] ) )
         self.rdf.add( ( this, WEBAC_NS['agent'],    Literal(agent) ) )
-        super(Auth, self).put()
         
     def get(self):
         """Decodes the RDF into a tuple of (agent, access, subject)"""
@@ -924,3 +3993,21 @@ class Auth(Resource):
             self.access = WRITE
         self.agent = str(self.rdf_get(WEBAC_NS['agent']))
         return ( self.agent, self.access, self.accessto )
+
+
+
+class Auth(BaseAuth, Resource):
+    """A Resource which represents an authentication in an ACL.
+
+    The Auth class encapsulates the logic for reading and writing the RDF
+    triples which WebAC stores.
+    """
+    
+    
+    @instrument('put')
+    def put(self, agent, access, uri):
+        """Generates the correct RDF for granting agent access to the
+        subject (URI) and PUTs it to the repository, using force"""
+
+        self._build_rdf(agent, access, uri)
+        super(Auth, self).put()
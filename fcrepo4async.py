@@ -0,0 +1,517 @@
+"""
+An asyncio interface to Fedora Commons 4, built on aiohttp.
+
+AsyncRepository is configured in exactly the same way as fcrepo4.Repository
+and has the basic methods (see below), but the ones which talk to Fedora are
+coroutines.
+All requests share one aiohttp connection pool, and the number of requests
+in flight at once is bounded by a semaphore.
+
+async with AsyncRepository(config='config.yml') as repo:
+    repo.set_user('fedoraAdmin')
+    root = await repo.get(repo.path2uri('/'))
+    c = await root.add_container(repo.dc_rdf({ 'title': 'New' }))
+
+Resources returned by an AsyncRepository are AsyncResources (or AsyncAcls and
+AsyncAuths), which have the same RDF methods as their fcrepo4 counterparts.
+Binaries are uploaded without checksums: add_binary doesn't take the
+checksums, digest and verify arguments of fcrepo4.Repository.add_binary.
+
+The async classes are built on fcrepo4.BaseRepository, BaseResource,
+BaseAcl and BaseAuth, so they only have the methods which the async client
+supports: get, head, exists, add_container, add_acl, add_binary, delete and
+obliterate, and the RDF methods, put, rdf_read and rdf_write of resources,
+grant, revoke and acls of ACLs. There are no transactions, walk, bulk
+ingest, purge, export and import, changed_since, fixity, versions or
+reindex, and no streamed or ranged downloads (the whole response is read,
+so use data()). Requests which get one of the RETRY_STATUSES aren't retried.
+"""
+
+import asyncio, os.path, mimetypes, logging, time
+import aiohttp, requests
+
+import fcrepo4
+from fcrepo4 import Error, ConflictError, ResourceError, METHODS, RDF_MIME, \
+    RDF_MIMES, DEFAULT_MIME_TYPE, UPLOAD_CHUNK, POOL_MAXSIZE, SPARQL_UPDATE_MIME, \
+    PATCH_UNSUPPORTED, instrument
+
+
+class Response(object):
+    """The parts of an aiohttp response which the Resource classes use,
+    with the same attribute names as a requests.Response.
+
+    Attributes:
+        status_code (int) -- the HTTP status
+        reason (str) -- the text version of the HTTP status
+        headers (CIMultiDictProxy) -- the response headers
+        content (bytes) -- the body of the response
+        url (str) -- the URL requested
+    """
+
+    def __init__(self, response, content):
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.content = content
+        self.url = str(response.url)
+        self.encoding = response.charset or 'utf-8'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def __bool__(self):
+        return self.ok
+
+
+
+
+def _body_size(data):
+    """The number of bytes in a request body, if it can be worked out
+    without reading it"""
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    if isinstance(data, ( bytes, bytearray )):
+        return len(data)
+    return 0
+
+
+class AsyncRepository(fcrepo4.BaseRepository):
+    """A Repository whose API methods are coroutines.
+
+    In addition to the config values used by fcrepo4.Repository, the
+    concurrency value sets the maximum number of requests in flight (the
+    default is the pool_maxsize).
+
+    Only some of the methods of fcrepo4.Repository have async versions:
+    see the module docstring.
+    """
+
+
+    def __init__(self, config='config.yml', user='user', loglevel=logging.WARNING, concurrency=None):
+        super(AsyncRepository, self).__init__(config=config, user=user, loglevel=loglevel)
+        if not concurrency:
+            concurrency = int(self.cf.get('concurrency', self.pool_maxsize))
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _make_session(self, configd):
+        """The aiohttp session has to be created inside a running event
+        loop, so this only records the pool settings: see _client"""
+        self.pool_maxsize = int(configd.get('pool_maxsize', POOL_MAXSIZE))
+        self.keepalive = bool(configd.get('keepalive', True))
+        return None
+
+    def _client(self):
+        """Returns the shared aiohttp session, creating it on first use"""
+        if not self.session or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.pool_maxsize,
+                force_close=not self.keepalive
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        """Closes the connections in this repository's HTTP pool, and its
+        tracer and index if it has them"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+        if self.tracer is not None:
+            self.tracer.close()
+        if self.index is not None:
+            self.index.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def set_user(self, user):
+        super(AsyncRepository, self).set_user(user)
+        self.auth = aiohttp.BasicAuth(self.auth.username, self.auth.password)
+
+    async def api(self, uri, method='GET', headers=None, data=None):
+        """
+Generic api call with an HTTP method, target URL and headers, data (for
+plain POST) or files (for file uploads). Waits for the concurrency semaphore
+and reads the whole response before returning it.
+
+Default method is GET. Requests aren't retried, and there are no
+transactions: see the module docstring.
+"""
+        self.uri2path(uri)  # safety check: will throw an URI error if it's bad
+        if method in METHODS:
+            self.logger.debug("API %s %s", method, uri)
+            if self.delegated and self.user != 'fedoraAdmin':
+                if not headers:
+                    headers = {}
+                headers['On-Behalf-Of'] = self.user
+                self.logger.debug("Delegated authentication as %s", self.user)
+            if headers:
+                self.logger.debug("headers=%s", headers)
+            session = self._client()
+            metrics = self.metrics
+            tracer = self.tracer
+            async with self.semaphore:
+                if metrics is None and tracer is None:
+                    async with session.request(method, uri, auth=self.auth, headers=headers, data=data) as r:
+                        content = await r.read()
+                        return Response(r, content)
+                span = tracer.start(method, uri=uri) if tracer is not None else None
+                start = time.perf_counter()
+                try:
+                    async with session.request(method, uri, auth=self.auth, headers=headers, data=data) as r:
+                        content = await r.read()
+                except Exception as e:
+                    if metrics is not None:
+                        metrics.record_request(method, None, time.perf_counter() - start)
+                    if span is not None:
+                        tracer.finish(span, e)
+                    raise
+                seconds = time.perf_counter() - start
+                sent = _body_size(data)
+                if metrics is not None:
+                    metrics.record_request(method, r.status, seconds, sent, len(content))
+                if span is not None:
+                    tracer.request(span, r.status, sent, len(content))
+                    tracer.finish(span)
+                return Response(r, content)
+        else:
+            return None
+
+    @instrument('get')
+    async def get(self, uri, headers=None, include=None, omit=None):
+        """The basic method for retrieving a resource.
+
+        Returns an AsyncResource, None if the resource wasn't found, or
+        throws a ResourceError for any other non-OK status. include and
+        omit are Prefer header projections, as for fcrepo4.Repository.get
+        """
+        if include or omit:
+            headers = dict(headers or {})
+            headers['Prefer'] = self._prefer(include, omit)
+        if self.rdf_mime != RDF_MIME and not ( headers and 'Accept' in headers ):
+            headers = dict(headers or {})
+            headers['Accept'] = '{}, */*;q=0.5'.format(self.rdf_mime)
+        response = await self.api(uri, headers=headers)
+        if response.status_code == requests.codes.ok:
+            resource = AsyncResource(self, uri, response=response)
+            mime = response.headers.get('Content-type', '').split(';')[0].strip().lower()
+            if mime in RDF_MIMES:
+                resource._defer_rdf(response.text, mime)
+            resource = resource.check_type()
+            return resource
+        elif response.status_code == requests.codes.not_found:
+            return None
+        else:
+            message = "get {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+
+    @instrument('head')
+    async def head(self, uri, headers=None):
+        """Looks up a resource's headers without fetching its content:
+        returns an AsyncResource with no RDF, or None if it wasn't found"""
+        response = await self.api(uri, method='HEAD', headers=headers)
+        if response.status_code == requests.codes.ok:
+            return AsyncResource(self, uri, response=response)
+        elif response.status_code == requests.codes.not_found:
+            return None
+        else:
+            message = "head {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+
+    @instrument('exists')
+    async def exists(self, uri):
+        """Returns True if there's a resource (not a tombstone) at uri"""
+        return self._path_state(uri, await self.api(uri, method='HEAD')) == 'resource'
+
+    @instrument('add_container')
+    async def add_container(self, uri, metadata, slug=None, path=None, force=False):
+        """Add a new container inside an existing one: see
+        fcrepo4.Repository.add_container"""
+        rdf, mime = self._serialize_rdf(metadata)
+        headers = { 'Content-Type': mime }
+        if path:
+            method = 'PUT'
+            uri = self.pathconcat(uri, path)
+            await self._ensure_path(uri, force)
+        else:
+            method = 'POST'
+            if slug:
+                headers['Slug'] = slug
+        resource = await self._add_resource(uri, method, headers, rdf)
+        resource.rdf = metadata
+        self._index_update(resource.uri, metadata)
+        return resource
+
+    @instrument('add_acl')
+    async def add_acl(self, uri, path="acl", force=False):
+        """Add a new container and make it an ACL: see
+        fcrepo4.Repository.add_acl"""
+        rdf = self._acl_rdf()
+        rdf_text, mime = self._serialize_rdf(rdf)
+        headers = { 'Content-Type': mime }
+        uri = self.pathconcat(uri, path)
+        await self._ensure_path(uri, force)
+        if await self._add_resource(uri, 'PUT', headers, rdf_text):
+            acl = AsyncAcl(self, uri)
+            acl.rdf = rdf
+            return acl
+        return None
+
+    @instrument('add_binary')
+    async def add_binary(self, uri, source, slug=None, path=None, force=None, mime=DEFAULT_MIME_TYPE):
+        """Upload binary data to a container: see
+        fcrepo4.Repository.add_binary"""
+        headers = {  }
+        if path:
+            method = 'PUT'
+            uri = self.pathconcat(uri, path)
+            await self._ensure_path(uri, force)
+        else:
+            method = 'POST'
+            if slug:
+                headers['Slug'] = slug
+
+        if type(source) == str:
+            if self._is_url(source):
+                session = self._client()
+                async with session.get(source) as source_r:
+                    source_r.raise_for_status()
+                    headers['Content-type'] = source_r.headers['Content-type']
+                    basename = source.split('/')[-1]
+                    if method == 'POST' and slug:
+                        basename = slug
+                    headers['Content-Disposition'] = 'attachment; filename="{}"'.format(basename)
+                    return await self._add_resource(uri, method, headers, source_r.content.iter_chunked(UPLOAD_CHUNK))
+            else:
+                basename = os.path.basename(source)
+                headers['Content-type'], _ = mimetypes.guess_type(source)
+                headers['Content-Disposition'] = 'attachment; filename="{}"'.format(basename)
+                with open(source, 'rb') as fh:
+                    resource = await self._add_resource(uri, method, headers, fh)
+                return resource
+        else:
+            headers['Content-type'] = mime
+            if slug:
+                headers['Content-Disposition'] = 'attachment; filename="{}"'.format(slug)
+            return await self._add_resource(uri, method, headers, source)
+
+    async def _index_fetch(self, uri):
+        """Updates the index entry for uri from the RDF which Fedora has
+        for it now: see fcrepo4.Repository._index_fetch"""
+        resource = await self.get(uri, omit=[ fcrepo4.FC4_SERVER_MANAGED ])
+        if resource is not None and resource.rdf is not None:
+            self._index_update(resource.uri, resource.rdf)
+
+    async def _add_resource(self, uri, method, headers, data):
+        """Internal method for PUT/POST: this does the error handling and
+        builds the returned AsyncResource object
+        """
+        self._rdf_dump(data, uri)
+        response = await self.api(uri, method=method, headers=headers, data=data)
+        if response.status_code == requests.codes.created:
+            return AsyncResource(self, response.text)
+        else:
+            message = "{} {} failed: {} {}".format(method, uri, response.status_code, response.reason)
+            self.logger.error(message)
+            raise ResourceError(uri, self.user, response, message)
+
+    async def _ensure_path(self, path, force):
+        """Internal method to check if a path is free (and make sure it is
+        if force is True), with HEAD as in fcrepo4.Repository._ensure_path
+        """
+        state = self._path_state(path, await self.api(path, method='HEAD'))
+        if state is None:
+            return
+        if state == 'tombstone':
+            if force:
+                self.logger.debug("Force: obliterating tombstone at %s", path)
+                await self.obliterate(path)
+                return
+            message = "Path {} has a tombstone: can't re-create without force".format(path)
+        else:
+            if force:
+                self.logger.debug("Force: obliterating %s", path)
+                await self.delete(path)
+                await self.obliterate(path)
+                return
+            message = "Path {} already exists: can't re-create without force".format(path)
+        self.logger.error(message)
+        raise ConflictError(message)
+
+    @instrument('delete')
+    async def delete(self, uri):
+        """Deletes a resource"""
+        deleted = await self._delete_uri(uri)
+        self._index_remove(uri)
+        return deleted
+
+    @instrument('obliterate')
+    async def obliterate(self, uri):
+        """Removes the tombstone record left by a resource"""
+        tombstone = self.pathconcat(uri, 'fcr:tombstone')
+        return await self._delete_uri(tombstone)
+
+    async def _delete_uri(self, uri):
+        response = await self.api(uri, method="DELETE")
+        if response.status_code == requests.codes.no_content:
+            return True
+        else:
+            message = "delete {} returned HTTP status {} {}".format(uri, response.status_code, response.reason)
+            raise ResourceError(uri, self.user, response, message)
+
+
+
+class AsyncResource(fcrepo4.BaseResource):
+    """A Resource belonging to an AsyncRepository.
+
+    The RDF accessors (rdf_get, rdf_add, dc and so on) are the same as
+    fcrepo4.Resource: add_container, add_binary, put, rdf_read and rdf_write
+    return awaitables. The content of a binary is read with data(): there
+    are no streamed or ranged downloads, fixity, versions or walk.
+    """
+
+
+    def _type_classes(self):
+        """check_type returns the async subclasses"""
+        return ( AsyncAcl, AsyncAuth )
+
+    def add_container(self, metadata, slug=None, path=None, force=False):
+        """Add a new container inside this resource: the coroutine is
+        AsyncRepository.add_container, which is the one that's traced"""
+        return self.repo.add_container(self.uri, metadata, slug=slug, path=path, force=force)
+
+    def add_binary(self, source, slug=None, path=None, force=False, mime=DEFAULT_MIME_TYPE):
+        """Upload binary data into this resource. Checksums aren't
+        supported by the async client: see the module docstring."""
+        return self.repo.add_binary(self.uri, source, slug=slug, path=path, force=force, mime=mime)
+
+    @instrument('put')
+    async def put(self):
+        """Put the Resource to the repository, using force."""
+        await self.repo._ensure_path(self.uri, True)
+        rdf_text, mime = self.repo._serialize_rdf(self.rdf)
+        headers = { 'Content-Type': mime }
+        response = await self.repo.api(self.uri, method='PUT', headers=headers, data=rdf_text)
+        if response.status_code in [ requests.codes.no_content, requests.codes.created ]:
+            self.repo._index_update(self.uri, self.rdf)
+            return self
+        else:
+            message = "put RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+
+    @instrument('rdf_read')
+    async def rdf_read(self, include=None, omit=None):
+        """Read the metadata from Fedora"""
+        most_recent = await self.repo.get(self.uri, headers={ 'Accept': self.repo.rdf_mime }, include=include, omit=omit)
+        self.rdf = most_recent.rdf
+        return self.rdf
+
+    @instrument('rdf_write')
+    async def rdf_write(self, method=None):
+        """Updates a resource's metadata, based on the list of changes
+        which has been build by calls to rdf_add, rdf_replace and rdf_remove:
+        see fcrepo4.Resource.rdf_write, which this follows, including the
+        rdf_write config value and the fallback from PATCH to PUT.
+        """
+        if not self.rdf:
+            raise Error("Resource at uri {} is not an RDF-resource".format(self.uri))
+        if not self.changes:
+            self.repo.logger.error("Call to rdf_write before any changes specified")
+            raise Error("No changes for rdf_write on {}".format(self.uri))
+        if not method:
+            method = self.repo.rdf_write_method
+        if method == 'PATCH' and await self._rdf_patch():
+            # the local RDF may be a projection or out of date
+            if self.repo.index is not None:
+                await self.repo._index_fetch(self.uri)
+            return self
+        await self.rdf_read()
+        self._apply_changes()
+        rdf, mime = self.repo._serialize_rdf(self.rdf)
+        self.repo._rdf_dump(rdf, self.uri)
+        headers = { 'Content-type': mime }
+        response = await self.repo.api(self.uri, method='PUT', headers=headers, data=rdf)
+        self.repo._invalidate(self.uri)
+        if response.status_code == requests.codes.no_content:
+            self.changes = []
+            self.repo._index_update(self.uri, self.rdf)
+            return self
+        else:
+            message = "put RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+
+    async def _rdf_patch(self):
+        """Sends the list of changes as a SPARQL Update PATCH. Returns True
+        if it worked, or False if the server doesn't support PATCH."""
+        update = self.sparql_update()
+        headers = { 'Content-type': SPARQL_UPDATE_MIME }
+        response = await self.repo.api(self.uri, method='PATCH', headers=headers, data=update.encode('utf-8'))
+        self.repo._invalidate(self.uri)
+        if response.status_code == requests.codes.no_content:
+            self._apply_changes()
+            self.changes = []
+            return True
+        elif response.status_code in PATCH_UNSUPPORTED:
+            self.repo.logger.warning("PATCH %s returned HTTP status %d: falling back to PUT", self.uri, response.status_code)
+            return False
+        else:
+            message = "patch RDF {} returned HTTP status {} {}".format(self.uri, response.status_code, response.reason)
+            raise ResourceError(self.uri, self.repo.user, response, message)
+
+
+
+class AsyncAcl(AsyncResource, fcrepo4.BaseAcl):
+    """A Web AC ACL belonging to an AsyncRepository"""
+
+    @instrument('grant')
+    async def grant(self, user, access, uri):
+        """Grant a user an access level over a resource: see
+        fcrepo4.Acl.grant"""
+        resource = await self.repo.get(uri)
+        resource.rdf.bind('acl', fcrepo4.WEBAC_NS)
+        resource.rdf_add(fcrepo4.WEBAC_NS['accessControl'], fcrepo4.URIRef(self.uri))
+        await resource.rdf_write()
+        auth = AsyncAuth(self.repo, self.auth_path(user, access))
+        await auth.put(user, access, uri)
+        self.auths.append(auth)
+
+    @instrument('revoke')
+    async def revoke(self, user, access, uri):
+        """Revoke a user's access level to a resource: see
+        fcrepo4.Acl.revoke"""
+        auth_uri = self.auth_path(user, access)
+        if await self.repo.get(auth_uri):
+            await self.repo.delete(auth_uri)
+            await self.repo.obliterate(auth_uri)
+
+    @instrument('acls')
+    async def acls(self):
+        """Returns all of the ACLs permissions as a dict-by-uri-then-user.
+        The authorizations are fetched concurrently."""
+        acls = {}
+        auths = await asyncio.gather(*[ self.repo.get(uri) for uri in self.children() ])
+        for auth in auths:
+            if auth:
+                self._add_auth(acls, auth)
+        return acls
+
+
+
+class AsyncAuth(AsyncResource, fcrepo4.BaseAuth):
+    """An authorization in an ACL belonging to an AsyncRepository"""
+
+    @instrument('put')
+    async def put(self, agent, access, uri):
+        """Generates the correct RDF for granting agent access to the
+        subject (URI) and PUTs it to the repository, using force"""
+        self._build_rdf(agent, access, uri)
+        return await super(AsyncAuth, self).put()
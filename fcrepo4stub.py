@@ -0,0 +1,1093 @@
+#!/usr/bin/env python
+"""
+A stand-in for a Fedora 4 server, for running the tests and benchmarks
+without Tomcat and Fedora.
+
+It implements the parts of Fedora's REST API which fcrepo4 uses: LDP basic
+containers and binaries, PUT and POST with Slug, tombstones, fcr:metadata,
+fcr:fixity, fcr:versions, transactions, WebAC ACLs (with the Link
+rel="acl" header and enforcement), On-Behalf-Of delegation, Prefer
+include/omit, ETags and conditional GETs, SPARQL Update PATCH, Range
+requests and Digest checking. Resources are kept in memory, or in an
+sqlite database, and latency and errors can be injected to see how
+clients cope with a slow or unreliable server.
+
+    with fcrepo4stub.StandIn(latency=0.01) as server:
+        repo = fcrepo4.Repository(config=server.config())
+        repo.set_user('fedoraAdmin')
+        root = repo.get(repo.path2uri('/'))
+
+It can also be run from the command line:
+
+    python fcrepo4stub.py --port 8080 --sqlite fedora.db
+
+It's not Fedora: there's no persistence of transactions, no messaging or
+search, versions of containers don't include their children, and the
+rules for what's allowed are looser.
+"""
+
+import argparse, base64, binascii, copy, hashlib, logging, random, re, \
+    sqlite3, threading, time, uuid
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rdflib import Graph, Literal, URIRef, Namespace, RDF, XSD
+from rdflib.plugins.sparql.processor import prepareUpdate
+
+import fcrepo4
+from fcrepo4 import TripleStore, FC4_NS, LDP_NS, WEBAC_NS, PREMIS_NS, \
+    RDF_MIME, RDF_MIMES, NTRIPLES_MIME, SPARQL_UPDATE_MIME, DEFAULT_MIME_TYPE, \
+    FC4_SERVER_MANAGED, FC4_EMBED_RESOURCES, FC4_INBOUND_REFERENCES, \
+    LDP_PREFER_CONTAINMENT, LDP_PREFER_MINIMAL_CONTAINER, LDP_CONTAINS, \
+    parse_ntriples, serialize_ntriples
+
+
+CONTAINER = 'container'
+BINARY = 'binary'
+TOMBSTONE = 'tombstone'
+
+DEFAULT_USERS = {
+    'fedoraAdmin': 'secret3',
+    'user': 'password1',
+    'adminuser': 'password2',
+    'alice': 'alice1',
+    'bob': 'bob2'
+}
+
+DEFAULT_ADMINS = [ 'fedoraAdmin' ]
+
+EBUCORE_NS = Namespace('http://www.ebu.ch/metadata/ontologies/ebucore/ebucore#')
+
+# the namespaces of the triples which Fedora manages itself, and which are
+# dropped from RDF which clients send
+
+SERVER_MANAGED = [ str(FC4_NS), str(LDP_NS) ]
+
+DIGESTS = {
+    'sha1': 'sha1',
+    'sha': 'sha1',
+    'sha-1': 'sha1',
+    'sha256': 'sha256',
+    'sha-256': 'sha256',
+    'md5': 'md5'
+}
+
+TX_PREFIX = 'tx:'
+
+LOG = logging.getLogger(__name__)
+
+
+
+class Node(object):
+    """A resource in the stand-in: a container, a binary or the tombstone
+    of a deleted resource.
+
+    Attributes:
+        path (str) -- path relative to the REST root, '' for the root
+        kind (str) -- CONTAINER, BINARY or TOMBSTONE
+        graph (TripleStore) -- the triples which clients have written
+        content (bytes) -- a binary's content
+        mime (str) -- a binary's MIME type
+        filename (str) -- a binary's original filename
+        sha1 (str) -- hex SHA-1 of a binary's content
+    """
+
+    def __init__(self, path, kind=CONTAINER, graph=None, content=None, mime=None, filename=None, user=None):
+        self.path = path
+        self.kind = kind
+        self.graph = graph if graph is not None else TripleStore()
+        self.content = content
+        self.mime = mime
+        self.filename = filename
+        self.sha1 = hashlib.sha1(content).hexdigest() if content is not None else None
+        self.created = self.modified = time.time()
+        self.created_by = self.modified_by = user
+        self.version = 1
+
+    @property
+    def parent(self):
+        """The parent's path, or None for the root"""
+        return _parent(self.path)
+
+    @property
+    def etag(self):
+        if self.kind == BINARY:
+            return '"{}"'.format(self.sha1)
+        return 'W/"{}-{}"'.format(self.version, int(self.modified * 1000))
+
+    def copy(self):
+        node = copy.copy(self)
+        node.graph = self.graph.copy()
+        return node
+
+    def touch(self, user):
+        """Records a change to this node"""
+        self.modified = max(time.time(), self.modified + 0.001)
+        self.modified_by = user
+        self.version += 1
+
+
+
+class MemoryStore(object):
+    """Keeps the stand-in's nodes in a dict"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.kids = {}
+
+    def get(self, path):
+        return self.nodes.get(path)
+
+    def put(self, node):
+        if node.path not in self.nodes and node.parent is not None:
+            self.kids.setdefault(node.parent, set()).add(node.path)
+        self.nodes[node.path] = node
+
+    def remove(self, path):
+        node = self.nodes.pop(path, None)
+        if node and node.parent is not None:
+            self.kids.get(node.parent, set()).discard(path)
+        self.kids.pop(path, None)
+
+    def children(self, path):
+        return sorted(self.kids.get(path, []))
+
+    def paths(self):
+        return list(self.nodes)
+
+    def close(self):
+        pass
+
+
+
+class SqliteStore(object):
+    """Keeps the stand-in's nodes in an sqlite database, with their
+    triples serialised as N-Triples"""
+
+    COLUMNS = [ 'path', 'parent', 'kind', 'graph', 'content', 'mime', 'filename', 'sha1',
+                'created', 'modified', 'created_by', 'modified_by', 'version' ]
+
+    def __init__(self, filename):
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute("""CREATE TABLE IF NOT EXISTS nodes (
+            path TEXT PRIMARY KEY, parent TEXT, kind TEXT, graph TEXT,
+            content BLOB, mime TEXT, filename TEXT, sha1 TEXT, created REAL,
+            modified REAL, created_by TEXT, modified_by TEXT, version INTEGER
+            )""")
+        self.db.execute('CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent)')
+        self.db.commit()
+
+    def get(self, path):
+        row = self.db.execute('SELECT {} FROM nodes WHERE path = ?'.format(', '.join(self.COLUMNS)), ( path, )).fetchone()
+        if not row:
+            return None
+        values = dict(zip(self.COLUMNS, row))
+        node = Node(path, values['kind'])
+        for c in self.COLUMNS[2:]:
+            setattr(node, c, values[c])
+        node.graph = parse_ntriples(values['graph'] or '', TripleStore())
+        return node
+
+    def put(self, node):
+        values = [ getattr(node, c) for c in self.COLUMNS ]
+        values[1] = node.parent
+        values[3] = serialize_ntriples(node.graph)
+        self.db.execute('INSERT OR REPLACE INTO nodes VALUES ({})'.format(', '.join([ '?' ] * len(values))), values)
+        self.db.commit()
+
+    def remove(self, path):
+        self.db.execute('DELETE FROM nodes WHERE path = ?', ( path, ))
+        self.db.commit()
+
+    def children(self, path):
+        return [ r[0] for r in self.db.execute('SELECT path FROM nodes WHERE parent = ? ORDER BY path', ( path, )) ]
+
+    def paths(self):
+        return [ r[0] for r in self.db.execute('SELECT path FROM nodes') ]
+
+    def close(self):
+        self.db.close()
+
+
+
+class Overlay(object):
+    """The changes made in a transaction, on top of the store they'll be
+    committed to. Until then, they're only visible inside the transaction."""
+
+    def __init__(self, base):
+        self.base = base
+        self.changes = {}
+        self.touched = time.time()
+
+    def get(self, path):
+        if path in self.changes:
+            return self.changes[path]
+        return self.base.get(path)
+
+    def put(self, node):
+        self.changes[node.path] = node
+
+    def remove(self, path):
+        self.changes[path] = None
+
+    def children(self, path):
+        kids = set(self.base.children(path))
+        for p, node in self.changes.items():
+            if node is None:
+                kids.discard(p)
+            elif node.parent == path:
+                kids.add(p)
+        return sorted(kids)
+
+    def paths(self):
+        paths = set(self.base.paths())
+        for p, node in self.changes.items():
+            if node is None:
+                paths.discard(p)
+            else:
+                paths.add(p)
+        return list(paths)
+
+    def commit(self):
+        for path, node in self.changes.items():
+            if node is None:
+                self.base.remove(path)
+            else:
+                self.base.put(node)
+        self.changes = {}
+
+
+
+class StandIn(object):
+    """A Fedora 4 stand-in server, running on a background thread.
+
+    Parameters:
+    host (str) -- interface to listen on
+    port (int) -- port to listen on: 0 picks a free one
+    sqlite (str) -- database file to keep resources in, rather than memory
+    users (dict) -- passwords by username: defaults to DEFAULT_USERS
+    admins ([str]) -- users who can do anything and delegate with
+                      On-Behalf-Of
+    latency (float) -- seconds to wait before handling each request
+    jitter (float) -- random extra seconds, up to this, on top of latency
+    error_rate (float) -- fraction of requests which fail with error_status
+    error_status (int) -- the status for injected errors
+    webac (boolean) -- whether to enforce ACLs
+    seed -- seed for the random numbers used for jitter and errors
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, sqlite=None, users=None, admins=None,
+                 latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, webac=True, seed=None):
+        self.store = SqliteStore(sqlite) if sqlite else MemoryStore()
+        self.users = dict(users or DEFAULT_USERS)
+        self.admins = set(admins or DEFAULT_ADMINS)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.webac = webac
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.transactions = {}
+        self.requests = 0
+        if self.store.get('') is None:
+            self.store.put(Node(''))
+        handler = type('StandInHandler', ( StandInHandler, ), { 'standin': self })
+        self.server = ThreadingHTTPServer(( host, port ), handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self.uri = 'http://{}:{}/fcrepo/'.format(self.host, self.port)
+        self.rest = self.uri + 'rest/'
+        self.thread = None
+
+    def config(self, **kwargs):
+        """Returns a config dict for an fcrepo4.Repository which connects to
+        this server with its users: any keyword arguments are added to it"""
+        config = {
+            'uri': self.uri,
+            'users': { u: { 'user': u, 'password': p } for u, p in self.users.items() }
+        }
+        config.update(kwargs)
+        return config
+
+    def corrupt(self, uri, content=b'bit rot'):
+        """Replaces the content of the binary at uri without updating its
+        checksum, so that its fixity check fails"""
+        path = uri[len(self.rest):]
+        node = self.store.get(path)
+        if not node or node.kind != BINARY:
+            raise ValueError("No binary at {}".format(uri))
+        node.content = content
+        self.store.put(node)
+
+    def start(self):
+        """Starts serving requests on a background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server and closes its store"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.store.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def delay(self):
+        """Sleeps for the configured latency"""
+        seconds = self.latency
+        if self.jitter:
+            seconds += self.random.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def inject_error(self):
+        """Returns True if this request should fail"""
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Handles requests for a StandIn (which is set as the class attribute
+    standin by StandIn.__init__)"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'fcrepo4stub'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    standin = None
+
+    def log_message(self, format, *args):
+        LOG.debug("%s " + format, self.address_string(), *args)
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_HEAD(self):
+        self.dispatch()
+
+    def do_PUT(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_PATCH(self):
+        self.dispatch()
+
+    def do_DELETE(self):
+        self.dispatch()
+
+    def do_OPTIONS(self):
+        self.dispatch()
+
+    # request handling
+
+    def dispatch(self):
+        s = self.standin
+        self.body = self.read_body()
+        s.delay()
+        with s.lock:
+            s.requests += 1
+            if s.inject_error():
+                return self.respond(s.error_status, 'Injected error', headers={ 'Retry-After': '1' })
+            self.user = self.authenticate()
+            if not self.user:
+                return self.respond(401, 'Unauthorized', headers={ 'WWW-Authenticate': 'Basic realm="fcrepo"' })
+            path = self.path.split('?')[0]
+            if not ( path + '/' ).startswith('/fcrepo/rest/'):
+                return self.respond(404, 'Not found')
+            segments = [ p for p in path[len('/fcrepo/rest'):].split('/') if p ]
+            self.base = s.rest
+            self.store = s.store
+            self.tx = None
+            if segments and segments[0].startswith(TX_PREFIX):
+                self.tx = segments.pop(0)
+                if self.tx not in s.transactions:
+                    return self.respond(410, 'Transaction {} has expired'.format(self.tx))
+                self.store = s.transactions[self.tx]
+                self.store.touched = time.time()
+                self.base = s.rest + self.tx + '/'
+            if segments and segments[0] == 'fcr:tx':
+                return self.transaction('/'.join(segments[1:]))
+            action = None
+            label = None
+            if len(segments) > 1 and segments[-2] == 'fcr:versions':
+                label = segments.pop()
+            if segments and segments[-1] in [ 'fcr:metadata', 'fcr:tombstone', 'fcr:fixity', 'fcr:versions' ]:
+                action = segments.pop()
+            self.resource('/'.join(segments), action, label)
+
+    def resource(self, path, action, label=None):
+        method = self.command
+        node = self.store.get(path)
+        if action == 'fcr:tombstone':
+            if method != 'DELETE':
+                return self.respond(405, 'Method not allowed')
+            if not node or node.kind != TOMBSTONE:
+                return self.respond(404, 'No tombstone at {}'.format(path))
+            if not self.allowed(node.parent, 'Write'):
+                return self.forbidden()
+            self.store.remove(path)
+            return self.respond(204)
+        if node and node.kind == TOMBSTONE:
+            link = '<{}>; rel="hasTombstone"'.format(self.uri(path) + '/fcr:tombstone')
+            return self.respond(410, 'Discovered tombstone resource at {}'.format(self.uri(path)), headers={ 'Link': link })
+        mode = 'Read' if method in [ 'GET', 'HEAD', 'OPTIONS' ] else 'Write'
+        if not self.allowed(self.existing(path), mode):
+            return self.forbidden()
+        if method == 'OPTIONS':
+            return self.respond(200, headers={ 'Allow': 'GET, HEAD, PUT, POST, PATCH, DELETE, OPTIONS' })
+        if action == 'fcr:fixity':
+            if not node or node.kind != BINARY:
+                return self.respond(404, 'Not found')
+            if method != 'GET':
+                return self.respond(405, 'Method not allowed')
+            return self.get_rdf(node, self.fixity(node))
+        if action == 'fcr:versions':
+            if not node:
+                return self.respond(404, 'Not found')
+            return self.versions(node, label)
+        if action == 'fcr:metadata':
+            if not node or node.kind != BINARY:
+                return self.respond(404, 'Not found')
+            if method in [ 'GET', 'HEAD' ]:
+                return self.get_rdf(node, self.description(node))
+            if method == 'PATCH':
+                return self.patch(node)
+            if method == 'PUT':
+                return self.put_rdf(node, node.path)
+            return self.respond(405, 'Method not allowed')
+        if method in [ 'GET', 'HEAD' ]:
+            if not node:
+                return self.respond(404, 'Not found')
+            if node.kind == BINARY:
+                return self.get_binary(node)
+            return self.get_rdf(node, self.representation(node))
+        if method == 'PUT':
+            if self.is_rdf():
+                if node and node.kind == BINARY:
+                    return self.respond(409, 'Can\'t replace a binary with RDF')
+                return self.put_rdf(node, path)
+            return self.put_binary(node, path)
+        if method == 'POST':
+            if not node:
+                return self.respond(404, 'Not found')
+            if node.kind == BINARY:
+                return self.respond(405, 'Can\'t add a child to a binary')
+            return self.post(node)
+        if method == 'PATCH':
+            if not node:
+                return self.respond(404, 'Not found')
+            if node.kind == BINARY:
+                return self.respond(415, 'PATCH a binary\'s fcr:metadata')
+            return self.patch(node)
+        if method == 'DELETE':
+            if not node:
+                return self.respond(404, 'Not found')
+            if not path:
+                return self.respond(405, 'Can\'t delete the root')
+            return self.delete(node)
+        self.respond(405, 'Method not allowed')
+
+    def get_rdf(self, node, triples):
+        """Sends an RDF representation, or 304 if the client's copy is
+        still current"""
+        headers = self.node_headers(node)
+        if self.not_modified(node):
+            return self.respond(304, headers=headers)
+        mime = self.negotiate()
+        triples = self.rebase(triples, self.standin.rest, self.base)
+        if mime == NTRIPLES_MIME:
+            body = serialize_ntriples(triples)
+        else:
+            g = Graph()
+            for prefix, ns in [ ( 'fedora', FC4_NS ), ( 'ldp', LDP_NS ), ( 'acl', WEBAC_NS ), ( 'dc', fcrepo4.DC ), ( 'premis', PREMIS_NS ) ]:
+                g.bind(prefix, ns)
+            g.addN([ t + ( g, ) for t in triples ])
+            body = g.serialize(format=RDF_MIMES[mime])
+        headers['Content-Type'] = mime + '; charset=utf-8'
+        if self.headers.get('Prefer'):
+            headers['Preference-Applied'] = 'return=representation'
+        self.respond(200, body.encode('utf-8'), headers=headers)
+
+    def get_binary(self, node):
+        headers = self.node_headers(node)
+        headers['Accept-Ranges'] = 'bytes'
+        headers['Digest'] = 'sha1={}'.format(node.sha1)
+        if node.filename:
+            headers['Content-Disposition'] = 'attachment; filename="{}"'.format(node.filename)
+        if self.not_modified(node):
+            return self.respond(304, headers=headers)
+        headers['Content-Type'] = node.mime or DEFAULT_MIME_TYPE
+        content = node.content or b''
+        ranges = self.headers.get('Range')
+        if ranges:
+            m = re.match(r'bytes=(\d*)-(\d*)$', ranges.strip())
+            size = len(content)
+            if m and ( m.group(1) or m.group(2) ):
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = int(m.group(2)) if m.group(2) else size - 1
+                else:
+                    start = max(size - int(m.group(2)), 0)
+                    end = size - 1
+                end = min(end, size - 1)
+                if start > end:
+                    headers['Content-Range'] = 'bytes */{}'.format(size)
+                    return self.respond(416, 'Range not satisfiable', headers=headers)
+                headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+                return self.respond(206, content[start:end + 1], headers=headers)
+        self.respond(200, content, headers=headers)
+
+    def put_rdf(self, node, path):
+        """Creates a container, or replaces a container's or binary
+        description's triples"""
+        graph = self.parse_body(self.uri(path))
+        if graph is None:
+            return
+        if node:
+            if not self.if_match(node):
+                return self.respond(412, 'ETag mismatch')
+            node = node.copy()
+            node.graph = graph
+            node.touch(self.user)
+            self.store.put(node)
+            return self.respond(204, headers={ 'ETag': node.etag })
+        node = Node(path, CONTAINER, graph=graph, user=self.user)
+        return self.create(node)
+
+    def put_binary(self, node, path):
+        if node and not self.if_match(node):
+            return self.respond(412, 'ETag mismatch')
+        if not self.check_digest():
+            return
+        binary = Node(path, BINARY, content=self.body, mime=self.content_type() or DEFAULT_MIME_TYPE,
+                      filename=self.filename(), user=self.user)
+        if node:
+            if node.kind != BINARY:
+                return self.respond(409, 'Can\'t replace a container with a binary')
+            binary.graph = node.graph
+            binary.created, binary.created_by = node.created, node.created_by
+            binary.version = node.version + 1
+            self.store.put(binary)
+            return self.respond(204, headers={ 'ETag': binary.etag })
+        self.create(binary)
+
+    def post(self, parent):
+        slug = self.headers.get('Slug')
+        path = None
+        if slug:
+            slug = slug.strip('/')
+            candidate = self.join(parent.path, slug)
+            if self.store.get(candidate) is None:
+                path = candidate
+        if not path:
+            path = self.join(parent.path, str(uuid.uuid4()))
+        if self.is_rdf() or not self.body:
+            graph = self.parse_body(self.uri(path)) if self.body else TripleStore()
+            if graph is None:
+                return
+            return self.create(Node(path, CONTAINER, graph=graph, user=self.user))
+        if not self.check_digest():
+            return
+        self.create(Node(path, BINARY, content=self.body, mime=self.content_type() or DEFAULT_MIME_TYPE,
+                         filename=self.filename(), user=self.user))
+
+    def create(self, node):
+        """Adds a new node, and any missing containers between it and the
+        root, and responds with its URI"""
+        parent = node.parent
+        missing = []
+        while parent is not None:
+            p = self.store.get(parent)
+            if p:
+                if p.kind == TOMBSTONE:
+                    return self.respond(410, 'Discovered tombstone resource at {}'.format(self.uri(parent)))
+                if p.kind == BINARY:
+                    return self.respond(409, 'Can\'t add a child to a binary')
+                break
+            missing.append(parent)
+            parent = _parent(parent)
+        for path in missing:
+            self.store.put(Node(path, CONTAINER, user=self.user))
+        self.store.put(node)
+        self.touch_parent(node)
+        uri = self.base + node.path
+        self.respond(201, uri, headers={ 'Location': uri, 'ETag': node.etag, 'Content-Type': 'text/plain' })
+
+    def patch(self, node):
+        if self.content_type() != SPARQL_UPDATE_MIME:
+            return self.respond(415, 'PATCH needs {}'.format(SPARQL_UPDATE_MIME))
+        if not self.if_match(node):
+            return self.respond(412, 'ETag mismatch')
+        uri = self.uri(node.path)
+        g = node.graph.graph()
+        g = self.rebase(g, self.standin.rest, self.base, graph=True)
+        try:
+            g.update(prepareUpdate(self.body.decode('utf-8'), base=uri))
+        except Exception as e:
+            return self.respond(400, 'Bad SPARQL Update: {}'.format(e))
+        node = node.copy()
+        node.graph = self.server_managed_removed(self.rebase(g, self.base, self.standin.rest))
+        node.touch(self.user)
+        self.store.put(node)
+        self.respond(204, headers={ 'ETag': node.etag })
+
+    def delete(self, node):
+        if not self.if_match(node):
+            return self.respond(412, 'ETag mismatch')
+        for path in self.descendants(node.path) + [ node.path ]:
+            for version in self.store.children(self.join(path, 'fcr:versions')):
+                self.store.remove(version)
+            if path != node.path:
+                self.store.remove(path)
+        tombstone = Node(node.path, TOMBSTONE, user=self.user)
+        self.store.put(tombstone)
+        self.touch_parent(node)
+        self.respond(204)
+
+    def versions(self, node, label):
+        """Lists a node's versions, makes a new one (POST with the label in
+        a Slug header) or sends one of them. A version is a copy of the
+        node stored at path/fcr:versions/label, whose modified time is
+        when it was made."""
+        method = self.command
+        if label is None:
+            if method in [ 'GET', 'HEAD' ]:
+                return self.get_rdf(node, self.version_list(node))
+            if method != 'POST':
+                return self.respond(405, 'Method not allowed')
+            label = ( self.headers.get('Slug') or '' ).strip()
+            if not label or '/' in label:
+                return self.respond(400, 'A version needs a label in the Slug header')
+            path = self.join(node.path, 'fcr:versions/' + label)
+            if self.store.get(path) is not None:
+                return self.respond(409, 'The label {} has already been assigned'.format(label))
+            original = URIRef(self.standin.rest + node.path)
+            subject = URIRef(self.standin.rest + path)
+            version = node.copy()
+            version.path = path
+            version.graph = TripleStore()
+            for s, p, o in node.graph:
+                version.graph.add(( subject if s == original else s, p, o ))
+            version.modified = time.time()
+            self.store.put(version)
+            uri = self.uri(path)
+            return self.respond(201, uri, headers={ 'Location': uri, 'Content-Type': 'text/plain' })
+        if method not in [ 'GET', 'HEAD' ]:
+            return self.respond(405, 'Method not allowed')
+        version = self.store.get(self.join(node.path, 'fcr:versions/' + label))
+        if not version:
+            return self.respond(404, 'No version {} of {}'.format(label, self.uri(node.path)))
+        if version.kind == BINARY:
+            return self.get_binary(version)
+        return self.get_rdf(version, self.representation(version))
+
+    def transaction(self, action):
+        """Starts, refreshes, commits or rolls back a transaction"""
+        s = self.standin
+        if self.command != 'POST':
+            return self.respond(405, 'Method not allowed')
+        if not self.tx:
+            if action:
+                return self.respond(404, 'Not found')
+            tx = TX_PREFIX + uuid.uuid4().hex
+            s.transactions[tx] = Overlay(s.store)
+            uri = s.rest + tx
+            return self.respond(201, uri, headers={ 'Location': uri, 'Content-Type': 'text/plain' })
+        if action == 'fcr:commit':
+            s.transactions.pop(self.tx).commit()
+        elif action == 'fcr:rollback':
+            s.transactions.pop(self.tx)
+        elif action:
+            return self.respond(404, 'Not found')
+        self.respond(204)
+
+    # representations
+
+    def uri(self, path):
+        return self.base + path
+
+    def representation(self, node):
+        """The triples for a container, according to the Prefer header"""
+        include, omit = self.prefer()
+        s = URIRef(self.standin.rest + node.path)
+        triples = list(node.graph)
+        if FC4_SERVER_MANAGED not in omit:
+            triples += self.server_triples(node, s)
+        kids = None
+        if LDP_PREFER_CONTAINMENT not in omit and LDP_PREFER_MINIMAL_CONTAINER not in include:
+            kids = self.live_children(node.path)
+            triples += [ ( s, LDP_CONTAINS, URIRef(self.standin.rest + k.path) ) for k in kids ]
+        if FC4_EMBED_RESOURCES in include:
+            for k in kids if kids is not None else self.live_children(node.path):
+                triples += list(k.graph)
+        if FC4_INBOUND_REFERENCES in include:
+            for path in self.store.paths():
+                if '/fcr:versions/' in path:
+                    continue
+                other = self.store.get(path)
+                if other and other.kind != TOMBSTONE:
+                    triples += [ t for t in other.graph.triples(( None, None, s )) ]
+        return triples
+
+    def description(self, node):
+        """The triples for a binary's fcr:metadata"""
+        s = URIRef(self.standin.rest + node.path)
+        triples = list(node.graph) + self.server_triples(node, s)
+        triples += [
+            ( s, PREMIS_NS['hasSize'], Literal(len(node.content or b'')) ),
+            ( s, PREMIS_NS['hasMessageDigest'], URIRef('urn:sha1:' + node.sha1) ),
+            ( s, EBUCORE_NS['hasMimeType'], Literal(node.mime) )
+            ]
+        if node.filename:
+            triples.append(( s, EBUCORE_NS['filename'], Literal(node.filename) ))
+        return triples
+
+    def version_list(self, node):
+        """The triples for a node's fcr:versions"""
+        s = URIRef(self.standin.rest + node.path)
+        triples = []
+        for path in self.store.children(self.join(node.path, 'fcr:versions')):
+            version = self.store.get(path)
+            v = URIRef(self.standin.rest + path)
+            triples += [
+                ( s, FC4_NS['hasVersion'], v ),
+                ( v, FC4_NS['hasVersionLabel'], Literal(path.rsplit('/', 1)[1]) ),
+                ( v, FC4_NS['created'], Literal(_isotime(version.modified), datatype=XSD.dateTime) )
+                ]
+        return triples
+
+    def fixity(self, node):
+        """The triples for a fixity check of a binary: its content's SHA-1
+        is compared with the one recorded when it was written"""
+        s = URIRef(self.standin.rest + node.path)
+        content = node.content or b''
+        actual = hashlib.sha1(content).hexdigest()
+        result = URIRef('{}#fixity/{}'.format(s, int(time.time() * 1000)))
+        return [
+            ( s, PREMIS_NS['hasFixity'], result ),
+            ( result, RDF.type, PREMIS_NS['Fixity'] ),
+            ( result, RDF.type, PREMIS_NS['EventOutcomeDetail'] ),
+            ( result, PREMIS_NS['hasEventOutcome'], Literal('SUCCESS' if actual == node.sha1 else 'BAD_CHECKSUM') ),
+            ( result, PREMIS_NS['hasMessageDigest'], URIRef('urn:sha1:' + actual) ),
+            ( result, PREMIS_NS['hasSize'], Literal(len(content)) )
+            ]
+
+    def server_triples(self, node, s):
+        if node.kind == BINARY:
+            types = [ FC4_NS['Binary'], FC4_NS['Resource'], LDP_NS['NonRDFSource'] ]
+        else:
+            types = [ FC4_NS['Container'], FC4_NS['Resource'], LDP_NS['RDFSource'], LDP_NS['Container'], LDP_NS['BasicContainer'] ]
+        triples = [ ( s, RDF.type, t ) for t in types ]
+        triples += [
+            ( s, FC4_NS['created'], Literal(_isotime(node.created), datatype=XSD.dateTime) ),
+            ( s, FC4_NS['lastModified'], Literal(_isotime(node.modified), datatype=XSD.dateTime) ),
+            ( s, FC4_NS['createdBy'], Literal(node.created_by or 'bypassAdmin') ),
+            ( s, FC4_NS['lastModifiedBy'], Literal(node.modified_by or 'bypassAdmin') ),
+            ( s, FC4_NS['writable'], Literal(True) )
+            ]
+        if node.parent is not None:
+            triples.append(( s, FC4_NS['hasParent'], URIRef(self.standin.rest + node.parent) ))
+        return triples
+
+    def node_headers(self, node):
+        uri = self.uri(node.path)
+        links = [ '<{}>;rel="type"'.format(LDP_NS['Resource']) ]
+        if node.kind == BINARY:
+            links.append('<{}>;rel="type"'.format(LDP_NS['NonRDFSource']))
+            links.append('<{}/fcr:metadata>; rel="describedby"'.format(uri))
+        else:
+            links.append('<{}>;rel="type"'.format(LDP_NS['BasicContainer']))
+        acl = self.effective_acl(node.path)
+        if acl:
+            links.append('<{}>; rel="acl"'.format(self.rebase_uri(acl[1], self.standin.rest, self.base)))
+        return {
+            'ETag': node.etag,
+            'Last-Modified': formatdate(node.modified, usegmt=True),
+            'Link': ', '.join(links)
+            }
+
+    def negotiate(self):
+        """Picks the RDF format to reply with from the Accept header"""
+        for part in self.headers.get('Accept', '').split(','):
+            mime = part.split(';')[0].strip().lower()
+            if mime in RDF_MIMES:
+                return mime
+        return RDF_MIME
+
+    def prefer(self):
+        """Returns the sets of include and omit URIs from a Prefer header"""
+        prefer = self.headers.get('Prefer', '')
+        found = {}
+        for param in [ 'include', 'omit' ]:
+            m = re.search(param + r'="([^"]*)"', prefer)
+            found[param] = set([ URIRef(u) for u in m.group(1).split() ]) if m else set()
+        return found['include'], found['omit']
+
+    def rebase(self, triples, old, new, graph=False):
+        """Rewrites the URIs starting with old to start with new: this is
+        how resources in transactions get their transaction URIs"""
+        if old == new:
+            return triples
+        out = Graph() if graph else []
+        for t in triples:
+            t = tuple([ URIRef(self.rebase_uri(x, old, new)) if isinstance(x, URIRef) else x for x in t ])
+            if graph:
+                out.add(t)
+            else:
+                out.append(t)
+        return out
+
+    def rebase_uri(self, uri, old, new):
+        return new + uri[len(old):] if uri.startswith(old) else uri
+
+    # reading requests
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    while self.rfile.readline() not in [ b'\r\n', b'\n', b'' ]:
+                        pass
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def content_type(self):
+        return self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+    def is_rdf(self):
+        return self.content_type() in RDF_MIMES
+
+    def filename(self):
+        m = re.search(r'filename="?([^";]+)"?', self.headers.get('Content-Disposition', ''))
+        return m.group(1) if m else None
+
+    def parse_body(self, uri):
+        """Parses an RDF request body, resolving relative URIs against uri,
+        and returns its triples without the server-managed ones, or None
+        after sending a 400 if it can't be parsed"""
+        mime = self.content_type()
+        if mime not in RDF_MIMES:
+            self.respond(415, 'Unsupported RDF type {}'.format(mime))
+            return None
+        try:
+            g = Graph()
+            g.parse(data=self.body.decode('utf-8'), format=RDF_MIMES[mime], publicID=uri)
+        except Exception as e:
+            self.respond(400, 'Bad RDF: {}'.format(e))
+            return None
+        return self.server_managed_removed(self.rebase(g, self.base, self.standin.rest))
+
+    def server_managed_removed(self, triples):
+        store = TripleStore()
+        for s, p, o in triples:
+            if any(str(p).startswith(ns) for ns in SERVER_MANAGED):
+                continue
+            if p == RDF.type and any(str(o).startswith(ns) for ns in SERVER_MANAGED):
+                continue
+            store.add(( s, p, o ))
+        return store
+
+    def check_digest(self):
+        """Checks the body against a Digest header, and sends a 409 if it
+        doesn't match"""
+        digest = self.headers.get('Digest')
+        if not digest:
+            return True
+        for part in digest.split(','):
+            algorithm, _, expected = part.strip().partition('=')
+            name = DIGESTS.get(algorithm.strip().lower())
+            if not name:
+                continue
+            h = hashlib.new(name, self.body)
+            expected = expected.strip()
+            if expected.lower() != h.hexdigest() and expected != base64.b64encode(h.digest()).decode('ascii'):
+                self.respond(409, 'Checksum mismatch: {} is {}'.format(algorithm, h.hexdigest()))
+                return False
+        return True
+
+    def not_modified(self, node):
+        inm = self.headers.get('If-None-Match')
+        if inm:
+            return node.etag in [ e.strip() for e in inm.split(',') ] or inm.strip() == '*'
+        ims = self.headers.get('If-Modified-Since')
+        if ims:
+            try:
+                return int(node.modified) <= parsedate_to_datetime(ims).timestamp()
+            except ( TypeError, ValueError ):
+                return False
+        return False
+
+    def if_match(self, node):
+        im = self.headers.get('If-Match')
+        return not im or im.strip() == '*' or node.etag in [ e.strip() for e in im.split(',') ]
+
+    # users and ACLs
+
+    def authenticate(self):
+        """Returns the user the request is made for, or None if its
+        credentials are wrong. Admins can act for other users with the
+        On-Behalf-Of header."""
+        auth = self.headers.get('Authorization', '')
+        if not auth.startswith('Basic '):
+            return None
+        try:
+            user, _, password = base64.b64decode(auth[6:]).decode('utf-8').partition(':')
+        except ( binascii.Error, UnicodeDecodeError ):
+            return None
+        if self.standin.users.get(user) != password:
+            return None
+        behalf = self.headers.get('On-Behalf-Of')
+        if behalf and user in self.standin.admins:
+            return behalf
+        return user
+
+    def allowed(self, path, mode):
+        """Whether the user has mode access to the node at path, according
+        to its effective ACL. Resources with no ACL are open to everyone."""
+        if not self.standin.webac or self.user in self.standin.admins or path is None:
+            return True
+        acl = self.effective_acl(path)
+        if not acl:
+            return True
+        holder, acl_uri = acl
+        auths = []
+        acl_path = acl_uri[len(self.standin.rest):]
+        for kid in self.live_children(acl_path):
+            for auth in kid.graph.triples(( None, RDF.type, WEBAC_NS['Authorization'] )):
+                a = auth[0]
+                auths.append(( [ str(x) for x in kid.graph.objects(a, WEBAC_NS['agent']) ],
+                               [ str(x) for x in kid.graph.objects(a, WEBAC_NS['mode']) ],
+                               [ str(x) for x in kid.graph.objects(a, WEBAC_NS['accessTo']) ] ))
+        p = path
+        while p is not None:
+            uri = self.standin.rest + p
+            here = [ ( agents, modes ) for agents, modes, to in auths if uri in to ]
+            if here:
+                return any(self.user in agents and str(WEBAC_NS[mode]) in modes for agents, modes in here)
+            if p == holder:
+                break
+            p = _parent(p)
+        return False
+
+    def effective_acl(self, path):
+        """Returns ( path of the resource with the acl:accessControl, ACL
+        URI ) for the nearest one at or above path, or None"""
+        p = path
+        while p is not None:
+            node = self.store.get(p)
+            if node and node.kind != TOMBSTONE:
+                for acl in node.graph.objects(URIRef(self.standin.rest + p), WEBAC_NS['accessControl']):
+                    return p, str(acl)
+            p = _parent(p)
+        return None
+
+    def existing(self, path):
+        """The path of the nearest node which exists at or above path"""
+        p = path
+        while p is not None:
+            if self.store.get(p) is not None:
+                return p
+            p = _parent(p)
+        return None
+
+    def forbidden(self):
+        self.respond(403, 'User {} is not authorized'.format(self.user))
+
+    # tree
+
+    def join(self, path, child):
+        return path + '/' + child if path else child
+
+    def live_children(self, path):
+        nodes = [ self.store.get(p) for p in self.store.children(path) ]
+        return [ n for n in nodes if n and n.kind != TOMBSTONE ]
+
+    def descendants(self, path):
+        found = []
+        for kid in self.store.children(path):
+            found += self.descendants(kid)
+            found.append(kid)
+        return found
+
+    def touch_parent(self, node):
+        if node.parent is not None:
+            parent = self.store.get(node.parent)
+            if parent:
+                parent = parent.copy()
+                parent.touch(self.user)
+                self.store.put(parent)
+
+    # responses
+
+    def respond(self, status, body=b'', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        headers = headers or {}
+        if body and 'Content-Type' not in headers:
+            headers['Content-Type'] = 'text/plain'
+        for h, v in headers.items():
+            self.send_header(h, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and status != 304:
+            self.wfile.write(body)
+
+
+
+def _parent(path):
+    """The path of a path's parent, or None for the root"""
+    if not path:
+        return None
+    return path.rsplit('/', 1)[0] if '/' in path else ''
+
+
+def _isotime(t):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + '.{:03d}Z'.format(int(t * 1000) % 1000)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="A stand-in Fedora 4 server")
+    parser.add_argument('--host', default='127.0.0.1', type=str, help="Interface to listen on")
+    parser.add_argument('-p', '--port', default=8080, type=int, help="Port to listen on")
+    parser.add_argument('-s', '--sqlite', type=str, help="Keep resources in this sqlite database")
+    parser.add_argument('-u', '--user', action='append', default=[], help="user:password (repeatable)")
+    parser.add_argument('-a', '--admin', action='append', default=[], help="Admin user (repeatable)")
+    parser.add_argument('-l', '--latency', default=0.0, type=float, help="Seconds added to each request")
+    parser.add_argument('-j', '--jitter', default=0.0, type=float, help="Random extra latency, up to this")
+    parser.add_argument('-e', '--error-rate', default=0.0, type=float, help="Fraction of requests which fail")
+    parser.add_argument('--error-status', default=503, type=int, help="HTTP status of injected errors")
+    parser.add_argument('--no-webac', action='store_true', help="Don't enforce ACLs")
+    parser.add_argument('--seed', type=int, help="Random seed")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+        LOG.setLevel(logging.DEBUG)
+    users = dict([ u.split(':', 1) for u in args.user ]) if args.user else None
+    standin = StandIn(args.host, args.port, sqlite=args.sqlite, users=users, admins=args.admin or None,
+                      latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      error_status=args.error_status, webac=not args.no_webac, seed=args.seed)
+    print("Fedora stand-in at {}".format(standin.rest))
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+        standin.store.close()
@@ -1,12 +1,29 @@
-import unittest, logging
+import unittest, logging, os, atexit
 import fcrepo4
 
+# Set the environment variable FCREPO4_STANDIN to run the tests against a
+# stand-in server (see fcrepo4stub.py) rather than the Fedora in config.yml.
+# FCREPO4_STANDIN_SQLITE=file keeps its resources in an sqlite database.
+
+STANDIN = None
+
+def config():
+    """Returns the config for the tests' repositories"""
+    global STANDIN
+    if not os.environ.get('FCREPO4_STANDIN'):
+        return 'config.yml'
+    if not STANDIN:
+        import fcrepo4stub
+        STANDIN = fcrepo4stub.StandIn(sqlite=os.environ.get('FCREPO4_STANDIN_SQLITE')).start()
+        atexit.register(STANDIN.stop)
+    return STANDIN.config(delegated=False)
+
 class FCRepoTest(unittest.TestCase):
     """Test case which sets up a repository connection"""
     def setUp(self, loglevel=logging.WARNING):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(level=loglevel)
-        self.repo = fcrepo4.Repository(loglevel=loglevel)
+        self.repo = fcrepo4.Repository(config=config(), loglevel=loglevel)
         self.repo.set_user('fedoraAdmin')
 
     def dump_triples(self, graph, level=logging.WARNING):
@@ -30,7 +47,7 @@ class FCRepoContainerTest(FCRepoTest):
                 
     def tearDown(self, path):
         self.repo.set_user('fedoraAdmin')
-        uri = self.repo.path2uri(path)
-        self.repo.delete(uri)
-        self.repo.obliterate(uri)
+        report = self.repo.purge(self.repo.path2uri(path))
+        if report.errors:
+            raise report.errors[0][1]
 
@@ -18,7 +18,7 @@ def acl_link(headers):
 
 def fetch_acls(repo, uri):
     repo.set_user('fedoraAdmin')
-    resource = repo.get(uri)
+    resource = repo.head(uri)
     if not resource:
         print("Fedora object {} not found".format(uri))
         return None
@@ -68,7 +68,7 @@ setup(
 
     # Alternatively, if you want to distribute just a my_module.py, uncomment
     # this:
-    py_modules=['fcrepo4'],
+    py_modules=['fcrepo4', 'fcrepo4async', 'fcrepo4stub'],
 
     # List run-time dependencies here.  These will be installed by pip when
     # your project is installed. For an analysis of "install_requires" vs pip's
@@ -76,6 +76,12 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=['nose', 'rdflib', 'requests', 'pyyaml'],
 
+    # The asyncio client (fcrepo4async) needs aiohttp:
+    #   pip install fcrepo4[async]
+    extras_require={
+        'async': ['aiohttp'],
+    },
+
     # If there are data files included in your packages that need to be
     # installed, specify them here.  If using Python 2.6 or less, then these
     # have to be included in MANIFEST.in as well.
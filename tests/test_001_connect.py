@@ -1,11 +1,11 @@
 import unittest
-import fcrepo4
+import fcrepo4, fcrepotest
 
 class TestConnect(unittest.TestCase):
         
     def test_connect(self):
         """Connect to repository"""
-        repo = fcrepo4.Repository()
+        repo = fcrepo4.Repository(config=fcrepotest.config())
         repo.set_user('fedoraAdmin')
         self.assertIsNotNone(repo)
         res = repo.get(repo.path2uri('/'))
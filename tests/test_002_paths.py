@@ -1,11 +1,11 @@
 import unittest
-import fcrepo4
+import fcrepo4, fcrepotest
 
 class TestPaths(unittest.TestCase):
         
     def test_paths(self):
         """Path-to-uri and uri-to-path conversions"""
-        repo = fcrepo4.Repository()
+        repo = fcrepo4.Repository(config=fcrepotest.config())
         self.assertIsNotNone(repo)
         path = 'this/is/a/made/up/path'
         uri = repo.path2uri(path)
@@ -45,12 +45,61 @@ class TestGet(fcrepotest.FCRepoContainerTest):
             self.assertEqual(md2[dcfield], MDATA2[dcfield])
 
 
+    def test_omit_containment(self):
+        """Get a container's metadata without its children"""
+        self.container.add_container(self.repo.dc_rdf(MDATA2), slug=SLUG)
+        full = self.repo.get(self.container.uri)
+        self.assertEqual(len(list(full.children())), 1)
+
+        c = self.repo.get(self.container.uri, omit=fcrepo4.LDP_PREFER_CONTAINMENT)
+        self.assertEqual(len(list(c.children())), 0)
+        self.assertEqual(c.dc()['title'], MDATA1['title'])
+
+        c.rdf_read(omit=[ fcrepo4.LDP_PREFER_CONTAINMENT, fcrepo4.FC4_SERVER_MANAGED ])
+        self.assertIsNone(c.rdf_get(fcrepo4.FC4_LAST_MODIFIED))
+        self.assertEqual(c.dc()['title'], MDATA1['title'])
+
+    def test_rdf_formats(self):
+        """Get and update a container in each RDF format"""
+        c1 = self.container.add_container(self.repo.dc_rdf(MDATA2), slug=SLUG)
+        for fmt, ( mime, parser ) in fcrepo4.RDF_FORMATS.items():
+            self.repo.rdf_format = fmt
+            self.repo.rdf_mime = mime
+            c2 = self.repo.get(c1.uri)
+            self.assertEqual(fcrepo4._media_type(c2.response), mime)
+            self.assertEqual(c2.dc()['title'], MDATA2['title'])
+            c2.rdf_replace(fcrepo4.DC['description'], fcrepo4.Literal(fmt))
+            c2.rdf_write()
+            self.assertEqual(self.repo.get(c1.uri).dc()['description'], fmt)
+
+    def test_ntriples(self):
+        """Round-trip a container's RDF through the N-Triples reader and writer"""
+        c = self.repo.get(self.container.uri)
+        nt = fcrepo4.serialize_ntriples(c.rdf)
+        g = fcrepo4.parse_ntriples(nt)
+        self.assertEqual(len(g), len(c.rdf))
+        self.assertEqual(set(g), set(c.rdf))
+
     def test_missing(self):
         """Get a path which doesn't exist"""
         missing = self.repo.path2uri(PATH + '/' + SLUG + "_missing")
         r = self.repo.get(missing)
         self.assertIsNone(r)
 
+    def test_head(self):
+        """Check whether paths exist without fetching them"""
+        self.container.add_container(self.repo.dc_rdf(MDATA2), slug=SLUG)
+        c1path = self.repo.path2uri(PATH + '/' + SLUG)
+        missing = self.repo.path2uri(PATH + '/' + SLUG + "_missing")
+        self.assertTrue(self.repo.exists(c1path))
+        self.assertFalse(self.repo.exists(missing))
+        h = self.repo.head(c1path)
+        self.assertIsNotNone(h)
+        self.assertIn('ETag', h.response.headers)
+        self.assertIsNone(self.repo.head(missing))
+        self.repo.delete(c1path)
+        self.assertFalse(self.repo.exists(c1path))
+
     def test_repo_mismatch(self):
         """Get a malformed path"""
         badurl = self.repo.uri + 'thisismalformed/'
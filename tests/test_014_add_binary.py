@@ -1,7 +1,7 @@
 import unittest
 import fcrepo4, fcrepotest
 import logging, requests
-import filecmp
+import filecmp, hashlib, os, tempfile
 
 
 MDATA1 = {
@@ -26,7 +26,6 @@ MIME_TYPE = 'image/jpeg'
 URL_BINARY = 'http://apod.nasa.gov/apod/image/1605/Trumpler14c_ward.jpg'
 URL_BASENAME = URL_BINARY.split('/')[-1]
 
-OUTFILE = 'tests/bird2.jpg'
 
 class TestPutBinary(fcrepotest.FCRepoContainerTest):
 
@@ -104,6 +103,70 @@ class TestPutBinary(fcrepotest.FCRepoContainerTest):
         b2 = self.repo.get(uri)
         self.assertIsNotNone(b2)
 
+    def test_upload_stats(self):
+        """Uploads report their throughput"""
+        cpath = self.repo.path2uri(PATH)
+        c = self.repo.get(cpath)
+        b = c.add_binary(FILE, path=FILE)
+        with open(FILE, 'rb') as fh:
+            original = fh.read()
+        self.assertEqual(b.upload_stats.bytes, len(original))
+        self.assertTrue(b.upload_stats.seconds >= 0)
+        b2 = c.add_binary(original, slug='from_bytes.jpg', mime=MIME_TYPE)
+        self.assertEqual(b2.upload_stats.bytes, len(original))
+        self.assertEqual(self.repo.get(b2.uri).data(), original)
+
+    def test_checksums(self):
+        """Checksums are computed during the upload and verified"""
+        cpath = self.repo.path2uri(PATH)
+        c = self.repo.get(cpath)
+        with open(FILE, 'rb') as fh:
+            original = fh.read()
+        sha1 = hashlib.sha1(original).hexdigest()
+        b = c.add_binary(FILE, path=FILE, checksums=[ 'sha1', 'md5' ], verify=True)
+        self.assertEqual(b.checksums['sha1'], sha1)
+        self.assertEqual(b.checksums['md5'], hashlib.md5(original).hexdigest())
+        self.assertEqual(b.message_digests()['sha1'], sha1)
+
+    def test_digest_header(self):
+        """Fedora rejects an upload whose Digest header doesn't match"""
+        cpath = self.repo.path2uri(PATH)
+        c = self.repo.get(cpath)
+        bad = lambda: c.add_binary(FILE, slug='bad_digest.jpg', digest={ 'sha1': '0' * 40 })
+        self.assertRaises(fcrepo4.ResourceError, bad)
+
+    def test_download_binary(self):
+        """Stream a binary to a file"""
+        cpath = self.repo.path2uri(PATH)
+        c = self.repo.get(cpath)
+        b = c.add_binary(FILE, path=FILE)
+        b2 = self.repo.get(b.uri, stream=True)
+        self.assertTrue(b2.is_binary())
+        fd, outfile = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        try:
+            n = b2.download_to(outfile)
+            self.assertTrue(filecmp.cmp(FILE, outfile, shallow=False))
+        finally:
+            os.remove(outfile)
+        with open(FILE, 'rb') as fh:
+            original = fh.read()
+        self.assertEqual(n, len(original))
+        self.assertEqual(b2.data(), original)
+        self.assertEqual(b''.join(b2.iter_bytes(1000)), original)
+
+    def test_read_range(self):
+        """Read part of a binary with a Range request"""
+        cpath = self.repo.path2uri(PATH)
+        c = self.repo.get(cpath)
+        b = c.add_binary(FILE, path=FILE)
+        with open(FILE, 'rb') as fh:
+            original = fh.read()
+        b2 = self.repo.get(b.uri, stream=True)
+        self.assertEqual(b2.read_range(100, 199), original[100:200])
+        self.assertEqual(b2.read_range(len(original) - 10), original[-10:])
+        b2.close()
+
                                 
 if __name__ == '__main__':
     unittest.main()
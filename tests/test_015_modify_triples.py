@@ -123,6 +123,50 @@ class TestModifyTriples(fcrepotest.FCRepoContainerTest):
         members = r2.rdf_get_all(PCDM['hasMember'])
         self.assertFalse(members)
             
+    def test_patch_triples(self):
+        """Modify the RDF of a container with a SPARQL Update PATCH"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+
+        resource = c.add_container(self.repo.dc_rdf(MDATA1), path="resource")
+        self.assertIsNotNone(resource)
+
+        uris = [ ('http://fake.it/things/' + s) for s in [ 'one', 'two', 'three' ] ]
+        for uri in uris:
+            resource.rdf_add(PCDM['hasMember'], URIRef(uri))
+        for field, value in MDATA2.items():
+            resource.rdf_replace(DC[field], Literal(value))
+        resource.rdf_remove(DC['description'])
+        resource.rdf_add(DC['description'], Literal('Patched description'))
+
+        self.assertTrue(resource.rdf_write(method='PATCH'))
+        self.assertFalse(resource.changes)
+
+        r2 = self.repo.get(resource.uri)
+        for field, value in MDATA2.items():
+            if field != 'description':
+                self.assertEqual(str(r2.rdf_get(DC[field])), value)
+        self.assertEqual([ str(d) for d in r2.rdf_get_all(DC['description']) ], [ 'Patched description' ])
+        members = [ str(u) for u in r2.rdf_get_all(PCDM['hasMember']) ]
+        for uri in uris:
+            self.assertTrue(uri in members)
+
+    def test_compact_store(self):
+        """Read and modify RDF with the compact triple store"""
+        self.repo.rdf_store = 'compact'
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.assertIsInstance(c.rdf, fcrepo4.TripleStore)
+        self.assertEqual(c.dc()['title'], CMDATA['title'])
+
+        resource = c.add_container(self.repo.dc_rdf(MDATA1), path="resource")
+        for field, value in MDATA2.items():
+            resource.rdf_replace(DC[field], Literal(value))
+        self.assertTrue(resource.rdf_write())
+        self.assertIsInstance(resource.rdf, fcrepo4.TripleStore)
+
+        r2 = self.repo.get(resource.uri)
+        self.assertEqual(r2.dc(), MDATA2)
+        self.assertEqual(len(r2.rdf.graph()), len(r2.rdf))
+
                                 
 if __name__ == '__main__':
     unittest.main()
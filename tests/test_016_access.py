@@ -82,6 +82,19 @@ class TestACLs(fcrepotest.FCRepoContainerTest):
         acls = acl2.acls()
         self.logger.info(acls)
 
+    def test_acls(self):
+        """Read all of an ACL's authorizations"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        resource = c.add_container(self.repo.dc_rdf(MDATA1), path="resource")
+        uri = resource.uri
+        acl = self.repo.add_acl(c.uri)
+        acl.grant(USER_A, fcrepo4.READ,  uri)
+        acl.grant(USER_B, fcrepo4.READ,  uri)
+        acl.grant(USER_B, fcrepo4.WRITE, uri)
+        acls = self.repo.get(acl.uri).acls()
+        self.assertEqual(acls[uri][USER_A], [ fcrepo4.READ ])
+        self.assertEqual(sorted(acls[uri][USER_B]), [ fcrepo4.READ, fcrepo4.WRITE ])
+
     def dump_rdf(self, resource, filename):
         resource.rdf_read()
         with open(filename, 'wb') as df:
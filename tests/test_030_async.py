@@ -0,0 +1,105 @@
+import unittest
+import fcrepo4, fcrepo4async, fcrepotest
+import logging, asyncio
+import aiohttp
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for the asyncio client',
+    'creator': 'a test script'
+    }
+
+CPATH = 'test_030'
+FILE = 'tests/bird.jpg'
+N = 20
+
+
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.repo = fcrepo4async.AsyncRepository(config=fcrepotest.config(), concurrency=4)
+        self.repo.set_user('fedoraAdmin')
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_add_and_get(self):
+        """Add containers concurrently and read them back"""
+        async def work():
+            async with self.repo as repo:
+                root = await repo.get(repo.path2uri('/'))
+                c = await root.add_container(repo.dc_rdf(CMDATA), path=CPATH, force=True)
+                self.assertIsNotNone(c)
+                titles = [ 'Resource {}'.format(i) for i in range(N) ]
+                added = await asyncio.gather(*[ c.add_container(repo.dc_rdf({ 'title': t })) for t in titles ])
+                got = await asyncio.gather(*[ repo.get(r.uri) for r in added ])
+                self.assertEqual(sorted([ r.dc()['title'] for r in got ]), sorted(titles))
+                await repo.delete(c.uri)
+                await repo.obliterate(c.uri)
+        self.run_async(work())
+
+    def test_binary_and_acl(self):
+        """Upload a binary and grant access with an AsyncAcl"""
+        async def work():
+            async with self.repo as repo:
+                root = await repo.get(repo.path2uri('/'))
+                c = await root.add_container(repo.dc_rdf(CMDATA), path=CPATH, force=True)
+                b = await c.add_binary(FILE, slug='bird.jpg')
+                self.assertIsNotNone(b)
+                acl = await repo.add_acl(c.uri)
+                self.assertTrue(type(acl) == fcrepo4async.AsyncAcl)
+                await acl.grant('alice', fcrepo4.READ, c.uri)
+                acl2 = await repo.get(acl.uri)
+                acls = await acl2.acls()
+                self.assertEqual(acls[c.uri]['alice'], [ fcrepo4.READ ])
+                await repo.delete(c.uri)
+                await repo.obliterate(c.uri)
+        self.run_async(work())
+
+    def test_rdf_write(self):
+        """rdf_write sends changes with PUT or PATCH and clears them"""
+        async def work():
+            async with self.repo as repo:
+                root = await repo.get(repo.path2uri('/'))
+                c = await root.add_container(repo.dc_rdf(CMDATA), path=CPATH, force=True)
+                for method in [ 'PUT', 'PATCH' ]:
+                    r = await repo.get(c.uri)
+                    r.rdf_replace(DC['title'], Literal('Written with {}'.format(method)))
+                    await r.rdf_write(method)
+                    self.assertEqual(r.changes, [])
+                    r2 = await repo.get(c.uri)
+                    self.assertEqual(r2.dc()['title'], 'Written with {}'.format(method))
+                await repo.delete(c.uri)
+                await repo.obliterate(c.uri)
+        self.run_async(work())
+
+    def test_binary_from_missing_url(self):
+        """A URL source which can't be fetched raises before anything is
+        uploaded"""
+        async def work():
+            async with self.repo as repo:
+                root = await repo.get(repo.path2uri('/'))
+                c = await root.add_container(repo.dc_rdf(CMDATA), path=CPATH, force=True)
+                source = repo.path2uri(CPATH + '/nothing.jpg')
+                with self.assertRaises(aiohttp.ClientResponseError):
+                    await c.add_binary(source, path='copy.jpg')
+                self.assertFalse(await repo.exists(c.uri + '/copy.jpg'))
+                await repo.delete(c.uri)
+                await repo.obliterate(c.uri)
+        self.run_async(work())
+
+    def test_unsupported(self):
+        """Sync methods without an async version don't exist"""
+        resource = fcrepo4async.AsyncResource(self.repo, self.repo.path2uri(CPATH))
+        for name in [ 'transaction', 'walk', 'versions', 'purge', 'export' ]:
+            self.assertFalse(hasattr(self.repo, name), name)
+        for name in [ 'iter_bytes', 'read_range', 'stream', 'fixity', 'walk' ]:
+            self.assertFalse(hasattr(resource, name), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+
+
+CPATH = 'test_031'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for bulk ingest',
+    'creator': 'a test script'
+    }
+
+N = 25
+WORKERS = 4
+
+
+class TestBulk(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestBulk, self).setUp(CPATH, CMDATA)
+
+    def tearDown(self):
+        super(TestBulk, self).tearDown(CPATH)
+
+    def test_bulk_add(self):
+        """Add a list of records concurrently"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        records = [ { 'title': 'Record {}'.format(i), 'creator': 'test_031_bulk.py' } for i in range(N) ]
+        seen = []
+        results = c.bulk_add_containers(records, workers=WORKERS, progress=lambda n, r: seen.append(n))
+        self.assertEqual(len(results), N)
+        self.assertEqual(seen, list(range(1, N + 1)))
+        for i, result in enumerate(results):
+            self.assertEqual(result.index, i)
+            self.assertIsNone(result.error)
+            r = self.repo.get(result.resource.uri)
+            self.assertEqual(r.dc()['title'], records[i]['title'])
+
+    def test_bulk_errors(self):
+        """A failed record doesn't stop the rest"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        records = [
+            { 'title': 'One', 'id': 'one' },
+            { 'title': 'Two', 'id': 'two' },
+            { 'title': 'One again', 'id': 'one' }
+            ]
+        results = c.bulk_add_containers(records, workers=1, path='id')
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertTrue(isinstance(results[2].error, fcrepo4.ConflictError))
+
+
+if __name__ == '__main__':
+    unittest.main()
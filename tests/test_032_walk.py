@@ -0,0 +1,88 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+
+
+CPATH = 'test_032'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for walking trees',
+    'creator': 'a test script'
+    }
+
+WIDTH = 3
+DEPTH = 2
+
+
+class TestWalk(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestWalk, self).setUp(CPATH, CMDATA)
+        self.uris = set()
+        level = [ self.container ]
+        for d in range(DEPTH):
+            next_level = []
+            for c in level:
+                for i in range(WIDTH):
+                    r = c.add_container(self.repo.dc_rdf({ 'title': 'Level {} {}'.format(d, i) }))
+                    self.uris.add(r.uri)
+                    next_level.append(r)
+            level = next_level
+
+    def tearDown(self):
+        super(TestWalk, self).tearDown(CPATH)
+
+    def test_walk(self):
+        """Walk a tree and find all of its resources"""
+        uri = self.repo.path2uri(CPATH)
+        found = [ r.uri for r in self.repo.walk(uri, workers=4) ]
+        self.assertEqual(found[0], uri)
+        self.assertEqual(set(found[1:]), self.uris)
+
+    def test_parents_first(self):
+        """Each resource is yielded before its children"""
+        uri = self.repo.path2uri(CPATH)
+        found = set()
+        for r in self.repo.walk(uri, workers=4):
+            found.add(r.uri)
+            for c in r.children():
+                self.assertFalse(str(c) in found)
+        self.assertEqual(len(found), len(self.uris) + 1)
+
+    def test_breadth_first(self):
+        """With one worker, resources are yielded level by level, even when
+        the queue of uris overflows into a file"""
+        uri = self.repo.path2uri(CPATH)
+        size = fcrepo4.FRONTIER_SIZE
+        fcrepo4.FRONTIER_SIZE = 2
+        depths = { uri: 0 }
+        order = []
+        try:
+            for r in self.repo.walk(uri, workers=1):
+                order.append(depths[r.uri])
+                for c in r.children():
+                    depths[str(c)] = depths[r.uri] + 1
+        finally:
+            fcrepo4.FRONTIER_SIZE = size
+        self.assertEqual(len(order), len(self.uris) + 1)
+        self.assertEqual(order, sorted(order))
+
+    def test_max_depth(self):
+        """Walk only the first level of a tree"""
+        uri = self.repo.path2uri(CPATH)
+        found = [ r.uri for r in self.repo.walk(uri, max_depth=1) ]
+        self.assertEqual(len(found), WIDTH + 1)
+
+    def test_filter(self):
+        """Skip a resource and its children with a filter"""
+        uri = self.repo.path2uri(CPATH)
+        c = self.repo.get(uri)
+        skip = str(list(c.children())[0])
+        found = [ r.uri for r in c.walk(filter=lambda r: r.uri != skip) ]
+        self.assertEqual(len(found), len(self.uris) + 1 - (WIDTH + 1))
+        self.assertFalse(skip in found)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CPATH = 'test_033'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for the resource cache',
+    'creator': 'a test script'
+    }
+
+MDATA = {
+    'title': 'Cached resource',
+    'creator': 'test_033_cache.py'
+    }
+
+
+class TestCache(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestCache, self).setUp(CPATH, CMDATA)
+        self.repo.cache = fcrepo4.ResourceCache(100)
+
+    def tearDown(self):
+        super(TestCache, self).tearDown(CPATH)
+
+    def test_revalidate(self):
+        """A second get of an unchanged resource gets a 304 and reuses the
+        cached RDF"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        r1 = self.repo.get(r.uri)
+        statuses = []
+        api = self.repo.api
+
+        def recording_api(*args, **kwargs):
+            response = api(*args, **kwargs)
+            statuses.append(response.status_code)
+            return response
+
+        self.repo.api = recording_api
+        try:
+            r2 = self.repo.get(r.uri)
+        finally:
+            del self.repo.api
+        self.assertEqual(statuses, [ 304 ])
+        self.assertEqual(r2.dc(), r1.dc())
+        self.assertIsNot(r2.rdf, r1.rdf)
+
+    def test_copy_on_write(self):
+        """Changing a resource from the cache doesn't change the cached RDF"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        r1 = self.repo.get(r.uri)
+        r2 = self.repo.get(r.uri)
+        r2.rdf_replace(DC['title'], Literal('New title'))
+        r2.rdf_write('PUT')
+        self.assertEqual(r1.dc()['title'], MDATA['title'])
+        self.assertEqual(r2.dc()['title'], 'New title')
+
+    def test_direct_changes(self):
+        """Changing a cached resource's rdf directly doesn't change what
+        later gets return"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        r1 = self.repo.get(r.uri)
+        r1.rdf.add(( r1.subject, DC['subject'], Literal('Not written') ))
+        r2 = self.repo.get(r.uri)
+        r2.rdf.add(( r2.subject, DC['subject'], Literal('Not written either') ))
+        r3 = self.repo.get(r.uri)
+        self.assertEqual(r3.rdf_get_all(DC['subject']), [])
+
+    def test_invalidate_slash(self):
+        """A resource fetched with a trailing slash is dropped from the
+        cache when it's written"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        self.repo.get(r.uri + '/')
+        self.assertEqual(len(self.repo.cache), 1)
+        r.rdf_replace(DC['title'], Literal('New title'))
+        r.rdf_write()
+        self.assertEqual(len(self.repo.cache), 0)
+
+    def test_invalidate(self):
+        """Writing to a resource drops it from the cache"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        r1 = self.repo.get(r.uri)
+        r1.rdf_replace(DC['title'], Literal('New title'))
+        r1.rdf_write()
+        r2 = self.repo.get(r.uri)
+        self.assertEqual(r2.dc()['title'], 'New title')
+        self.repo.delete(r.uri)
+        self.assertRaises(fcrepo4.ResourceError, lambda: self.repo.get(r.uri))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CPATH = 'test_034'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for transactions',
+    'creator': 'a test script'
+    }
+
+
+class TestTransaction(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestTransaction, self).setUp(CPATH, CMDATA)
+
+    def tearDown(self):
+        super(TestTransaction, self).tearDown(CPATH)
+
+    def test_commit(self):
+        """Changes made in a transaction are there after commit"""
+        uri = self.repo.path2uri(CPATH)
+        with self.repo.transaction() as tx:
+            c = self.repo.get(uri)
+            self.assertTrue(c.uri.startswith(tx.uri))
+            r = c.add_container(self.repo.dc_rdf({ 'title': 'In a transaction' }), path='committed')
+            self.assertEqual(self.repo.uri2path(r.uri), CPATH + '/committed')
+        self.assertIsNone(self.repo.tx)
+        r2 = self.repo.get(self.repo.canonical_uri(r.uri))
+        self.assertIsNotNone(r2)
+        self.assertEqual(r2.dc()['title'], 'In a transaction')
+
+    def test_rollback(self):
+        """Changes made in a transaction are discarded on an exception"""
+        uri = self.repo.path2uri(CPATH)
+        def fail():
+            with self.repo.transaction():
+                c = self.repo.get(uri)
+                c.add_container(self.repo.dc_rdf({ 'title': 'Rolled back' }), path='rolledback')
+                raise ValueError("roll back")
+        self.assertRaises(ValueError, fail)
+        self.assertIsNone(self.repo.get(self.repo.path2uri(CPATH + '/rolledback')))
+
+    def test_failed_commit(self):
+        """A transaction whose commit fails stays open and can be rolled back"""
+        if not fcrepotest.STANDIN:
+            self.skipTest("needs the stand-in server to make the commit fail")
+        tx = self.repo.transaction()
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        c.add_container(self.repo.dc_rdf({ 'title': 'Not committed' }), path='uncommitted')
+        fcrepotest.STANDIN.error_rate = 1.0
+        try:
+            self.assertRaises(fcrepo4.ResourceError, tx.commit)
+        finally:
+            fcrepotest.STANDIN.error_rate = 0.0
+        self.assertIs(self.repo.tx, tx)
+        tx.rollback()
+        self.assertIsNone(self.repo.tx)
+        self.assertIsNone(self.repo.get(self.repo.path2uri(CPATH + '/uncommitted')))
+
+    def test_failed_rollback(self):
+        """If the rollback after an exception fails, the exception is the
+        one which was raised in the block"""
+        if not fcrepotest.STANDIN:
+            self.skipTest("needs the stand-in server to make the rollback fail")
+        def fail():
+            with self.repo.transaction():
+                fcrepotest.STANDIN.error_rate = 1.0
+                raise ValueError("roll back")
+        try:
+            self.assertRaises(ValueError, fail)
+        finally:
+            fcrepotest.STANDIN.error_rate = 0.0
+        self.assertIsNone(self.repo.tx)
+
+    def test_failed_commit_and_rollback(self):
+        """If the commit at the end of a with block and the rollback both
+        fail, the transaction is detached and another can be started"""
+        if not fcrepotest.STANDIN:
+            self.skipTest("needs the stand-in server to make the commit fail")
+        opened = []
+        def fail():
+            with self.repo.transaction() as tx:
+                opened.append(tx)
+                fcrepotest.STANDIN.error_rate = 1.0
+        try:
+            self.assertRaises(fcrepo4.ResourceError, fail)
+        finally:
+            fcrepotest.STANDIN.error_rate = 0.0
+        self.assertIsNone(self.repo.tx)
+        self.assertTrue(opened[0].stopped.is_set())
+        tx = self.repo.transaction()
+        tx.rollback()
+
+    def test_no_nesting(self):
+        """Can't start a transaction inside another one"""
+        tx = self.repo.transaction()
+        self.assertRaises(fcrepo4.Error, self.repo.transaction)
+        tx.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CPATH = 'test_035'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for request metrics',
+    'creator': 'a test script'
+    }
+
+MDATA = {
+    'title': 'Measured resource',
+    'creator': 'test_035_metrics.py'
+    }
+
+
+class TestMetrics(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestMetrics, self).setUp(CPATH, CMDATA)
+        self.repo.metrics = fcrepo4.Metrics()
+
+    def tearDown(self):
+        self.repo.metrics = None
+        super(TestMetrics, self).tearDown(CPATH)
+
+    def requests(self, operation):
+        return [ r for r in self.repo.metrics.snapshot()['requests'] if r['operation'] == operation ]
+
+    def test_operations(self):
+        """Requests are labelled with the operation which made them"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        r.rdf_replace(DC['title'], Literal('New title'))
+        r.rdf_write()
+        gets = self.requests('get')
+        self.assertEqual(sum(g['count'] for g in gets if g['method'] == 'GET'), 1)
+        self.assertTrue(all(g['status'] == '2xx' for g in gets))
+        self.assertTrue(sum(g['bytes_received'] for g in gets) > 0)
+        adds = self.requests('add_container')
+        self.assertTrue(any(a['method'] == 'PUT' and a['bytes_sent'] > 0 for a in adds))
+        self.assertTrue(self.requests('rdf_write'))
+        operations = { o['operation']: o for o in self.repo.metrics.snapshot()['operations'] }
+        self.assertEqual(operations['add_container']['count'], 1)
+        self.assertEqual(operations['add_container']['outcome'], 'ok')
+        self.assertEqual(operations['add_container']['buckets']['+Inf'], 1)
+
+    def test_errors(self):
+        """Failed operations and 4xx responses are counted"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf(MDATA), path='resource')
+        self.repo.delete(r.uri)
+        self.repo.metrics.reset()
+        self.assertRaises(fcrepo4.ResourceError, lambda: self.repo.get(r.uri))
+        gets = self.requests('get')
+        self.assertEqual(gets[0]['status'], '4xx')
+        operations = self.repo.metrics.snapshot()['operations']
+        self.assertEqual([ ( o['operation'], o['outcome'] ) for o in operations ], [ ( 'get', 'error' ) ])
+
+    def test_prometheus(self):
+        """The Prometheus export has a histogram for each label set"""
+        self.repo.get(self.repo.path2uri(CPATH))
+        text = self.repo.metrics.prometheus()
+        self.assertIn('# TYPE fcrepo4_request_duration_seconds histogram', text)
+        self.assertIn('fcrepo4_request_duration_seconds_count{operation="get",method="GET",status="2xx"} 1', text)
+        self.assertIn('fcrepo4_operation_duration_seconds_bucket{operation="get",outcome="ok",le="+Inf"} 1', text)
+
+    def test_disabled(self):
+        """Without a Metrics, nothing is recorded"""
+        metrics = self.repo.metrics
+        self.repo.metrics = None
+        self.repo.get(self.repo.path2uri(CPATH))
+        self.assertEqual(metrics.snapshot(), { 'requests': [], 'operations': [] })
+
+
+if __name__ == '__main__':
+    unittest.main()
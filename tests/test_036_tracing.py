@@ -0,0 +1,64 @@
+import unittest
+import fcrepo4, fcrepotest
+import io, json, logging
+
+
+CPATH = 'test_036'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for tracing',
+    'creator': 'a test script'
+    }
+
+
+class TestTracing(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestTracing, self).setUp(CPATH, CMDATA)
+        self.repo.tracer = fcrepo4.Tracer(fcrepo4.MemoryCollector())
+
+    def tearDown(self):
+        self.repo.tracer = None
+        super(TestTracing, self).tearDown(CPATH)
+
+    def test_grant(self):
+        """The requests made by Acl.grant are nested in its span"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        acl = self.repo.add_acl(c.uri)
+        self.repo.tracer.collector.clear()
+        acl.grant('alice', fcrepo4.READ, c.uri)
+        traces = self.repo.tracer.collector.traces()
+        self.assertEqual([ t.name for t in traces ], [ 'Acl.grant' ])
+        grant = traces[0]
+        self.assertEqual(grant.attributes['uri'], acl.uri)
+        self.assertEqual([ s.name for s in grant.children ], [ 'Repository.get', 'Resource.rdf_write', 'Auth.put' ])
+        requests = [ s for _, s in grant.walk() if not s.children ]
+        self.assertTrue(all(s.name in fcrepo4.METHODS for s in requests))
+        self.assertEqual(grant.requests, len(requests))
+        self.assertEqual(grant.bytes_sent, sum(s.bytes_sent for s in requests))
+        self.assertTrue(all(s.seconds <= grant.seconds for _, s in grant.walk()))
+
+    def test_jsonl(self):
+        """A JsonlCollector writes a line for each span, linked by parent_id"""
+        out = io.StringIO()
+        self.repo.tracer = fcrepo4.Tracer(fcrepo4.JsonlCollector(out))
+        with self.repo.tracer.span('batch'):
+            self.repo.get(self.repo.path2uri(CPATH))
+        spans = [ json.loads(l) for l in out.getvalue().splitlines() ]
+        self.assertEqual([ s['name'] for s in spans ], [ 'GET', 'Repository.get', 'batch' ])
+        self.assertEqual(spans[0]['parent_id'], spans[1]['span_id'])
+        self.assertEqual(spans[1]['parent_id'], spans[2]['span_id'])
+        self.assertEqual(spans[0]['attributes']['status'], 200)
+        self.assertEqual(set(s['trace_id'] for s in spans), set([ spans[2]['span_id'] ]))
+
+    def test_profile(self):
+        """A span chosen by name is run under cProfile"""
+        self.repo.tracer = fcrepo4.Tracer(profile='Repository.get')
+        self.repo.get(self.repo.path2uri(CPATH))
+        self.assertEqual(len(self.repo.tracer.profiles), 1)
+        self.assertIsNotNone(self.repo.tracer.profiles[0].profile)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging
+
+
+CPATH = 'test_037'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for purge',
+    'creator': 'a test script'
+    }
+
+
+class TestPurge(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestPurge, self).setUp(CPATH, CMDATA)
+
+    def tearDown(self):
+        super(TestPurge, self).tearDown(CPATH)
+
+    def make_tree(self, parent, depth, width):
+        """Adds width children to parent, each with a subtree of depth - 1
+        levels, and returns the number of resources added"""
+        n = 0
+        for i in range(width):
+            c = parent.add_container(self.repo.dc_rdf({ 'title': 'Node {}'.format(i) }), path='n{}'.format(i))
+            n += 1
+            if depth > 1:
+                n += self.make_tree(c, depth - 1, width)
+        return n
+
+    def test_purge(self):
+        """Everything in the subtree is deleted and obliterated"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        top = c.add_container(self.repo.dc_rdf({ 'title': 'Top' }), path='top')
+        n = self.make_tree(top, 3, 3) + 1
+        report = self.repo.purge(top.uri, workers=4)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.deleted, n)
+        self.assertEqual(report.obliterated, n)
+        self.assertIsNone(self.repo.get(top.uri))
+        self.assertIsNone(self.repo.get(top.uri + '/n0/n1'))
+        again = c.add_container(self.repo.dc_rdf({ 'title': 'Top' }), path='top')
+        self.assertIsNotNone(again)
+
+    def test_spilled_queue(self):
+        """A purge whose queue of uris overflows into a file still finds
+        the whole subtree"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        top = c.add_container(self.repo.dc_rdf({ 'title': 'Top' }), path='top')
+        n = self.make_tree(top, 2, 4) + 1
+        size = fcrepo4.FRONTIER_SIZE
+        fcrepo4.FRONTIER_SIZE = 2
+        try:
+            report = self.repo.purge(top.uri, workers=2)
+        finally:
+            fcrepo4.FRONTIER_SIZE = size
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.deleted, n)
+        self.assertIsNone(self.repo.get(top.uri))
+
+    def test_tombstone(self):
+        """A tombstone left by a delete is obliterated"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        r = c.add_container(self.repo.dc_rdf({ 'title': 'Deleted' }), path='deleted')
+        self.repo.delete(r.uri)
+        report = self.repo.purge(r.uri)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(( report.deleted, report.obliterated ), ( 0, 1 ))
+        self.assertFalse(self.repo.exists(r.uri))
+        self.assertIsNone(self.repo.get(r.uri))
+
+    def test_missing(self):
+        """Purging a path with nothing at it does nothing"""
+        report = self.repo.purge(self.repo.path2uri(CPATH + '/nothing'))
+        self.assertEqual(report, fcrepo4.PurgeReport(0, 0, 0, 0, [], report.seconds))
+
+
+if __name__ == '__main__':
+    unittest.main()
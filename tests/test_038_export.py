@@ -0,0 +1,119 @@
+import unittest
+import fcrepo4, fcrepotest
+import io, json, logging
+from rdflib import URIRef
+from rdflib.namespace import DC
+
+
+CPATH = 'test_038'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for export and import',
+    'creator': 'a test script'
+    }
+
+
+class TestExport(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestExport, self).setUp(CPATH, CMDATA)
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.source = c.add_container(self.repo.dc_rdf({ 'title': 'Source "tree"' }), path='source')
+        for i in range(3):
+            child = self.source.add_container(self.repo.dc_rdf({ 'title': 'Child {}'.format(i) }), path='c{}'.format(i))
+            for j in range(2):
+                g = self.repo.dc_rdf({ 'title': 'Grandchild {} {}'.format(i, j) })
+                g.add(( URIRef(''), DC['relation'], URIRef(child.uri) ))
+                child.add_container(g, path='g{}'.format(j))
+
+    def tearDown(self):
+        super(TestExport, self).tearDown(CPATH)
+
+    def flat_export(self, n):
+        """An NDJSON export of a container with n children and no
+        grandchildren"""
+        source = 'http://example.org/flat'
+        title = fcrepo4._nt_term(DC['title'])
+        lines = [ json.dumps({ 'uri': source, 'path': '', 'triples': [ [ '<{}>'.format(source), title, '"Flat"' ] ] }) ]
+        for i in range(n):
+            uri = '{}/c{}'.format(source, i)
+            lines.append(json.dumps({ 'uri': uri, 'path': 'c{}'.format(i), 'triples': [ [ '<{}>'.format(uri), title, '"Child {}"'.format(i) ] ] }))
+        return lines
+
+    def round_trip(self, format):
+        out = io.StringIO()
+        report = self.repo.export(self.source.uri, out, format=format, workers=4)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.resources, 10)
+        out.seek(0)
+        target = self.repo.path2uri(CPATH + '/' + format)
+        report = self.repo.import_(out, target, workers=4)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.created, 10)
+        self.assertEqual(self.repo.get(target).dc()['title'], 'Source "tree"')
+        g = self.repo.get(target + '/c2/g1')
+        self.assertEqual(g.dc()['title'], 'Grandchild 2 1')
+        self.assertEqual(g.rdf_get(DC['relation']), URIRef(target + '/c2'))
+        return out
+
+    def test_nquads(self):
+        """A subtree exported as N-Quads is imported at a new uri"""
+        out = self.round_trip('nquads')
+        quads = [ l for l in out.getvalue().splitlines() if not l.startswith('#') ]
+        self.assertTrue(all(l.endswith('> .') for l in quads))
+        self.assertFalse(any(fcrepo4.FC4_URL in l for l in quads))
+
+    def test_ndjson(self):
+        """A subtree exported as NDJSON is imported at a new uri"""
+        out = self.round_trip('ndjson')
+        records = [ json.loads(l) for l in out.getvalue().splitlines() ]
+        self.assertEqual(records[0]['path'], '')
+        self.assertEqual(sorted(r['path'] for r in records)[1:4], [ 'c0', 'c0/g0', 'c0/g1' ])
+
+    def test_orphans(self):
+        """Resources whose parent isn't imported are reported"""
+        out = io.StringIO()
+        self.repo.export(self.source.uri, out, format='ndjson')
+        lines = [ l for l in out.getvalue().splitlines() if json.loads(l)['path'] != 'c1' ]
+        target = self.repo.path2uri(CPATH + '/orphans')
+        report = self.repo.import_(io.StringIO('\n'.join(lines)), target)
+        self.assertEqual(report.created, 7)
+        self.assertEqual(sorted(path for path, e in report.errors), [ 'c1/g0', 'c1/g1' ])
+
+    def test_flat(self):
+        """Records waiting for their parent count towards the window, so a
+        wide export isn't read into memory while the top is created"""
+        lines = iter(self.flat_export(50))
+        read = [ 0 ]
+        buffered = []
+
+        class Stream(object):
+            def readline(self):
+                return next(self)
+            def __iter__(self):
+                return self
+            def __next__(self):
+                line = next(lines)
+                read[0] += 1
+                return line
+
+        added = [ 0 ]
+        add_container = self.repo.add_container
+        def counting_add(*args, **kwargs):
+            # records read and not yet created, including this one
+            buffered.append(read[0] - added[0])
+            try:
+                return add_container(*args, **kwargs)
+            finally:
+                added[0] += 1
+        self.repo.add_container = counting_add
+        report = self.repo.import_(Stream(), self.repo.path2uri(CPATH + '/flat'), workers=2)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.created, 51)
+        # the window is twice workers, plus the record which filled it
+        self.assertTrue(max(buffered) <= 2 * 2 + 1, buffered)
+
+
+if __name__ == '__main__':
+    unittest.main()
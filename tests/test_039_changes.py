@@ -0,0 +1,125 @@
+import unittest
+import fcrepo4, fcrepotest
+import datetime, logging, os, tempfile, time
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CPATH = 'test_039'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for the change crawler',
+    'creator': 'a test script'
+    }
+
+
+class TestChangedSince(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestChangedSince, self).setUp(CPATH, CMDATA)
+        fd, self.state = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.top = self.repo.get(self.repo.path2uri(CPATH))
+        self.a = self.top.add_container(self.repo.dc_rdf({ 'title': 'A' }), path='a')
+        self.b = self.a.add_container(self.repo.dc_rdf({ 'title': 'B' }), path='b')
+
+    def tearDown(self):
+        os.remove(self.state)
+        super(TestChangedSince, self).tearDown(CPATH)
+
+    def changes(self, **kwargs):
+        return sorted(( c.kind, self.repo.uri2path(c.uri) ) for c in self.repo.changed_since(self.top.uri, **kwargs))
+
+    def retitle(self, resource, title):
+        r = self.repo.get(resource.uri)
+        r.rdf_replace(DC['title'], Literal(title))
+        r.rdf_write()
+
+    def test_state(self):
+        """Changes between crawls are found using the state file"""
+        first = self.changes(state_file=self.state)
+        self.assertEqual([ kind for kind, _ in first ], [ fcrepo4.NEW ] * 3)
+        self.assertEqual(self.changes(state_file=self.state), [])
+        self.retitle(self.b, 'New B')
+        c = self.a.add_container(self.repo.dc_rdf({ 'title': 'C' }), path='c')
+        self.repo.delete(self.b.uri)
+        self.assertEqual(self.changes(state_file=self.state), [
+            ( fcrepo4.DELETED, CPATH + '/a/b' ),
+            ( fcrepo4.MODIFIED, CPATH + '/a' ),
+            ( fcrepo4.NEW, CPATH + '/a/c' )
+            ])
+        self.assertEqual(self.changes(state_file=self.state), [])
+
+    def test_spilled_queue(self):
+        """A crawl whose queue of uris overflows into a file finds the same
+        changes"""
+        self.a.add_container(self.repo.dc_rdf({ 'title': 'C' }), path='c')
+        self.a.add_container(self.repo.dc_rdf({ 'title': 'D' }), path='d')
+        size = fcrepo4.FRONTIER_SIZE
+        fcrepo4.FRONTIER_SIZE = 1
+        try:
+            self.assertEqual(len(self.changes(state_file=self.state, workers=1)), 5)
+            self.retitle(self.b, 'New B')
+            self.assertEqual(self.changes(state_file=self.state, workers=1), [ ( fcrepo4.MODIFIED, CPATH + '/a/b' ) ])
+        finally:
+            fcrepo4.FRONTIER_SIZE = size
+
+    def test_prune(self):
+        """With prune, only changed containers are crawled"""
+        self.changes(state_file=self.state)
+        self.retitle(self.b, 'New B')
+        self.assertEqual(self.changes(state_file=self.state, prune=True), [])
+        self.assertEqual(self.changes(state_file=self.state), [ ( fcrepo4.MODIFIED, CPATH + '/a/b' ) ])
+
+    def test_timestamp(self):
+        """Without a state file, resources modified after timestamp are yielded"""
+        since = datetime.datetime.now(datetime.timezone.utc)
+        time.sleep(0.01)
+        self.retitle(self.b, 'New B')
+        self.assertEqual(self.changes(timestamp=since), [ ( fcrepo4.MODIFIED, CPATH + '/a/b' ) ])
+
+    def test_shared_state(self):
+        """Crawling one subtree doesn't affect another with a similar name"""
+        one = self.top.add_container(self.repo.dc_rdf({ 'title': 'One' }), path='x_1')
+        other = self.top.add_container(self.repo.dc_rdf({ 'title': 'Other' }), path='xA1')
+        other.add_container(self.repo.dc_rdf({ 'title': 'Below' }), path='below')
+        crawl = lambda r: sorted(( c.kind, self.repo.uri2path(c.uri) ) for c in self.repo.changed_since(r.uri, state_file=self.state))
+        self.assertEqual(len(crawl(one)), 1)
+        self.assertEqual(len(crawl(other)), 2)
+        self.assertEqual(crawl(one), [])
+        self.assertEqual(crawl(other), [])
+
+    def test_on_error(self):
+        """With on_error, a failed request doesn't stop the crawl or make
+        resources look deleted"""
+        if not fcrepotest.STANDIN:
+            self.skipTest("needs the stand-in server to make requests fail")
+        self.changes(state_file=self.state)
+        errors = []
+        fcrepotest.STANDIN.error_rate = 1.0
+        try:
+            changes = self.changes(state_file=self.state, on_error=lambda uri, e: errors.append(uri))
+        finally:
+            fcrepotest.STANDIN.error_rate = 0.0
+        self.assertEqual(changes, [])
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(self.changes(state_file=self.state), [])
+
+    def test_metrics(self):
+        """A crawl's requests are counted under changed_since"""
+        self.repo.metrics = fcrepo4.Metrics()
+        try:
+            self.assertEqual(len(self.changes()), 3)
+            snapshot = self.repo.metrics.snapshot()
+        finally:
+            self.repo.metrics = None
+        gets = [ r for r in snapshot['requests'] if r['method'] == 'GET' ]
+        self.assertEqual([ g['operation'] for g in gets ], [ 'changed_since' ])
+        self.assertEqual(gets[0]['count'], 3)
+        operations = [ ( o['operation'], o['outcome'], o['count'] ) for o in snapshot['operations'] ]
+        self.assertEqual(operations, [ ( 'changed_since', 'ok', 1 ) ])
+
+
+if __name__ == '__main__':
+    unittest.main()
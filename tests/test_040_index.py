@@ -0,0 +1,130 @@
+import unittest
+import fcrepo4, fcrepotest
+import logging, sqlite3
+from rdflib import Literal, URIRef
+from rdflib.namespace import DC
+
+
+CPATH = 'test_040'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for the local index',
+    'creator': 'a test script'
+    }
+
+RECORDS = [
+    { 'title': 'Pigeon', 'creator': 'Alice', 'type': 'Bird' },
+    { 'title': 'Magpie', 'creator': 'Bob', 'type': 'Bird' },
+    { 'title': 'Wombat', 'creator': 'Alice', 'type': 'Marsupial' }
+    ]
+
+
+class TestIndex(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestIndex, self).setUp(CPATH, CMDATA)
+        self.repo.index = fcrepo4.Index()
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.resources = [ c.add_container(self.repo.dc_rdf(md)) for md in RECORDS ]
+
+    def tearDown(self):
+        self.repo.index.close()
+        self.repo.index = None
+        super(TestIndex, self).tearDown(CPATH)
+
+    def test_find(self):
+        """New containers can be found by their DC fields at once"""
+        uris = [ r.uri for r in self.resources ]
+        self.assertEqual(self.repo.index.find(creator='Alice'), sorted([ uris[0], uris[2] ]))
+        self.assertEqual(self.repo.index.find(creator='Alice', type='Bird'), [ uris[0] ])
+        self.assertEqual(self.repo.index.find(title='Emu'), [])
+        self.assertEqual(self.repo.index.search(DC['type'], 'Marsupial'), [ uris[2] ])
+        self.assertRaises(fcrepo4.Error, lambda: self.repo.index.find(colour='Black'))
+
+    def test_write(self):
+        """rdf_write updates the index, including extra values"""
+        r = self.repo.get(self.resources[1].uri)
+        r.rdf_replace(DC['title'], Literal('Currawong'))
+        r.rdf_add(DC['subject'], Literal('Black'))
+        r.rdf_add(DC['subject'], Literal('White'))
+        r.rdf_write()
+        self.assertEqual(self.repo.index.find(title='Magpie'), [])
+        self.assertEqual(self.repo.index.find(title='Currawong'), [ r.uri ])
+        self.assertEqual(self.repo.index.find(subject='White'), [ r.uri ])
+        self.assertEqual(self.repo.index.dc(r.uri)['creator'], 'Bob')
+
+    def test_stale_patch(self):
+        """A PATCH from an out of date copy indexes what Fedora has"""
+        uri = self.resources[1].uri
+        stale = self.repo.get(uri)
+        r = self.repo.get(uri)
+        r.rdf_replace(DC['title'], Literal('Currawong'))
+        r.rdf_write('PATCH')
+        stale.rdf_add(DC['subject'], Literal('Black'))
+        stale.rdf_write('PATCH')
+        self.assertEqual(self.repo.index.find(title='Currawong'), [ uri ])
+        self.assertEqual(self.repo.index.find(title='Magpie'), [])
+        self.assertEqual(self.repo.index.find(subject='Black'), [ uri ])
+
+    def test_delete(self):
+        """Deleting a container removes it and its children"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.repo.delete(self.resources[0].uri)
+        self.assertEqual(self.repo.index.find(title='Pigeon'), [])
+        self.repo.delete(c.uri)
+        self.assertEqual(len(self.repo.index), 0)
+
+    def test_transaction(self):
+        """Changes made in a transaction are indexed when it's committed"""
+        uri = self.repo.path2uri(CPATH)
+        tx = self.repo.transaction()
+        c = self.repo.get(uri)
+        c.add_container(self.repo.dc_rdf({ 'title': 'Rolled back' }), path='rolledback')
+        self.assertEqual(self.repo.index.find(title='Rolled back'), [])
+        tx.rollback()
+        self.assertEqual(self.repo.index.find(title='Rolled back'), [])
+        with self.repo.transaction():
+            c = self.repo.get(uri)
+            c.add_container(self.repo.dc_rdf({ 'title': 'Committed' }), path='committed')
+            self.repo.delete(self.resources[0].uri)
+            self.assertEqual(self.repo.index.find(title='Committed'), [])
+            self.assertEqual(self.repo.index.find(title='Pigeon'), [ self.resources[0].uri ])
+        self.assertEqual(self.repo.index.find(title='Committed'), [ self.repo.path2uri(CPATH + '/committed') ])
+        self.assertEqual(self.repo.index.find(title='Pigeon'), [])
+
+    def test_remove_prefix(self):
+        """Removing a subtree doesn't remove one whose name only matches it
+        as a LIKE pattern"""
+        index = self.repo.index
+        base = self.repo.path2uri(CPATH)
+        for path in [ 'test_1/a', 'testX1/a', 'test%1/a' ]:
+            index.update('{}/{}'.format(base, path), [ ( DC['title'], Literal(path) ) ])
+        index.remove('{}/test_1'.format(base))
+        self.assertEqual(index.find(title='test_1/a'), [])
+        self.assertEqual(index.find(title='testX1/a'), [ base + '/testX1/a' ])
+        self.assertEqual(index.find(title='test%1/a'), [ base + '/test%1/a' ])
+
+    def test_failed_remove(self):
+        """A remove which fails is rolled back and leaves no transaction open"""
+        index = fcrepo4.Index()
+        uri = self.repo.path2uri(CPATH + '/gone')
+        index.update(uri, [ ( DC['title'], Literal('Gone') ) ])
+        index.db.execute("DROP TABLE triples")
+        self.assertRaises(sqlite3.OperationalError, lambda: index.remove(uri))
+        self.assertFalse(index.db.in_transaction)
+        self.assertEqual(index.db.execute("SELECT uri FROM resources").fetchall(), [ ( uri, ) ])
+        index.db.execute("BEGIN")
+        index.db.execute("ROLLBACK")
+        index.close()
+
+    def test_reindex(self):
+        """reindex rebuilds the index from the repository"""
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.repo.index.clear()
+        self.assertEqual(self.repo.reindex(c.uri), 4)
+        self.assertEqual(self.repo.index.find(creator='Bob'), [ self.resources[1].uri ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import fcrepo4, fcrepotest
+import io, json, logging, hashlib
+
+
+CPATH = 'test_041'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for fixity checks',
+    'creator': 'a test script'
+    }
+
+CONTENTS = [ b'first binary', b'second binary', b'third binary' ]
+
+
+class TestFixity(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestFixity, self).setUp(CPATH, CMDATA)
+        c = self.repo.get(self.repo.path2uri(CPATH))
+        self.binaries = [ c.add_binary(io.BytesIO(data), mime='text/plain') for data in CONTENTS ]
+
+    def tearDown(self):
+        super(TestFixity, self).tearDown(CPATH)
+
+    def test_fixity(self):
+        """A binary's fixity check succeeds with its SHA-1"""
+        b = self.repo.get(self.binaries[0].uri)
+        result = b.fixity()
+        self.assertTrue(result.ok)
+        self.assertEqual(result.outcome, fcrepo4.FIXITY_SUCCESS)
+        self.assertEqual(result.digests['sha1'], hashlib.sha1(CONTENTS[0]).hexdigest())
+        self.assertEqual(result.size, len(CONTENTS[0]))
+        self.assertEqual(result.retries, 0)
+
+    def test_verify_container(self):
+        """Every binary under a container is checked"""
+        report = io.StringIO()
+        results = list(self.repo.verify_fixity(self.repo.path2uri(CPATH), workers=2, rate=100, report=report))
+        self.assertEqual(sorted(r.uri for r in results), sorted(b.uri for b in self.binaries))
+        self.assertTrue(all(r.ok for r in results))
+        lines = [ json.loads(l) for l in report.getvalue().splitlines() ]
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(l['outcome'] == 'SUCCESS' for l in lines))
+        self.assertTrue(all(l['retries'] == 0 for l in lines))
+
+    def test_errors(self):
+        """Checks which can't be done are reported as errors"""
+        missing = self.repo.path2uri(CPATH + '/missing')
+        uris = [ b.uri for b in self.binaries ] + [ missing ]
+        failures = list(self.repo.verify_fixity(uris, failures_only=True))
+        self.assertEqual([ ( r.uri, r.outcome ) for r in failures ], [ ( missing, 'ERROR' ) ])
+
+    def test_mismatch(self):
+        """A binary whose content has changed fails its check"""
+        if not fcrepotest.STANDIN:
+            self.skipTest("needs the stand-in server to corrupt a binary")
+        fcrepotest.STANDIN.corrupt(self.binaries[1].uri)
+        failures = list(self.repo.verify_fixity([ b.uri for b in self.binaries ], failures_only=True))
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0].uri, self.binaries[1].uri)
+        self.assertEqual(failures[0].outcome, 'BAD_CHECKSUM')
+
+
+if __name__ == '__main__':
+    unittest.main()
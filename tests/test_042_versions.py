@@ -0,0 +1,73 @@
+import unittest
+import fcrepo4, fcrepotest
+import io, logging
+from rdflib import Literal
+from rdflib.namespace import DC
+
+
+CPATH = 'test_042'
+
+CMDATA = {
+    'title': 'Container',
+    'description': 'Just a test container for versions',
+    'creator': 'a test script'
+    }
+
+CHILDREN = 3
+
+
+class TestVersions(fcrepotest.FCRepoContainerTest):
+
+    def setUp(self):
+        super(TestVersions, self).setUp(CPATH, CMDATA)
+        self.c = self.repo.get(self.repo.path2uri(CPATH))
+        self.kids = [ self.c.add_container(self.repo.dc_rdf({ 'title': 'Child {}'.format(i) })) for i in range(CHILDREN) ]
+        self.binary = self.c.add_binary(io.BytesIO(b'original content'), mime='text/plain')
+
+    def tearDown(self):
+        super(TestVersions, self).tearDown(CPATH)
+
+    def test_versions(self):
+        """Versions are listed oldest first and keep the old metadata"""
+        self.assertEqual(self.c.versions(), [])
+        self.c.create_version('before')
+        self.c.rdf_replace(DC['title'], Literal('Changed'))
+        self.c.rdf_write()
+        self.c.create_version('after')
+        versions = self.c.versions()
+        self.assertEqual([ v.label for v in versions ], [ 'before', 'after' ])
+        self.assertTrue(all(v.created is not None for v in versions))
+        old = self.c.at_version('before')
+        self.assertEqual(old.uri, versions[0].uri)
+        self.assertEqual(old.dc()['title'], CMDATA['title'])
+        self.assertEqual(self.c.at_version('after').dc()['title'], 'Changed')
+        self.assertIsNone(self.c.at_version('missing'))
+
+    def test_cached(self):
+        """A resource's version list is only fetched once"""
+        self.c.versions()
+        self.repo.create_version(self.c.uri, 'behind')
+        self.assertEqual(self.c.versions(), [])
+        self.assertEqual([ v.label for v in self.c.versions(refresh=True) ], [ 'behind' ])
+
+    def test_label_conflict(self):
+        """A label can only be used once"""
+        self.c.create_version('once')
+        with self.assertRaises(fcrepo4.ConflictError):
+            self.c.create_version('once')
+
+    def test_snapshot(self):
+        """A snapshot versions every resource in the subtree"""
+        report = self.repo.snapshot(self.c.uri, workers=2)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.versioned, CHILDREN + 2)
+        for r in [ self.c, self.binary ] + self.kids:
+            self.assertEqual([ v.label for v in self.repo.versions(r.uri) ], [ report.label ])
+        self.assertEqual(self.binary.at_version(report.label).data(), b'original content')
+        again = self.repo.snapshot(self.c.uri, label=report.label)
+        self.assertEqual(again.versioned, 0)
+        self.assertEqual(len(again.errors), CHILDREN + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()